@@ -1,9 +1,21 @@
 import requests
-from typing import TypedDict
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, NotRequired
 import urllib.parse
 from urllib.parse import unquote
+from configuration import get_configuration, InvalidConfigError
+from single_flight import SingleFlight
 
-BASE_URL = "https://oak.ct.letsencrypt.org/2025h1/ct/v1/"
+OAK_URL = "https://oak.ct.letsencrypt.org/2025h1/ct/v1/"
+
+REQUEST_TIMEOUT = 10
+STH_TTL = 5 # seconds, the log publishes new STHs only every few seconds
+PROOF_CACHE_SIZE = 10_000
+ENTRIES_WINDOW = 256 # entries requested per get-entries call
+ENTRIES_PARALLELISM = 4
 
 class SCT(TypedDict):
     sct_version: str
@@ -18,23 +30,28 @@ class Entry(TypedDict):
 
 def get_entries(start: int, end: int) -> list[Entry]:
     try:
-        return requests.get(f"{BASE_URL}get-entries?start={start}&end={end}").json()["entries"]
+        return client.get_entries(start, end)
     except:
         return
 
+def iter_entries(start: int, end: int):
+    """Yields the entries start to end (inclusive) in order, see CTLogClient.iter_entries."""
+    return client.iter_entries(start, end)
+
 class STH(TypedDict):
     tree_size: int
     timestamp: int
     sha256_root_hash: bytes
     tree_head_signature: bytes
     ll_size: int
+    sth_version: NotRequired[str]
 
 def get_sth() -> STH:
-    return requests.get(f"{BASE_URL}get-sth").json()
+    return client.get_sth()
 
 def get_consistency_proof(first: int, second: int) -> list:
     try: 
-        return requests.get(f"{BASE_URL}get-sth-consistency?first={first}&second={second}").json()["consistency"]
+        return client.get_consistency_proof(first, second)
     except:
         return
 
@@ -45,7 +62,7 @@ class EntryAndProof(TypedDict):
 
 def get_entry_and_proof(leaf_index: int, tree_size: int) -> EntryAndProof:
     try:
-        r = requests.get(f"{BASE_URL}get-entry-and-proof?leaf_index={leaf_index}&tree_size={tree_size}").json()
+        r = client.get_entry_and_proof(leaf_index, tree_size)
         print("res", r)
         return r
     except Exception as e:
@@ -57,12 +74,149 @@ class ProofByHash(TypedDict):
 
 def get_proof_by_hash(hash: str, tree_size: int) -> ProofByHash:
     try: 
-        encoded_hash = urllib.parse.quote(hash)
-        return requests.get(f"{BASE_URL}get-proof-by-hash?hash={encoded_hash}&tree_size={tree_size}").json()
+        return client.get_proof_by_hash(hash, tree_size)
     except Exception as e: 
         return
 
 def unquote_sth(sth: STH) -> STH:
     sth["sha256_root_hash"] = unquote(sth["sha256_root_hash"])
     sth["tree_head_signature"] = unquote(sth["tree_head_signature"])
-    return sth
\ No newline at end of file
+    return sth
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds (never if ttl is None)."""
+    def __init__(self, ttl=None, max_size=PROOF_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: Tuple of (hit, value)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+def configured_log_url() -> str:
+    """The CT log of the configuration, the OAK log without a configuration."""
+    try:
+        return get_configuration().get("ct_log_url", OAK_URL)
+    except InvalidConfigError:
+        return OAK_URL
+
+class CTLogClient:
+    """
+    Client for a RFC 6962 log with a keep-alive session, response caches and
+    coalescing of identical in-flight requests.
+    """
+    def __init__(self, base_url=None, timeout=REQUEST_TIMEOUT):
+        """
+        :param base_url: The log's URL, by default the one of the configuration read on the first request
+        """
+        self._base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.in_flight = SingleFlight()
+        self.sth_cache = TTLCache(ttl=STH_TTL, max_size=1)
+        # Proofs for fixed tree sizes never change
+        self.consistency_cache = TTLCache()
+        self.proof_by_hash_cache = TTLCache()
+        self.entry_and_proof_cache = TTLCache()
+
+    @property
+    def base_url(self):
+        if self._base_url == None:
+            self._base_url = configured_log_url()
+        return self._base_url
+
+    def _get_json(self, path: str):
+        response = self.session.get(f"{self.base_url}{path}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _cached(self, cache: TTLCache, key, path: str):
+        hit, value = cache.get(key)
+        if hit:
+            return value
+        def fetch():
+            value = self._get_json(path)
+            cache.set(key, value)
+            return value
+        return self.in_flight.do(path, fetch)
+
+    def get_entries(self, start: int, end: int) -> list[Entry]:
+        path = f"get-entries?start={start}&end={end}"
+        return self.in_flight.do(path, lambda: self._get_json(path))["entries"]
+
+    def get_entries_window(self, start: int, end: int) -> list[Entry]:
+        """
+        Fetches all entries start to end (inclusive), following up on short pages.
+        """
+        entries = []
+        while start + len(entries) <= end:
+            page = self.get_entries(start + len(entries), end)
+            if not page:
+                raise ConnectionError(f"No entries returned from {start + len(entries)}")
+            entries += page
+        return entries[:end - start + 1]
+
+    def iter_entries(self, start: int, end: int, window=ENTRIES_WINDOW, parallelism=ENTRIES_PARALLELISM):
+        """
+        Yields the entries start to end (inclusive) in order.
+
+        Up to parallelism windows are fetched concurrently while the caller
+        consumes the entries of the first one. Raises on failure instead of 
+        returning partial results.
+        """
+        windows = ((window_start, min(window_start + window - 1, end)) 
+                   for window_start in range(start, end + 1, window))
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            pending = deque()
+            try:
+                for window_start, window_end in windows:
+                    pending.append(executor.submit(self.get_entries_window, window_start, window_end))
+                    if len(pending) < parallelism:
+                        continue
+                    yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def get_sth(self) -> STH:
+        return dict(self._cached(self.sth_cache, "sth", "get-sth"))
+
+    def get_consistency_proof(self, first: int, second: int) -> list:
+        return self._cached(self.consistency_cache, (first, second), 
+                            f"get-sth-consistency?first={first}&second={second}")["consistency"]
+
+    def get_entry_and_proof(self, leaf_index: int, tree_size: int) -> EntryAndProof:
+        return self._cached(self.entry_and_proof_cache, (leaf_index, tree_size), 
+                            f"get-entry-and-proof?leaf_index={leaf_index}&tree_size={tree_size}")
+
+    def get_proof_by_hash(self, hash, tree_size: int) -> ProofByHash:
+        if isinstance(hash, bytes):
+            hash = hash.decode("utf-8")
+        encoded_hash = urllib.parse.quote(hash)
+        return self._cached(self.proof_by_hash_cache, (hash, tree_size), 
+                            f"get-proof-by-hash?hash={encoded_hash}&tree_size={tree_size}")
+
+client = CTLogClient()
\ No newline at end of file
@@ -3,23 +3,24 @@ import requests
 import json
 import requests
 import threading
-import ggmpc
-from ggmpc import curves
-from signing_service import encode_signature_base64
-from blockchain_interface import HashStorage
-import random
 from CT_interface import STH, SCT, unquote_sth, get_consistency_proof
+from single_flight import SingleFlight
 import base64
 import time
+import secrets
 import os
+import queue
 from flask_caching import Cache
 from configuration import configuration
-
-STH_FOLDER = "stored_sths"
+from facilitator_state import storage, sth_store, sct_store, signer_urls, signer_health, SIGNED_DATA_VERSION, \
+    SIGNER_TIMEOUT, missing_signers_of, blame_signers, combine_signature
+from sct_batch import build_batch, batched_scts, MAX_BATCH_SIZE
+from sth_store import sth_etag
+from signed_data import BINARY_VERSION
+from signer_health import SignerError, SignersBusyError, MissingSignSharesError, COMMITTEE_ATTEMPTS
 
 app = Flask(__name__)
-storage = HashStorage()
-mpc = ggmpc.Eddsa(curves.ed25519)
+signing_sessions = SingleFlight()
 
 # Configure Flask-Caching
 cache = Cache(app, config={
@@ -28,108 +29,145 @@ cache = Cache(app, config={
 })
 
 def store_latest_STH(sth: STH):
-    with open(f"{STH_FOLDER}/{sth['ll_size']}.json", "w") as file:
-        json.dump(sth, file, indent=4)
+    sth_store.put(sth)
 
 def load_latest_STH():
-    directory = STH_FOLDER
-    files = os.listdir(directory)    
-    numeric_files = [file for file in files if file.split('.')[0].isdigit()]
-    
-    if numeric_files:
-        highest_file = max(numeric_files, key=lambda x: int(x.split('.')[0]))
-        highest_file_path = os.path.join(directory, highest_file)
-        
-        with open(highest_file_path, 'r') as f:
-            content = f.read()
-        
-        return json.loads(content)
-    else:
-        return None
+    sth, _ = sth_store.latest()
+    return sth
 
+def sth_response(sth: STH, etag):
+    """Answers with the STH or 304 if the client has it already."""
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(sth)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 PUBLIC_KEY_FILE = "public_key"
 
 class FetchThread(threading.Thread):
-    def __init__(self, fun, args):
+    def __init__(self, fun, args, done: queue.Queue = None):
+        """
+        :param done: Queue the thread puts itself into when it finished
+        """
         super().__init__()
         self.fun = fun
         self.args = args
         self.response = None
         self.exception = None
+        self.done = done
 
     def run(self):
         try:
             self.response = self.fun(*self.args)
         except Exception as e:
             self.exception = e
+        if self.done != None:
+            self.done.put(self)
 
-def fetch_url(url, text, selected_signers, timestamp):
-    try:
-        response = requests.get(f"{url}/sign_sct/{text}",
-                                json = {
-                                    "selected_signers": selected_signers,
-                                    "timestamp": timestamp
-                                })
-        if response.status_code == 429:
-            return 429
-        return response.json()
-    except Exception as e:
-        print(f"Failed to fetch {url}: {e}")
-        raise
-
-def fetch_mth(url, sth: STH, mth: STH, consistency_proof, selected_signers):
+def fetch_partial_signature(signer_index, path, body):
+    """
+    Requests a partial signature and records the latency or failure of the signer.
+
+    Errors of the transport, timeouts and 429 count against the health of the
+    signer, other error answers are mostly caused by the rest of the committee.
+    """
+    url = signer_urls[signer_index]
+    start = time.monotonic()
     try:
-        response = requests.get(f"{url}/sign_mth", 
-                                json = {
-                                    "selected_signers": selected_signers,
-                                    "old_sth": sth,
-                                    "new_mth": mth,
-                                    "consistency_proof": consistency_proof
-                                })
-        if response.status_code == 429:
-            return 429
-        return response.json()
-    except Exception as e:
-        print(f"Failed to fetch {url}: {e}")
-        raise
+        response = requests.get(f"{url}{path}", json=body, timeout=SIGNER_TIMEOUT)
+    except requests.RequestException as e:
+        signer_health.record_failure(signer_index)
+        raise SignerError(f"Failed to fetch {url}: {e}")
+    if response.status_code == 429:
+        signer_health.record_failure(signer_index)
+        raise SignersBusyError()
+    if response.status_code != 200:
+        missing = missing_signers_of(response)
+        if missing:
+            raise MissingSignSharesError(missing)
+        raise SignerError(f"Signer {url} answered with {response.status_code}")
+    signer_health.record_success(signer_index, time.monotonic() - start)
+    return response.json()
+
+def threshold_sign(path, body):
+    """
+    Requests the partial signatures of a committee and combines them.
+
+    A committee is given up at the first failing signer and the signing
+    repeated by a committee without it, up to COMMITTEE_ATTEMPTS times.
+
+    :return: The final signature as base64
+    """
+    excluded = set()
+    busy = False
+    for _ in range(COMMITTEE_ATTEMPTS):
+        committee = signer_health.select(excluded)
+        # A fresh session per attempt, the signers must not reuse shares of an earlier one
+        committee_body = {**body, "selected_signers": committee, "session": secrets.token_hex(8)}
+        done = queue.Queue()
+        threads = {signer_index: FetchThread(fetch_partial_signature,
+                                             [signer_index, path, committee_body],
+                                             done)
+                   for signer_index in committee}
+        for thread in threads.values():
+            thread.start()
+
+        failed = None
+        for _ in committee:
+            thread = done.get()
+            if thread.exception:
+                failed = thread
+                break
+        if failed == None:
+            return combine_signature([thread.response for thread in threads.values()])
+
+        print(f"Failed to fetch: {failed.exception}")
+        busy = busy or isinstance(failed.exception, SignersBusyError)
+        blame_signers(failed.exception, failed.args[0], excluded)
+    raise SignersBusyError() if busy else SignerError("Failed to fetch partial signatures")
 
 @app.route('/public_key', methods=['GET'])
 def get_public_key():
     return jsonify(configuration["public_key"]), 200
 
+@app.route('/signers', methods=['GET'])
+def get_signer_health():
+    """Latency, error rate and circuit state of every signer as seen by this facilitator."""
+    return jsonify(signer_health.snapshot()), 200
+
 SIGNER1_API_BASE_URL = "http://localhost:5001"   
 LOG_ID_FILE = "log_id"
 
-@app.route('/sign_sct/<index>', methods=['GET'])
-def sign_sct(index):
-    selected_signers_indexes = random.sample(range(1, 6), 3)
+def issue_sct(index):
+    """
+    Runs a signing session for the SCT of the on-chain index and stores the SCT.
 
+    :return: Tuple of the response body and status
+    """
+    # A session that finished just before this one started may have stored it
+    result = sct_store.get(index)
+    if result is not None:
+        return result, 200
     timestamp = int(time.time())
-    selected_signers = [url for key, url in configuration["urls"].items() if int(key) in selected_signers_indexes]
-    threads = []
-    for selected_signer_url in selected_signers:
-        thread = FetchThread(fetch_url,[selected_signer_url, index, selected_signers_indexes, timestamp])
-        threads.append(thread)
-        thread.start()
-
-    hash_thread = FetchThread(storage.get_hash_by_index, [int(index)])
+    hash_thread = FetchThread(storage.get_hash_by_index, [index])
     hash_thread.start()
 
-    for thread in threads:
-        thread.join()  # Wait for all threads to finish
-        if thread.exception:
-            print(f"Failed to fetch: {thread.exception}")
-            return  # Exit immediately if
-
-    
-    partial_signatures = [thread.response for thread in threads]
-    final_signature = mpc.sign_combine(tuple(partial_signatures))
-    final_signature_b64 = encode_signature_base64(final_signature["R"], final_signature["sigma"])
+    try:
+        final_signature_b64 = threshold_sign(f"/sign_sct/{index}", {
+            "timestamp": timestamp,
+            "sct_version": SIGNED_DATA_VERSION
+        })
+    except SignersBusyError:
+        return {"error":"Too many requests"}, 429
+    except SignerError:
+        return {"error": f"Failed to fetch partial signatures."}, 500
 
     hash_thread.join()
     if hash_thread.exception:
-        return jsonify({"error": f"Failed to fetch blockchain data."}), 500
+        return {"error": f"Failed to fetch blockchain data."}, 500
     hashed_cert = bytes.fromhex(hash_thread.response)
     hashed_cert = base64.b64encode(hashed_cert).decode("utf-8")
 
@@ -137,11 +175,97 @@ def sign_sct(index):
         "hashed_certificate": hashed_cert,
         "signed_hash": final_signature_b64,
         "id": configuration["log_id"],
-        "sct_version": "v1",
+        "sct_version": SIGNED_DATA_VERSION,
         "timestamp": timestamp
     }
+    [result] = sct_store.put([(index, result)])
+    return result, 200
+
+def issue_sct_batch(start, end):
+    """
+    Runs a signing session for the SCTs of the index range [start, end).
+
+    Indexes with a stored SCT keep it.
+
+    :return: Tuple of the response body and status
+    """
+    timestamp = int(time.time())
+    hash_thread = FetchThread(storage.get_hashes, [start, end])
+    hash_thread.start()
+
+    try:
+        final_signature_b64 = threshold_sign(f"/sign_sct_batch/{start}/{end}", {
+            "timestamp": timestamp,
+            "sct_version": SIGNED_DATA_VERSION
+        })
+    except SignersBusyError:
+        return {"error":"Too many requests"}, 429
+    except SignerError:
+        return {"error": f"Failed to fetch partial signatures."}, 500
+
+    hash_thread.join()
+    if hash_thread.exception:
+        return {"error": f"Failed to fetch blockchain data."}, 500
+
+    # One signature over the batch root covers every SCT of the range
+    levels, _ = build_batch(hash_thread.response, configuration["log_id"], timestamp, SIGNED_DATA_VERSION)
+    result = batched_scts(hash_thread.response, levels, final_signature_b64, configuration["log_id"], timestamp,
+                          SIGNED_DATA_VERSION)
+    return sct_store.put(list(zip(range(start, end), result))), 200
+
+@app.route('/sign_sct/<int:index>', methods=['GET'])
+def sign_sct(index):
+    # Repeated requests get the SCT issued first, concurrent ones share its signing session
+    result = sct_store.get(index)
+    if result is not None:
+        return jsonify(result), 200
+    result, status = signing_sessions.do(("sct", index), lambda: issue_sct(index))
+    return jsonify(result), status
+
+@app.route('/sign_sct_batch/<int:start>/<int:end>', methods=['GET'])
+def sign_sct_batch(start, end):
+    if end <= start or end - start > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Invalid batch range."}), 400
+    result = sct_store.get_range(start, end)
+    if result is not None:
+        return jsonify(result), 200
+    result, status = signing_sessions.do(("sct_batch", start, end), lambda: issue_sct_batch(start, end))
+    return jsonify(result), status
+
+@app.route('/sct_by_hash/<certificate_hash>', methods=['GET'])
+def get_sct_by_hash(certificate_hash):
+    """
+    Returns the SCT issued for a certificate hash given as hex string.
+    """
+    result = sct_store.get_by_hash(certificate_hash)
+    if result is None:
+        return jsonify({"error": "No SCT found."}), 404
     return jsonify(result), 200
 
+@app.route('/sth', methods=['GET'])
+def get_sth():
+    """
+    Returns the latest signed tree head, or the one of the log's tree size given as ?tree_size=.
+    """
+    tree_size = request.args.get("tree_size")
+    if tree_size is not None:
+        if not tree_size.isdigit():
+            return jsonify({"error": "Invalid tree size."}), 400
+        sth = sth_store.get_by_tree_size(int(tree_size))
+        etag = sth_etag(sth) if sth is not None else None
+    else:
+        sth, etag = sth_store.latest()
+    if sth is None:
+        return jsonify({"error": "No STH found."}), 404
+    return sth_response(sth, etag)
+
+@app.route('/sth/<int:ll_size>', methods=['GET'])
+def get_sth_by_ll_size(ll_size):
+    sth = sth_store.get(ll_size)
+    if sth is None:
+        return jsonify({"error": "No STH found."}), 404
+    return sth_response(sth, sth_etag(sth))
+
 @app.route('/sign_mth', methods=['GET'])
 def sign_mth():
     data = request.get_json()
@@ -149,51 +273,35 @@ def sign_mth():
     try:
         old_sth = data["old_sth"]
     except KeyError:
-        old_sth = cache.get("latest_STH")
+        old_sth = load_latest_STH()
    
     new_mth: STH = data["new_mth"]
     new_mth["timestamp"] = int(time.time())
+    if SIGNED_DATA_VERSION == BINARY_VERSION:
+        new_mth["sth_version"] = BINARY_VERSION
     consistency_proof = None
     try:
         consistency_proof = data["consistency_proof"]
     except KeyError:
         consistency_proof = get_consistency_proof(int(old_sth["tree_size"]), int(new_mth["tree_size"]))
 
-    selected_signers_indexes = random.sample(range(1, 6), 3)
-
-    selected_signers = [url for key, url in configuration["urls"].items() if int(key) in selected_signers_indexes]
-    threads = []
-    for selected_signer_url in selected_signers:
-        thread = FetchThread(fetch_mth,
-                             [selected_signer_url, 
-                              old_sth, new_mth, 
-                              consistency_proof, 
-                              selected_signers_indexes])
-        threads.append(thread)
-        thread.start()
-
-    for thread in threads:
-        thread.join()  # Wait for all threads to finish
-        if thread.exception:
-            print(f"Failed to fetch: {thread.exception}")
-            return  # Exit immediately if
-
-    partial_signatures = [thread.response for thread in threads]
-    print(partial_signatures)
-    if 429 in partial_signatures:
+    try:
+        final_signature_b64 = threshold_sign("/sign_mth", {
+            "old_sth": old_sth,
+            "new_mth": new_mth,
+            "consistency_proof": consistency_proof
+        })
+    except SignersBusyError:
         return jsonify({"error":"Too many requests"}), 429
-    final_signature = mpc.sign_combine(tuple(partial_signatures))
-    print("final_signature",final_signature)
-    final_signature_b64 = encode_signature_base64(final_signature["R"], final_signature["sigma"])
+    except SignerError:
+        return jsonify({"error": f"Failed to fetch partial signatures."}), 500
 
     result = unquote_sth(new_mth)
     result["tree_head_signature"] = final_signature_b64
     store_latest_STH(result)
-    cache.set("latest_STH", result)
 
     return jsonify(result), 200
 
 if __name__ == '__main__':
-    latest_STH = load_latest_STH()
-    cache.set("latest_STH", latest_STH)
+    storage.sync_mirror()
     app.run(debug=True, port=5000)
\ No newline at end of file
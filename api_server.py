@@ -1,37 +1,86 @@
 from flask import Flask, request, jsonify
 from blockchain_interface import HashStorage
-from signing_service import MultiSigner, RemoteMultiSigner, InsufficientSignSharesError
+from signing_service import MultiSigner, RemoteMultiSigner, InsufficientSignSharesError, decode_sign_shares
 import json
 from dataclasses import dataclass
 from flask_caching import Cache
 import time
-from auditor import Auditor
+from auditor import Auditor, INCLUSION_WORKERS
+from ledger_tree import LedgerTree
 from CT_interface import STH, SCT
 from CT_interface import get_proof_by_hash
 from configuration import configuration, Configuration
+from sct_batch import sct_signable_data, build_batch, MAX_BATCH_SIZE, SCT_VERSION
+from signed_data import VERSIONS, JSON_VERSION, BINARY_VERSION, encode_tree_head
+from session_store import RedisSessionStore
+import os
+import threading
+from concurrent.futures import Future, wait
 
 app = Flask(__name__)
 configuration: Configuration = {**configuration}
 store = HashStorage()
 auditor = None
 signer: MultiSigner = None
-remote_signer: dict[int: RemoteMultiSigner] = {}
+remote_signers: dict[int, RemoteMultiSigner] = {}
 
 cache = Cache(app, config={
     'CACHE_TYPE': 'SimpleCache',  # Use in-memory caching
     'CACHE_DEFAULT_TIMEOUT': 300  # Default timeout for cached data (in seconds)
 })
 
-def wait_for_signature(task, data):
-    for _ in range(30):
-        time.sleep(1)
-        try:
-            res = signer.sign(task, data)
-            return res
-        except InsufficientSignSharesError:
+SIGNING_TIMEOUT = configuration.get("signing_timeout", 30)
+
+def wait_for_signature(task, data, deliveries: dict[int, Future]):
+    """
+    :param deliveries: The futures of the sign shares sent to the other signers by signer index
+    """
+    missing = []
+    deadline = time.monotonic() + SIGNING_TIMEOUT
+    try:
+        # Incoming shares are stored meanwhile, a failed delivery ends the signing at once
+        wait(deliveries.values(), timeout=SIGNING_TIMEOUT)
+        unreachable = [signer_index for signer_index, delivery in deliveries.items()
+                       if not delivery.done() or delivery.exception() != None]
+        if unreachable:
+            # The unreachable signers cannot complete their part, the facilitator blames them
+            return jsonify({"error": f"Failed to send the sign shares.", "missing": unreachable}), 500
+        if signer.wait_for_sign_shares(task, max(deadline - time.monotonic(), 0)):
+            return signer.sign(task, data)
+        missing = signer.missing_sign_shares(task)
+    except InsufficientSignSharesError:
+        pass
+    finally:
+        signer.release_task(task)
+
+    # The facilitator blames the missing signers instead of this one
+    return jsonify({"error": f"Failed to receive all signing shares.", "missing": missing}), 500
+
+def signing_task(name, selected_signers, session=None):
+    """
+    The name of a signing session, the same on all selected signers.
+
+    :param session: The nonce the facilitator picked for this signing, keeps a
+        repeated signing of the same data from meeting shares of an earlier one
+    """
+    task = f"{name}_{'-'.join(str(index) for index in sorted(selected_signers))}"
+    return task if session == None else f"{task}_{session}"
+
+def threshold_sign(task, selected_signers, signable_data):
+    # Each signer generates their sign share
+    signer.set_selected_signers(task, selected_signers)
+    signer.sign_share(task, signable_data)
+
+    # Share the sign shares with the other selected signers, the shares are sent in the background
+    deliveries = {}
+    for other_signer_index in selected_signers:
+        if other_signer_index == signer.index:
             continue
+        other_signer = remote_signers[other_signer_index]
+        share = signer.get_sign_share(task, other_signer_index)
+        deliveries[other_signer_index] = other_signer.set_foreign_sign_share(task, share)
 
-    return jsonify({"error": f"Failed to receive all signing shares."}), 500
+    return wait_for_signature(task, signable_data, deliveries)
 
 @app.route('/sign_sct/<index>', methods=['GET'])
 def sign_sct(index):
@@ -41,33 +90,46 @@ def sign_sct(index):
     selected_signers = data["selected_signers"]
     selected_signers = [int(selected_signer) for selected_signer in selected_signers]
     timestamp = int(data["timestamp"])
-    task = f"SCT_signing_{index}"
+    version = data.get("sct_version", SCT_VERSION)
+    if version not in VERSIONS:
+        return jsonify({"error": f"Unknown SCT version."}), 400
+    task = signing_task(f"SCT_signing_{index}", selected_signers, data.get("session"))
 
-    hash = store.get_hash_by_index(index)
+    try:
+        hash = store.get_hash_by_index(index)
+    except Exception:
+        hash = None
     if not hash:
-        jsonify({"error": f"Requested certificate not included."}), 404
+        return jsonify({"error": f"Requested certificate not included."}), 404
 
-    certificate_timestamp: SCT = {
-        "hashed_certificate": hash,
-        "id": configuration["log_id"],
-        "sct_version": "v1",
-        "timestamp": timestamp
-    }
+    signable_data = sct_signable_data(hash, configuration["log_id"], timestamp, version)
 
-    signable_data = json.dumps(certificate_timestamp, sort_keys=True).encode("utf-8")
+    return threshold_sign(task, selected_signers, signable_data)
 
-    # Step 5: Each signer generates their sign share
-    signer.set_selected_signers(task,selected_signers)
-    signer.sign_share(task,signable_data)
-    # Share the sign shares with the other selected signers
-    for other_signer_index in selected_signers:
-        if other_signer_index == signer.index:
-            continue
-        other_signer = remote_signers[other_signer_index]
-        share = signer.get_sign_share(task, other_signer_index)
-        other_signer.set_foreign_sign_share(task, share)
+@app.route('/sign_sct_batch/<start>/<end>', methods=['GET'])
+def sign_sct_batch(start, end):
+    data = request.get_json()
+
+    start, end = int(start), int(end)
+    if end <= start or end - start > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Invalid batch range."}), 400
+    selected_signers = data["selected_signers"]
+    selected_signers = [int(selected_signer) for selected_signer in selected_signers]
+    timestamp = int(data["timestamp"])
+    version = data.get("sct_version", SCT_VERSION)
+    if version not in VERSIONS:
+        return jsonify({"error": f"Unknown SCT version."}), 400
+    task = signing_task(f"SCT_batch_signing_{start}_{end}", selected_signers, data.get("session"))
+
+    try:
+        hashes = store.get_hashes(start, end)
+    except Exception:
+        return jsonify({"error": f"Requested certificates not included."}), 404
+
+    # Only the batch root is threshold signed, the SCTs carry inclusion paths
+    _, signable_data = build_batch(hashes, configuration["log_id"], timestamp, version)
 
-    return wait_for_signature(task, signable_data)
+    return threshold_sign(task, selected_signers, signable_data)
 
 @app.route('/sign_mth', methods=['GET'])
 def sign_mth():
@@ -75,6 +137,9 @@ def sign_mth():
     old_sth: STH = data["old_sth"]
     new_mth: STH = data["new_mth"]
     consistency_proof = data["consistency_proof"]
+    version = new_mth.get("sth_version", JSON_VERSION)
+    if version not in VERSIONS:
+        return jsonify({"error": f"Unknown STH version."}), 400
 
     try:
         if not auditor.proof_input(old_sth, new_mth, consistency_proof):
@@ -85,25 +150,17 @@ def sign_mth():
     selected_signers = data["selected_signers"]
     selected_signers = [int(selected_signer) for selected_signer in selected_signers]
     
-    task = f"SCT_signing_{new_mth['ll_size']}"
-    new_mth.pop("tree_head_signature")
-    new_mth["sha256_root_hash"] = new_mth["sha256_root_hash"].hex()
-    
-    signable_data = json.dumps(new_mth, sort_keys=True).encode("utf-8")
+    task = signing_task(f"STH_signing_{new_mth['ll_size']}", selected_signers, data.get("session"))
+    if version == BINARY_VERSION:
+        signable_data = encode_tree_head(int(new_mth["tree_size"]), int(new_mth["ll_size"]),
+                                         int(new_mth["timestamp"]), new_mth["sha256_root_hash"])
+    else:
+        new_mth.pop("tree_head_signature")
+        new_mth["sha256_root_hash"] = new_mth["sha256_root_hash"].hex()
+        signable_data = json.dumps(new_mth, sort_keys=True).encode("utf-8")
     print("signable_data", signable_data)
 
-    signer.set_selected_signers(task, selected_signers)
-    signer.sign_share(task,signable_data)
-
-    # Share the sign shares with the other selected signers
-    for other_signer_index in selected_signers:
-        if other_signer_index == signer.index:
-            continue
-        other_signer = remote_signers[other_signer_index]
-        share = signer.get_sign_share(task, other_signer_index)
-        other_signer.set_foreign_sign_share(task, share)
-
-    return wait_for_signature(task, signable_data)
+    return threshold_sign(task, selected_signers, signable_data)
 
 @app.route('/foreign_sign_share/<task>', methods = ['POST'])
 def foreign_sign_shares(task):
@@ -111,25 +168,68 @@ def foreign_sign_shares(task):
     signer.set_foreign_sign_share(task, int(data["id"]), data["share"])
     return jsonify({}), 200
 
-if __name__ == '__main__':
-    import sys
-    if len(sys.argv) > 1:
-        configuration["index"] = int(sys.argv[1])
+@app.route('/foreign_sign_shares', methods = ['POST'])
+def foreign_sign_shares_batch():
+    """Takes the sign shares of several tasks from one signer, encoded with encode_sign_shares."""
+    try:
+        signer_index, shares = decode_sign_shares(request.get_data())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    for task, share in shares:
+        signer.set_foreign_sign_share(task, signer_index, share)
+    return jsonify({}), 200
 
-    
+def sync_with_chain(ledger_tree: LedgerTree):
+    try:
+        store.sync_mirror()
+        ledger_tree.sync()
+    except Exception as e:
+        print("Sync with the chain failed:", e)
+
+def init_signer(index):
+    """
+    Sets up the signer, its peers and the auditor in this process.
+
+    Every worker of a multi-worker server calls this on import, they share
+    the signing sessions via the session store given in the configuration.
+    """
+    global signer, remote_signers, auditor
+    configuration["index"] = index
     KEY_FILE = f"combined_key_{configuration['index']}.json"
     KEY_PATH = f"{configuration['key_folder']}/{KEY_FILE}"
 
     print("Signing Configuration:", configuration)
+    sessions = cache
+    if "session_store_url" in configuration:
+        sessions = RedisSessionStore(configuration["session_store_url"])
     signer = MultiSigner(configuration["index"], 
                          configuration["threshold"], 
                          configuration["total_signers"], 
-                         cache, 
-                         KEY_PATH)
+                         sessions, 
+                         KEY_PATH,
+                         compute_workers=configuration.get("compute_workers", 0))
     remote_signers = {int(id):RemoteMultiSigner(signer.index, 
                                                 configuration["urls"][id]) 
                                                 for id in configuration["urls"].keys()}
 
-    auditor = Auditor(store.get_hash_by_index, get_proof_by_hash)
+    ledger_tree = LedgerTree(store.get_hash_count, store.get_hashes)
+    # Catching up with the chain must not delay the start, reads fall back to the chain meanwhile
+    threading.Thread(target=sync_with_chain, args=(ledger_tree,), daemon=True).start()
+    auditor = Auditor(store.get_hash_by_index, 
+                      get_proof_by_hash, 
+                      store.get_hashes, 
+                      configuration.get("audit_workers", INCLUSION_WORKERS),
+                      ledger_tree)
+
+# Started by a multi-worker server, e.g. SIGNER_INDEX=1 gunicorn -w 4 -b localhost:5001 api_server:app
+if __name__ != '__main__' and "SIGNER_INDEX" in os.environ:
+    init_signer(int(os.environ["SIGNER_INDEX"]))
+
+if __name__ == '__main__':
+    import sys
+    index = configuration["index"]
+    if len(sys.argv) > 1:
+        index = int(sys.argv[1])
+    init_signer(index)
 
     app.run(debug=True, port=5000+configuration["index"])
@@ -0,0 +1,286 @@
+import asyncio
+import base64
+import time
+import secrets
+import httpx
+from quart import Quart, Response, jsonify, request
+from facilitator_state import storage, sth_store, sct_store, signer_urls, signer_health, SIGNED_DATA_VERSION, \
+    SIGNER_TIMEOUT, missing_signers_of, blame_signers, combine_signature
+from CT_interface import STH, SCT, unquote_sth, get_consistency_proof
+from sct_batch import build_batch, batched_scts, MAX_BATCH_SIZE
+from configuration import configuration
+from sth_store import sth_etag
+from signed_data import BINARY_VERSION
+from signer_health import SignerError, SignersBusyError, MissingSignSharesError, COMMITTEE_ATTEMPTS
+
+MAX_CONCURRENT_SIGNINGS = configuration.get("max_concurrent_signings", 100)
+MAX_CONNECTIONS_PER_SIGNER = 50
+
+app = Quart(__name__)
+
+signer_clients: dict[str, httpx.AsyncClient] = {}
+signing_slots: asyncio.Semaphore = None
+signing_sessions: dict[object, asyncio.Task] = {}
+
+@app.before_serving
+async def open_signer_pools():
+    global signing_slots
+    signing_slots = asyncio.Semaphore(MAX_CONCURRENT_SIGNINGS)
+    # One keep-alive connection pool per signer
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS_PER_SIGNER,
+                          max_keepalive_connections=MAX_CONNECTIONS_PER_SIGNER)
+    for url in configuration["urls"].values():
+        signer_clients[url] = httpx.AsyncClient(base_url=url, limits=limits, timeout=SIGNER_TIMEOUT)
+
+@app.after_serving
+async def close_signer_pools():
+    for client in signer_clients.values():
+        await client.aclose()
+    signer_clients.clear()
+
+async def fetch_partial_signature(signer_index, path, body):
+    """Requests a partial signature and records the latency or failure of the signer, see api_facilitator."""
+    url = signer_urls[signer_index]
+    start = time.monotonic()
+    try:
+        response = await signer_clients[url].request("GET", path, json=body)
+    except httpx.HTTPError as e:
+        # A request cancelled for a committee that is given up may end as a transport error
+        if asyncio.current_task().cancelling():
+            raise asyncio.CancelledError
+        signer_health.record_failure(signer_index)
+        raise SignerError(f"Failed to fetch {url}: {e}")
+    if response.status_code == 429:
+        signer_health.record_failure(signer_index)
+        raise SignersBusyError()
+    if response.status_code != 200:
+        missing = missing_signers_of(response)
+        if missing:
+            raise MissingSignSharesError(missing)
+        raise SignerError(f"Signer {url} answered with {response.status_code}")
+    signer_health.record_success(signer_index, time.monotonic() - start)
+    return response.json()
+
+async def threshold_sign(path, body):
+    """
+    Requests the partial signatures of a committee in parallel and combines them.
+
+    A committee is given up at the first failing signer or after
+    SIGNER_TIMEOUT and the signing repeated by a committee without the
+    failed or slow signers, up to COMMITTEE_ATTEMPTS times.
+
+    :return: The final signature as base64
+    """
+    excluded = set()
+    busy = False
+    for _ in range(COMMITTEE_ATTEMPTS):
+        committee = signer_health.select(excluded)
+        # A fresh session per attempt, the signers must not reuse shares of an earlier one
+        committee_body = {**body, "selected_signers": committee, "session": secrets.token_hex(8)}
+        fetches = {asyncio.ensure_future(fetch_partial_signature(signer_index, path, committee_body)): signer_index
+                   for signer_index in committee}
+        done, pending = await asyncio.wait(fetches, timeout=SIGNER_TIMEOUT, return_when=asyncio.FIRST_EXCEPTION)
+        for fetch in pending:
+            fetch.cancel()
+        failed = [fetch for fetch in done if fetch.exception() != None]
+        if not failed and not pending:
+            return combine_signature([fetch.result() for fetch in fetches])
+
+        for fetch in failed:
+            print(f"Failed to fetch: {fetch.exception()}")
+            busy = busy or isinstance(fetch.exception(), SignersBusyError)
+            blame_signers(fetch.exception(), fetches[fetch], excluded)
+        if not failed:
+            # Timed out, the signers without answer are the slow ones
+            for fetch in pending:
+                signer_health.record_failure(fetches[fetch])
+                excluded.add(fetches[fetch])
+    raise SignersBusyError() if busy else SignerError("Failed to fetch partial signatures")
+
+@app.route('/public_key', methods=['GET'])
+async def get_public_key():
+    return jsonify(configuration["public_key"]), 200
+
+@app.route('/signers', methods=['GET'])
+async def get_signer_health():
+    return jsonify(signer_health.snapshot()), 200
+
+async def shared_session(key, issue):
+    """Runs issue once for all concurrent requests with the same key."""
+    task = signing_sessions.get(key)
+    if task is None:
+        task = asyncio.ensure_future(issue())
+        signing_sessions[key] = task
+        task.add_done_callback(lambda _: signing_sessions.pop(key, None))
+    # A cancelled request must not cancel the session of the others
+    return await asyncio.shield(task)
+
+async def issue_sct(index):
+    """
+    Runs a signing session for the SCT of the on-chain index and stores the SCT.
+
+    :return: Tuple of the response body and status
+    """
+    # A session that finished just before this one started may have stored it
+    result = sct_store.get(index)
+    if result is not None:
+        return result, 200
+    async with signing_slots:
+        timestamp = int(time.time())
+        hash_task = asyncio.create_task(asyncio.to_thread(storage.get_hash_by_index, index))
+        try:
+            final_signature_b64 = await threshold_sign(f"/sign_sct/{index}", {
+                "timestamp": timestamp,
+                "sct_version": SIGNED_DATA_VERSION
+            })
+        except SignerError as e:
+            hash_task.cancel()
+            if isinstance(e, SignersBusyError):
+                return {"error": "Too many requests"}, 429
+            return {"error": f"Failed to fetch partial signatures."}, 500
+
+        try:
+            hashed_cert = await hash_task
+        except Exception:
+            return {"error": f"Failed to fetch blockchain data."}, 500
+        hashed_cert = base64.b64encode(bytes.fromhex(hashed_cert)).decode("utf-8")
+
+    result: SCT = {
+        "hashed_certificate": hashed_cert,
+        "signed_hash": final_signature_b64,
+        "id": configuration["log_id"],
+        "sct_version": SIGNED_DATA_VERSION,
+        "timestamp": timestamp
+    }
+    [result] = await asyncio.to_thread(sct_store.put, [(index, result)])
+    return result, 200
+
+async def issue_sct_batch(start, end):
+    """
+    Runs a signing session for the SCTs of the index range [start, end).
+
+    Indexes with a stored SCT keep it.
+
+    :return: Tuple of the response body and status
+    """
+    async with signing_slots:
+        timestamp = int(time.time())
+        hash_task = asyncio.create_task(asyncio.to_thread(storage.get_hashes, start, end))
+        try:
+            final_signature_b64 = await threshold_sign(f"/sign_sct_batch/{start}/{end}", {
+                "timestamp": timestamp,
+                "sct_version": SIGNED_DATA_VERSION
+            })
+        except SignerError as e:
+            hash_task.cancel()
+            if isinstance(e, SignersBusyError):
+                return {"error": "Too many requests"}, 429
+            return {"error": f"Failed to fetch partial signatures."}, 500
+
+        try:
+            hashes = await hash_task
+        except Exception:
+            return {"error": f"Failed to fetch blockchain data."}, 500
+
+    levels, _ = build_batch(hashes, configuration["log_id"], timestamp, SIGNED_DATA_VERSION)
+    result = batched_scts(hashes, levels, final_signature_b64, configuration["log_id"], timestamp, SIGNED_DATA_VERSION)
+    return await asyncio.to_thread(sct_store.put, list(zip(range(start, end), result))), 200
+
+@app.route('/sign_sct/<int:index>', methods=['GET'])
+async def sign_sct(index):
+    # Repeated requests get the SCT issued first, concurrent ones share its signing session
+    result = sct_store.get(index)
+    if result is not None:
+        return jsonify(result), 200
+    result, status = await shared_session(("sct", index), lambda: issue_sct(index))
+    return jsonify(result), status
+
+@app.route('/sign_sct_batch/<int:start>/<int:end>', methods=['GET'])
+async def sign_sct_batch(start, end):
+    if end <= start or end - start > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Invalid batch range."}), 400
+    result = sct_store.get_range(start, end)
+    if result is not None:
+        return jsonify(result), 200
+    result, status = await shared_session(("sct_batch", start, end), lambda: issue_sct_batch(start, end))
+    return jsonify(result), status
+
+@app.route('/sct_by_hash/<certificate_hash>', methods=['GET'])
+async def get_sct_by_hash(certificate_hash):
+    result = sct_store.get_by_hash(certificate_hash)
+    if result is None:
+        return jsonify({"error": "No SCT found."}), 404
+    return jsonify(result), 200
+
+def sth_response(sth: STH, etag):
+    """Answers with the STH or 304 if the client has it already."""
+    if etag in request.if_none_match:
+        response = Response("", status=304)
+    else:
+        response = jsonify(sth)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/sth', methods=['GET'])
+async def get_sth():
+    tree_size = request.args.get("tree_size")
+    if tree_size is not None:
+        if not tree_size.isdigit():
+            return jsonify({"error": "Invalid tree size."}), 400
+        sth = await asyncio.to_thread(sth_store.get_by_tree_size, int(tree_size))
+        etag = sth_etag(sth) if sth is not None else None
+    else:
+        sth, etag = sth_store.latest()
+    if sth is None:
+        return jsonify({"error": "No STH found."}), 404
+    return sth_response(sth, etag)
+
+@app.route('/sth/<int:ll_size>', methods=['GET'])
+async def get_sth_by_ll_size(ll_size):
+    sth = await asyncio.to_thread(sth_store.get, ll_size)
+    if sth is None:
+        return jsonify({"error": "No STH found."}), 404
+    return sth_response(sth, sth_etag(sth))
+
+@app.route('/sign_mth', methods=['GET'])
+async def sign_mth():
+    data = await request.get_json()
+    old_sth: STH = data.get("old_sth") or sth_store.latest()[0]
+
+    new_mth: STH = data["new_mth"]
+    new_mth["timestamp"] = int(time.time())
+    if SIGNED_DATA_VERSION == BINARY_VERSION:
+        new_mth["sth_version"] = BINARY_VERSION
+    consistency_proof = data.get("consistency_proof")
+    if consistency_proof is None:
+        consistency_proof = await asyncio.to_thread(get_consistency_proof,
+                                                    int(old_sth["tree_size"]),
+                                                    int(new_mth["tree_size"]))
+
+    async with signing_slots:
+        try:
+            final_signature_b64 = await threshold_sign("/sign_mth", {
+                "old_sth": old_sth,
+                "new_mth": new_mth,
+                "consistency_proof": consistency_proof
+            })
+        except SignersBusyError:
+            return jsonify({"error": "Too many requests"}), 429
+        except SignerError:
+            return jsonify({"error": f"Failed to fetch partial signatures."}), 500
+
+    result = unquote_sth(new_mth)
+    result["tree_head_signature"] = final_signature_b64
+    await asyncio.to_thread(sth_store.put, result)
+
+    return jsonify(result), 200
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    storage.sync_mirror()
+    config = Config()
+    config.bind = ["localhost:5000"]
+    asyncio.run(serve(app, config))
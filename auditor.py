@@ -1,7 +1,8 @@
 import base64
 import hashlib
 from CT_interface import ProofByHash, STH
-import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from merkle_tree import root_from_audit_path
 from signature_verifier import verify_sth
 from urllib.parse import unquote
 import base64
@@ -10,24 +11,16 @@ import requests
 def decode_base64(base64_str):
     return base64.b64decode(base64_str)
 
-class FetchThread(threading.Thread):
-    def __init__(self, fun, args):
-        super().__init__()
-        self.fun = fun
-        self.args = args
-        self.response = None
-        self.exception = None
-
-    def run(self):
-        try:
-            self.response = self.fun(*self.args)
-        except Exception as e:
-            self.exception = e
+INCLUSION_WORKERS = 16
 
 class Auditor:
-    def __init__(self, get_entry_from_blockchain, get_entry_from_inclusion_service):
+    def __init__(self, get_entry_from_blockchain, get_entry_from_inclusion_service, get_entries_from_blockchain=None, max_workers=INCLUSION_WORKERS, ledger_tree=None):
         self.get_entry_from_blockchain = get_entry_from_blockchain
         self.get_entry_from_inclusion_service = get_entry_from_inclusion_service
+        self.get_entries_from_blockchain = get_entries_from_blockchain
+        self.max_workers = max_workers
+        self.ledger_tree = ledger_tree
+        self.last_proof_count = 0
 
     def proof_input(self, old_sth: STH, new_mth: STH, consistency_path) -> bool:
         #Step 1: validate signature
@@ -51,47 +44,98 @@ class Auditor:
         print("consitency proof succeeded")
 
         # Step 3: validate inlusion
-        threads = []
-        for i in range(old_sth["ll_size"], new_mth["ll_size"]):
-            thread = FetchThread(self.validate_inclusion, [i, new_mth])
-            threads.append(thread)
-            thread.start()
-
-        for thread in threads:
-            thread.join()  # Wait for all threads to finish
-            if thread.exception:
-                raise thread.exception
-            if not thread.response:
-                print("thread failed", thread.response )
-                return False
-                  # Exit immediately if
+        # Leaves [0, tree_size) of the local tree are the on-chain entries, a matching
+        # root proves the inclusion of all of them without a request to the log
+        if self.ledger_tree != None \
+            and new_mth["ll_size"] <= new_mth["tree_size"] \
+            and self.ledger_tree.proves_root(new_mth["tree_size"], new_mth["sha256_root_hash"]):
+            self.last_proof_count = 0
+            print("inclusion proof succeeded with local tree")
+            return True
+
+        bc_entries = self.fetch_blockchain_entries(old_sth["ll_size"], new_mth["ll_size"])
+        if not self.validate_inclusions(old_sth["ll_size"], new_mth["ll_size"], new_mth, bc_entries):
+            return False
 
         print("inclusion proof succeeded")
         return True
+
+    def validate_inclusions(self, start: int, end: int, new_mth: STH, bc_entries: dict) -> bool:
+        """
+        Validates the inclusion of the entries [start, end) on a bounded pool of workers.
+
+        Stops at the first failed proof and cancels the remaining ones. The number
+        of proofs that ran is kept in last_proof_count.
+        """
+        proof_count = 0
+        # Proofs of the same tree share interior nodes, hash each of them only once
+        batch = MerkleInclusionBatch(new_mth["tree_size"], new_mth["sha256_root_hash"])
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(self.fetch_inclusion_proof, i, new_mth, bc_entries.get(i)): i 
+                       for i in range(start, end)}
+            for future in as_completed(futures):
+                proof_count += 1
+                leaf_index, bc_entry_bytes, audit_path = future.result()
+                if not batch.validate(leaf_index, bc_entry_bytes, audit_path):
+                    print("inclusion proof failed for:", futures[future], base64.b64encode(bc_entry_bytes))
+                    print("inclusion proof failed after", proof_count, "proofs")
+                    return False
+            return True
+        finally:
+            # Exit immediately on failure without waiting for the other proofs
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.last_proof_count = proof_count
+            print("inclusion proofs run:", proof_count)
     
-    def validate_inclusion(self, i: int, new_mth: STH):
+    def fetch_blockchain_entries(self, start: int, end: int) -> dict:
+        """
+        Fetches the on-chain entries of the index range [start, end) in one go.
+
+        :return: The entries by index, empty if no range read is available
+        """
+        if self.get_entries_from_blockchain == None or end <= start:
+            return {}
         try:
-            bc_entry = self.get_entry_from_blockchain(i)
+            return dict(zip(range(start, end), self.get_entries_from_blockchain(start, end)))
         except requests.exceptions.SSLError:
             print("too many rpc requests")
             raise ConnectionError
         except:
             raise KeyError
-                    
-        bc_entry_bytes = bytes.fromhex(bc_entry)
-        bc_entry = base64.b64encode(bc_entry_bytes)
-        off_chain_entry: ProofByHash = self.get_entry_from_inclusion_service(bc_entry, new_mth["tree_size"])
-        if off_chain_entry == None:
-            raise ConnectionError
 
-        if not validate_merkle_inclusion_proof(off_chain_entry["leaf_index"],
+    def validate_inclusion(self, i: int, new_mth: STH, bc_entry=None):
+        leaf_index, bc_entry_bytes, audit_path = self.fetch_inclusion_proof(i, new_mth, bc_entry)
+        if not validate_merkle_inclusion_proof(leaf_index,
                                         new_mth["tree_size"], 
                                         new_mth["sha256_root_hash"], 
                                         bc_entry_bytes, 
-                                        off_chain_entry['audit_path']):
-            print("inclusion proof failed for:",i , bc_entry)
+                                        audit_path):
+            print("inclusion proof failed for:",i , base64.b64encode(bc_entry_bytes))
             return False
         return True
+
+    def fetch_inclusion_proof(self, i: int, new_mth: STH, bc_entry=None):
+        """
+        Fetches the inclusion proof of the on-chain entry i.
+
+        :return: Tuple of (leaf_index, leaf_hash, audit_path)
+        """
+        if bc_entry == None:
+            try:
+                bc_entry = self.get_entry_from_blockchain(i)
+            except requests.exceptions.SSLError:
+                print("too many rpc requests")
+                raise ConnectionError
+            except:
+                raise KeyError
+                    
+        bc_entry_bytes = bytes.fromhex(bc_entry)
+        bc_entry = base64.b64encode(bc_entry_bytes)
+        off_chain_entry: ProofByHash = self.get_entry_from_inclusion_service(bc_entry, new_mth["tree_size"])
+        if off_chain_entry == None:
+            raise ConnectionError
+        return off_chain_entry["leaf_index"], bc_entry_bytes, off_chain_entry["audit_path"]
             
 
 def hash_function(data):
@@ -109,38 +153,48 @@ def validate_merkle_inclusion_proof(leaf_index, tree_size, root_hash, input_hash
     :param inclusion_path: The inclusion path array.
     :return: True if the proof is valid, False otherwise.
     """
-    # Step 1: Compare leaf_index with tree_size
-    if leaf_index >= tree_size:
-        return False
-
-    # Step 2: Set fn to leaf_index and sn to tree_size - 1
-    fn = leaf_index
-    sn = tree_size - 1
-
-    # Step 3: Set r to input_hash
-    r = input_hash
+    path = [base64.b64decode(p) for p in inclusion_path]
+    return root_from_audit_path(leaf_index, tree_size, input_hash, path) == root_hash
 
-    # Step 4: Iterate over inclusion_path
-    for p in inclusion_path:
-        p = base64.b64decode(p)  # Decode the base64-encoded path element
-        if sn == 0:
-            return False
-
-        if fn & 1 == 1 or fn == sn:
-            # Case: LSB(fn) is set or fn == sn
-            r = hash_function(b'\x01' + p + r)
-        else:
-            # Case: LSB(fn) is not set
-            r = hash_function(b'\x01' + r + p)
+class MerkleInclusionBatch:
+    """
+    Validates several Merkle inclusion proofs of the same tree in a single pass.
 
-        # Right-shift fn and sn by 1
-        fn >>= 1
-        sn >>= 1
+    Contiguous leaves share most of their audit path. Every path element is
+    decoded once and once a proof reaches a node that was already walked with
+    the same remaining path, the known root is reused instead of rehashing
+    up to the root. The results are identical to validate_merkle_inclusion_proof.
+    """
+    def __init__(self, tree_size, root_hash):
+        self.tree_size = tree_size
+        self.root_hash = root_hash
+        self.decoded_path = {}
+        # (fn, sn, node hash, remaining path) -> root, see root_from_audit_path
+        self.walked_nodes = {}
+
+    def decode(self, p):
+        decoded = self.decoded_path.get(p)
+        if decoded is None:
+            decoded = base64.b64decode(p)
+            self.decoded_path[p] = decoded
+        return decoded
+
+    def validate(self, leaf_index, input_hash, inclusion_path) -> bool:
+        path = [self.decode(p) for p in inclusion_path]
+        return root_from_audit_path(leaf_index, self.tree_size, input_hash, path, self.walked_nodes) == self.root_hash
+
+def validate_merkle_inclusion_proofs(tree_size, root_hash, proofs) -> list[bool]:
+    """
+    Validate several Merkle inclusion proofs for the same tree in a single pass.
 
-    # Step 5: Compare sn to 0 and r to root_hash
-    root_hash_bytes = root_hash
-    #root_hash_bytes = base64.b64decode(root_hash)
-    return sn == 0 and r == root_hash_bytes
+    :param tree_size: Total number of leaves in the tree.
+    :param root_hash: The root hash of the Merkle tree.
+    :param proofs: Tuples of (leaf_index, input_hash, inclusion_path).
+    :return: The validation result of each proof.
+    """
+    batch = MerkleInclusionBatch(tree_size, root_hash)
+    return [batch.validate(leaf_index, input_hash, inclusion_path) 
+            for leaf_index, input_hash, inclusion_path in proofs]
 
 def hash_node(prefix, left, right):
     """Compute the hash of a node with a given prefix."""
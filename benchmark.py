@@ -0,0 +1,377 @@
+"""
+Microbenchmarks for the signing, verification and Merkle hot paths.
+
+Run from the repository root:
+>python3 benchmark.py --output results.json
+>python3 benchmark.py --save-baseline
+>python3 benchmark.py --baseline benchmark_baseline.json --tolerance 0.25
+
+Exits with status 1 if a benchmark got slower than the baseline by more than the tolerance.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+import ggmpc
+from ggmpc import curves
+from flask import Flask
+from flask_caching import Cache
+from signing_service import MultiSigner, encode_signature_base64
+from signature_verifier import verify_sct, verify_sth, verify_scts_deduplicated, sct_signed_data, sth_signed_data
+from auditor import validate_merkle_inclusion_proof, validate_merkle_inclusion_proofs, validate_consistency_proof, hash_node
+from merkle_tree import hash_leaf, merkle_levels, audit_path, root_from_audit_path
+from sct_batch import sct_signable_data, build_batch, batched_scts
+from configuration import get_configuration, InvalidConfigError
+
+BASELINE_FILE = "benchmark_baseline.json"
+KEY_FOLDER = "keys"
+THRESHOLD, TOTAL_SIGNERS = 3, 5
+SELECTED_SIGNERS = [1, 3, 5]
+TREE_SIZES = [2**10, 2**20, 500_000_000]
+BATCH_TREE_SIZE = 2**16
+BATCH_PROOFS = 256
+VERIFY_BATCH = 256
+CONCURRENT_TASKS = 32
+# A signer restart: import the api server and load the key, without syncing with the chain
+STARTUP_SCRIPT = f"""
+import api_server
+from signing_service import MultiSigner
+MultiSigner({SELECTED_SIGNERS[0]}, {THRESHOLD}, {TOTAL_SIGNERS}, api_server.cache, "{KEY_FOLDER}/combined_key_{SELECTED_SIGNERS[0]}.json")
+"""
+REPEAT = 5
+# Missing configuration or key files skip a benchmark instead of aborting the run
+SKIPPED_ERRORS = (InvalidConfigError, FileNotFoundError)
+
+benchmarks = {}
+
+def benchmark(name):
+    def register(setup):
+        benchmarks[name] = setup
+        return setup
+    return register
+
+def measure(fun, repeat=REPEAT):
+    """Returns the best time per call in seconds."""
+    timer = timeit.Timer(fun)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def random_hash(rng):
+    return rng.randbytes(32)
+
+def signing_fixture():
+    app = Flask(__name__)
+    config = {'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 0, 'CACHE_THRESHOLD': 100_000}
+    signers = {i: MultiSigner(i, THRESHOLD, TOTAL_SIGNERS, Cache(app=app, config=config),
+                              f"{KEY_FOLDER}/combined_key_{i}.json")
+               for i in SELECTED_SIGNERS}
+    message = sct_signable_data("00" * 32, "LOG_ID", 1736887033)
+    task = "benchmark"
+    exchange_sign_shares(signers, task, message)
+    return signers, task, message
+
+def exchange_sign_shares(signers, task, message):
+    for signer in signers.values():
+        signer.set_selected_signers(task, SELECTED_SIGNERS)
+        signer.sign_share(task, message)
+    for signer in signers.values():
+        for other_signer in signers.values():
+            other_signer.set_foreign_sign_share(task, signer.index, signer.get_sign_share(task, other_signer.index))
+
+def signed_fixture(signers, task, message):
+    mpc = ggmpc.Eddsa(curves.ed25519)
+    partial_signatures = tuple(signer.sign(task, message) for signer in signers.values())
+    final_signature = mpc.sign_combine(partial_signatures)
+    return mpc, partial_signatures, encode_signature_base64(final_signature["R"], final_signature["sigma"])
+
+@benchmark("multisigner.sign_share")
+def bench_sign_share():
+    signers, task, message = signing_fixture()
+    signer = signers[SELECTED_SIGNERS[0]]
+    return {"": lambda: signer.sign_share(task, message)}
+
+@benchmark("multisigner.sign")
+def bench_sign():
+    signers, task, message = signing_fixture()
+    signer = signers[SELECTED_SIGNERS[0]]
+    return {"": lambda: signer.sign(task, message)}
+
+@benchmark("multisigner.concurrent_sign_share")
+def bench_concurrent_sign_share():
+    signers, task, message = signing_fixture()
+    signer_index = SELECTED_SIGNERS[0]
+    compute_workers = os.cpu_count()
+    pool_signer = MultiSigner(signer_index, THRESHOLD, TOTAL_SIGNERS, signers[signer_index].sessions.cache,
+                              f"{KEY_FOLDER}/combined_key_{signer_index}.json", compute_workers=compute_workers)
+    threads = ThreadPoolExecutor(CONCURRENT_TASKS)
+    # Request threads signing different tasks at the same time
+    concurrent = lambda signer: list(threads.map(lambda _: signer.sign_share(task, message), range(CONCURRENT_TASKS)))
+    return {f"in_thread,tasks={CONCURRENT_TASKS}": lambda: concurrent(signers[signer_index]),
+            f"compute_workers={compute_workers},tasks={CONCURRENT_TASKS}": lambda: concurrent(pool_signer)}
+
+@benchmark("mpc.sign_combine")
+def bench_sign_combine():
+    mpc, partial_signatures, _ = signed_fixture(*signing_fixture())
+    return {"": lambda: mpc.sign_combine(partial_signatures)}
+
+@benchmark("signature_verifier.verify_sct")
+def bench_verify_sct():
+    signers, task, message = signing_fixture()
+    _, _, signature = signed_fixture(signers, task, message)
+    sct = {
+        "hashed_certificate": base64.b64encode(bytes(32)).decode("utf-8"),
+        "id": "LOG_ID",
+        "sct_version": "v1",
+        "signed_hash": signature,
+        "timestamp": 1736887033
+    }
+    if not verify_sct(sct):
+        raise RuntimeError("SCT fixture does not verify")
+    return {"": lambda: verify_sct(sct)}
+
+def threshold_signature(signers, task, message):
+    exchange_sign_shares(signers, task, message)
+    _, _, signature = signed_fixture(signers, task, message)
+    return signature
+
+@benchmark("signature_verifier.verify_scts_deduplicated")
+def bench_verify_scts():
+    rng = random.Random(0)
+    signers, _, _ = signing_fixture()
+    hashed_certificates = [random_hash(rng).hex() for _ in range(VERIFY_BATCH)]
+    scts = []
+    for i, hashed_certificate in enumerate(hashed_certificates):
+        sct = {
+            "hashed_certificate": base64.b64encode(bytes.fromhex(hashed_certificate)).decode("utf-8"),
+            "id": "LOG_ID",
+            "sct_version": "v1",
+            "timestamp": 1736887033 + i
+        }
+        sct["signed_hash"] = threshold_signature(signers, f"benchmark_{i}", sct_signable_data(hashed_certificate, "LOG_ID", sct["timestamp"]))
+        scts.append(sct)
+    levels, signable_data = build_batch(hashed_certificates, "LOG_ID", 1736887033)
+    signature = threshold_signature(signers, "benchmark_batch", signable_data)
+    batch = batched_scts(hashed_certificates, levels, signature, "LOG_ID", 1736887033)
+    if not all(verify_scts_deduplicated(scts + batch)):
+        raise RuntimeError("SCT fixtures do not verify")
+    return {f"per_item,scts={VERIFY_BATCH}": lambda: [verify_sct(sct) for sct in scts],
+            f"deduplicated,scts={VERIFY_BATCH}": lambda: verify_scts_deduplicated(scts),
+            f"per_item,batched_scts={VERIFY_BATCH}": lambda: [verify_sct(sct) for sct in batch],
+            f"deduplicated,batched_scts={VERIFY_BATCH}": lambda: verify_scts_deduplicated(batch)}
+
+@benchmark("signature_verifier.verify_sth")
+def bench_verify_sth():
+    sth = {
+        "ll_size": 470,
+        "sha256_root_hash": "nj0shwdgvtET15Qy6FQByckUX1YYC64DTgGlGmnLS1U=",
+        "timestamp": 1736776402,
+        "tree_head_signature": "84V7fOGujZWK9tEOrMJyhPMUsaTM/zXnqebbGy2VDsROuvS3DBzYoqLDmU8JEEJauw3TVcdrQZji4RhFKbNtBw==",
+        "tree_size": 493376048
+    }
+    if not verify_sth(sth):
+        raise RuntimeError("STH fixture does not verify")
+    return {"": lambda: verify_sth(sth)}
+
+@benchmark("json.dumps_sort_keys")
+def bench_canonical_json():
+    sth = {
+        "ll_size": 470,
+        "sha256_root_hash": "9e3d2c870760bed113d79432e85401c9c9145f56180bae034e01a51a69cb4b55",
+        "timestamp": 1736776402,
+        "tree_size": 493376048
+    }
+    return {"sth": lambda: json.dumps(sth, sort_keys=True).encode("utf-8"),
+            "sct": lambda: sct_signable_data("00" * 32, "LOG_ID", 1736887033)}
+
+@benchmark("signature_verifier.signed_data")
+def bench_signed_data():
+    sct = {
+        "hashed_certificate": base64.b64encode(bytes(32)).decode("utf-8"),
+        "id": "LOG_ID",
+        "signed_hash": base64.b64encode(bytes(64)).decode("utf-8"),
+        "timestamp": 1736887033
+    }
+    sth = {
+        "ll_size": 470,
+        "sha256_root_hash": "nj0shwdgvtET15Qy6FQByckUX1YYC64DTgGlGmnLS1U=",
+        "timestamp": 1736776402,
+        "tree_head_signature": base64.b64encode(bytes(64)).decode("utf-8"),
+        "tree_size": 493376048
+    }
+    cases = {}
+    for version in ("v1", "v2"):
+        version_sct = {**sct, "sct_version": version}
+        version_sth = {**sth, "sth_version": version}
+        print(f"{version}: SCT {len(sct_signed_data(version_sct))} bytes, STH {len(sth_signed_data(version_sth))} bytes",
+              file=sys.stderr)
+        cases[f"sct,{version}"] = lambda version_sct=version_sct: sct_signed_data(version_sct)
+        cases[f"sth,{version}"] = lambda version_sth=version_sth: sth_signed_data(version_sth)
+    return cases
+
+@benchmark("auditor.validate_merkle_inclusion_proof")
+def bench_inclusion_proof():
+    rng = random.Random(0)
+    cases = {}
+    for tree_size in TREE_SIZES:
+        # Leaves of the complete left subtree, their path length is the tree height
+        leaf_index = rng.randrange(1 << ((tree_size - 1).bit_length() - 1))
+        leaf = random_hash(rng)
+        path = [random_hash(rng) for _ in range((tree_size - 1).bit_length())]
+        root = root_from_audit_path(leaf_index, tree_size, leaf, path)
+        path = [base64.b64encode(p).decode("utf-8") for p in path]
+        if not validate_merkle_inclusion_proof(leaf_index, tree_size, root, leaf, path):
+            raise RuntimeError("Inclusion fixture does not verify")
+        cases[f"tree_size={tree_size}"] = (lambda leaf_index=leaf_index, tree_size=tree_size, root=root, leaf=leaf, path=path:
+                                           validate_merkle_inclusion_proof(leaf_index, tree_size, root, leaf, path))
+    return cases
+
+@benchmark("auditor.validate_merkle_inclusion_proofs")
+def bench_inclusion_proofs():
+    rng = random.Random(0)
+    leaves = [hash_leaf(rng.randbytes(8)) for _ in range(BATCH_TREE_SIZE)]
+    levels = merkle_levels(leaves)
+    start = BATCH_TREE_SIZE // 3
+    proofs = [(i, leaves[i], [base64.b64encode(p).decode("utf-8") for p in audit_path(i, levels)])
+              for i in range(start, start + BATCH_PROOFS)]
+    root = levels[-1][0]
+    return {f"per_leaf,proofs={BATCH_PROOFS}": lambda: [validate_merkle_inclusion_proof(i, BATCH_TREE_SIZE, root, leaf, path)
+                                                        for i, leaf, path in proofs],
+            f"batch,proofs={BATCH_PROOFS}": lambda: validate_merkle_inclusion_proofs(BATCH_TREE_SIZE, root, proofs)}
+
+def consistency_fixture(first_size, second_size, rng):
+    """
+    Creates a random consistency path of the right length and the roots it proves.
+
+    Follows the steps of validate_consistency_proof to derive both roots.
+    """
+    fn, sn = first_size - 1, second_size - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    steps = []
+    while sn:
+        if fn & 1 or fn == sn:
+            steps.append("both")
+            if fn & 1 == 0:
+                while (fn & 1) == 0 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            steps.append("second")
+        fn >>= 1
+        sn >>= 1
+    path = [random_hash(rng) for _ in range(len(steps) + 1)]
+    fr = sr = path[0]
+    for step, c in zip(steps, path[1:]):
+        if step == "both":
+            fr = hash_node(b'\x01', c, fr)
+            sr = hash_node(b'\x01', c, sr)
+        else:
+            sr = hash_node(b'\x01', sr, c)
+    return fr, sr, path
+
+@benchmark("auditor.validate_consistency_proof")
+def bench_consistency_proof():
+    rng = random.Random(0)
+    cases = {}
+    for tree_size in TREE_SIZES:
+        # Not a power of two, the first root is part of the proof
+        first_size = tree_size - 11
+        first_hash, second_hash, path = consistency_fixture(first_size, tree_size, rng)
+        if not validate_consistency_proof(first_hash, first_size, second_hash, tree_size, list(path)):
+            raise RuntimeError("Consistency fixture does not verify")
+        cases[f"tree_size={tree_size}"] = (lambda first_hash=first_hash, first_size=first_size, second_hash=second_hash, tree_size=tree_size, path=path:
+                                           validate_consistency_proof(first_hash, first_size, second_hash, tree_size, list(path)))
+    return cases
+
+@benchmark("startup.signer")
+def bench_startup():
+    app = Flask(__name__)
+    cache = Cache(app=app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 0})
+    signer_index = SELECTED_SIGNERS[0]
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}
+    def start_process():
+        # The api server needs the configuration.json of a signer
+        get_configuration()
+        subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], check=True, capture_output=True, env=env)
+    return {"process": start_process,
+            "multisigner": lambda: MultiSigner(signer_index, THRESHOLD, TOTAL_SIGNERS, cache,
+                                               f"{KEY_FOLDER}/combined_key_{signer_index}.json")}
+
+def run(selected=None):
+    results = {}
+    for name, setup in benchmarks.items():
+        if selected and not any(s in name for s in selected):
+            continue
+        # The signing service prints every sign share
+        with contextlib.redirect_stdout(io.StringIO()):
+            timings = {}
+            try:
+                cases = setup()
+            except SKIPPED_ERRORS as e:
+                cases = {}
+                timings[""] = e
+            for case, fun in cases.items():
+                try:
+                    timings[case] = measure(fun)
+                except SKIPPED_ERRORS as e:
+                    timings[case] = e
+        for case, seconds in timings.items():
+            key = f"{name}[{case}]" if case else name
+            if isinstance(seconds, Exception):
+                results[key] = {"skipped": f"{type(seconds).__name__}: {seconds}"}
+                print(f"{key:<70} skipped ({results[key]['skipped']})")
+                continue
+            results[key] = {"seconds_per_op": seconds, "ops_per_second": 1 / seconds}
+            print(f"{key:<70} {seconds * 1e6:>12.1f} us/op")
+    return results
+
+def compare(results, baseline, tolerance):
+    """Returns the benchmarks that got slower than the baseline by more than the tolerance."""
+    regressions = []
+    for key, result in results.items():
+        if "seconds_per_op" not in result or "seconds_per_op" not in baseline.get(key, {}):
+            continue
+        ratio = result["seconds_per_op"] / baseline[key]["seconds_per_op"]
+        print(f"{key:<70} {ratio:>8.2f}x baseline")
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Logledger microbenchmarks")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against this baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results as {BASELINE_FILE}")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument("--only", nargs="*", help="run only benchmarks containing these names")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": int(time.time()),
+        "results": run(args.only)
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as file:
+            json.dump(report, file, indent=4)
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(report["results"], baseline, args.tolerance)
+        if regressions:
+            print("Regressions:", ", ".join(regressions))
+            sys.exit(1)
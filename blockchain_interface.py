@@ -1,27 +1,42 @@
-from web3 import Web3
+from concurrent.futures import Future
 import requests
 import json
-import datetime
-from configuration import bc_configuration
-
-PRIVATE_KEY = bc_configuration["PRIVATE_KEY"] 
-ACCOUNT_ADDRESS = bc_configuration["ACCOUNT_ADDRESS"] 
-NODE_URL = bc_configuration["NODE_URL"]
+import os
+import threading
+import time
+from configuration import get_bc_configuration
+from hash_mirror import HashMirror
+from receipt_journal import ReceiptJournal
 
 GASSTATION = "https://gasstation.polygon.technology/amoy"
 OLD_HASH_STORAGE_ADRESS = "0x1e7A8418e6262802601Cb25B21F6DEd54Dc520e3"
 HASH_STORAGE_ADRESS = "0x54B802F966078242271967BA6b67F2EdAF14dD54"
 RECEIPT_FOLDER = "bc_receipt"
+MIRROR_FILE = "hash_mirror_{address}.bin"
+JOURNAL_FILE = RECEIPT_FOLDER + "/receipts_{address}.jsonl"
+HASH_RANGE_CHUNK = 1000 # hashes per getHashRange call to stay below the node's response limit
+
+GAS_LIMIT = 15_000_000
+GAS_PER_HASH = 23_000 # new storage slot, calldata and loop overhead of addHash
+BASE_GAS = 100_000
+MAX_HASHES_PER_TX = (GAS_LIMIT - BASE_GAS) // GAS_PER_HASH
+GAS_PRICE_REFRESH = 30 # seconds
+MAX_IN_FLIGHT = 4
+RECEIPT_POLL = 1
+RECEIPT_TIMEOUT = 120 # seconds until a transaction is replaced with a higher gas price
+GAS_PRICE_BUMP = 1.2 # nodes require at least +10% for a replacement
 
-def connect_to_amoy() -> Web3:
-    return Web3(Web3.HTTPProvider(NODE_URL))    
+# web3 takes more than a second to import, it is only imported once the chain is used
+def connect_to_amoy():
+    from web3 import Web3
+    return Web3(Web3.HTTPProvider(get_bc_configuration()["NODE_URL"]))    
 
-def show_stats(web3: Web3 = None):
+def show_stats(web3 = None):
     if web3 == None:
         web3 = connect_to_amoy()
     print(f"Conncected: {web3.is_connected()}")
     print(f"Blocknumber: {web3.eth.block_number}")
-    balance_wei = web3.eth.get_balance(ACCOUNT_ADDRESS)
+    balance_wei = web3.eth.get_balance(get_bc_configuration()["ACCOUNT_ADDRESS"])
     balance_gwei = balance_wei // 10**9
     print("Balance:",balance_gwei)
 
@@ -29,6 +44,26 @@ def get_gas_price():
     res = requests.get(GASSTATION).json()
     return res["fast"]["maxFee"]
 
+class GasPriceCache:
+    """Caches the gas station price and refreshes it at most every refresh_interval seconds."""
+    def __init__(self, refresh_interval=GAS_PRICE_REFRESH):
+        self.refresh_interval = refresh_interval
+        self.gas_price = None
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.gas_price is None or time.monotonic() - self.fetched_at > self.refresh_interval:
+                try:
+                    self.gas_price = get_gas_price()
+                    self.fetched_at = time.monotonic()
+                except Exception as e:
+                    # Keep using the last known price if the gas station is unavailable
+                    if self.gas_price is None:
+                        raise
+                    print("gas station unavailable:", e)
+            return self.gas_price
 
 def custom_serializer(obj):
     if isinstance(obj, bytes):
@@ -41,52 +76,282 @@ def custom_serializer(obj):
         return {k: custom_serializer(v) for k, v in obj.items()}  # Recursively handle dicts
     return str(obj)
 
-def store_receipt(hashes_inserted: int, receipt, total_hashes):
+def store_receipt(hashes_inserted: int, receipt, total_hashes, journal: ReceiptJournal):
     receipt = dict(receipt)
     receipt = custom_serializer(receipt)
-    current_time = datetime.datetime.now()
-    timestamp = current_time.strftime("%Y-%m-%d_%H:%M:%S")     
     receipt["hashes_inserted"] = hashes_inserted
     receipt["total_hashes"] = total_hashes
-    with open(f"{RECEIPT_FOLDER}/{timestamp}_{hashes_inserted}.json", "w") as file:
-        json.dump(receipt, file, indent=4)
+    journal.append(receipt)
 
-class HashStorage:
-    SC_ADRESS = HASH_STORAGE_ADRESS
-    ABI = [{"inputs":[],"stateMutability":"nonpayable","type":"constructor"},{"inputs":[{"internalType":"bytes32[]","name":"_hashes","type":"bytes32[]"}],"name":"addHash","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"index","type":"uint256"}],"name":"getHashByIndex","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"getHashCount","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"bytes32","name":"hash","type":"bytes32"}],"name":"isHashIncluded","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"view","type":"function"}]
-    def __init__(self, web3=None):
-        if web3 == None:
-            web3 = connect_to_amoy()
-        self.web3 = web3
-        self.roc_contract = web3.eth.contract(address=self.SC_ADRESS, abi=self.ABI)
+class PendingTransaction:
+    """An addHash transaction whose receipt is still outstanding."""
+    def __init__(self, nonce: int, start: int, hashes: list, gas_price):
+        self.nonce = nonce
+        self.start = start
+        self.hashes = hashes
+        self.gas_price = gas_price
+        self.tx_hashes = []
+        self.sent_at = 0
+        self.future = Future()
 
-    def add_hashes(self, hashes: list):
-        # Build the transaction
-                # Build the transaction        
-        txn = self.roc_contract.functions.addHash(
-            hashes
+class TransactionSubmitter:
+    """
+    Keeps several addHash transactions in flight.
+
+    Nonces are assigned locally, the gas price comes from a GasPriceCache and
+    a background thread polls the receipts. Transactions without receipt after
+    receipt_timeout are replaced with the same nonce and a higher gas price.
+    """
+    def __init__(self, storage, max_in_flight=MAX_IN_FLIGHT, receipt_timeout=RECEIPT_TIMEOUT):
+        self.storage = storage
+        self.receipt_timeout = receipt_timeout
+        self.gas_price = GasPriceCache()
+        self.slots = threading.Semaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.pending: dict[int, PendingTransaction] = {}
+        self.next_nonce = None
+        self.next_hash_index = None
+        self.tracker = None
+
+    def resync(self):
+        """Reads nonce and hash count from the chain, only valid while nothing is in flight."""
+        self.next_nonce = self.storage.web3.eth.get_transaction_count(get_bc_configuration()["ACCOUNT_ADDRESS"], 'pending')
+        self.next_hash_index = self.storage.get_hash_count()
+
+    def submit(self, hashes: list, expected_start=None) -> list[PendingTransaction]:
+        """
+        Sends the hashes split into transactions that fit the gas limit.
+
+        Blocks only while max_in_flight transactions are outstanding.
+
+        :param expected_start: The hash index the first hash must get, checked before anything is sent
+        :return: The pending transactions, their futures resolve to the receipts
+        """
+        transactions = []
+        for chunk_start in range(0, len(hashes), MAX_HASHES_PER_TX):
+            chunk = hashes[chunk_start:chunk_start + MAX_HASHES_PER_TX]
+            self.slots.acquire()
+            try:
+                with self.lock:
+                    if not self.pending:
+                        self.resync()
+                    if chunk_start == 0 and expected_start != None and self.next_hash_index != expected_start:
+                        raise ValueError(f"Hashes would be added at {self.next_hash_index}, expected {expected_start}")
+                    transaction = PendingTransaction(self.next_nonce, self.next_hash_index, chunk, self.gas_price.get())
+                    self.send(transaction)
+                    self.next_nonce += 1
+                    self.next_hash_index += len(chunk)
+                    self.pending[transaction.nonce] = transaction
+                    self.start_tracker()
+            except:
+                self.slots.release()
+                raise
+            transactions.append(transaction)
+        return transactions
+
+    def send(self, transaction: PendingTransaction):
+        txn = self.storage.roc_contract.functions.addHash(
+            transaction.hashes
         ).build_transaction({
-            'from': ACCOUNT_ADDRESS,
-            'nonce': self.web3.eth.get_transaction_count(ACCOUNT_ADDRESS),
-            'gas': 15_000_000,
-            'gasPrice': self.web3.to_wei(get_gas_price(), 'gwei')
+            'from': get_bc_configuration()["ACCOUNT_ADDRESS"],
+            'nonce': transaction.nonce,
+            'gas': GAS_LIMIT,
+            'gasPrice': self.storage.web3.to_wei(transaction.gas_price, 'gwei')
         })
+        signed_txn = self.storage.web3.eth.account.sign_transaction(txn, get_bc_configuration()["PRIVATE_KEY"])
+        tx_hash = self.storage.web3.eth.send_raw_transaction(signed_txn.raw_transaction)
+        transaction.tx_hashes.append(tx_hash)
+        transaction.sent_at = time.monotonic()
+        print(f"Transaction sent. Nonce: {transaction.nonce} Hash: {tx_hash.hex()}")
+
+    def start_tracker(self):
+        """Starts the receipt tracker if none is running, called with the lock held."""
+        if self.tracker is None:
+            self.tracker = threading.Thread(target=self.track_receipts, daemon=True)
+            self.tracker.start()
 
-        # Sign and send the transaction
-        signed_txn = self.web3.eth.account.sign_transaction(txn, PRIVATE_KEY)
-        tx_hash = self.web3.eth.send_raw_transaction(signed_txn.raw_transaction)
-        receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+    def track_receipts(self):
+        while True:
+            with self.lock:
+                transactions = list(self.pending.values())
+                # Stopping and clearing the tracker is one step, a submit in
+                # between would otherwise see a running tracker that is exiting
+                if not transactions:
+                    self.tracker = None
+                    return
+            for transaction in transactions:
+                try:
+                    self.check_receipt(transaction)
+                except Exception as e:
+                    print(f"Receipt check for nonce {transaction.nonce} failed: {e}")
+            time.sleep(RECEIPT_POLL)
 
-        print(f"Transaction sent. Hash: {tx_hash.hex()}")
+    def check_receipt(self, transaction: PendingTransaction):
+        from web3.exceptions import TransactionNotFound
+        # Any of the replacements may be the one that got mined
+        for tx_hash in transaction.tx_hashes:
+            try:
+                receipt = self.storage.web3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+            self.complete(transaction, receipt)
+            return
+        if time.monotonic() - transaction.sent_at > self.receipt_timeout:
+            transaction.gas_price = self.gas_price.get() if self.gas_price.get() > transaction.gas_price * GAS_PRICE_BUMP \
+                else transaction.gas_price * GAS_PRICE_BUMP
+            print(f"Replacing transaction with nonce {transaction.nonce}")
+            self.send(transaction)
+
+    def complete(self, transaction: PendingTransaction, receipt):
+        with self.lock:
+            self.pending.pop(transaction.nonce, None)
+        self.slots.release()
         print("receipt:", receipt)
-        total_hashes = self.get_hash_count()
-        store_receipt(len(hashes), receipt, total_hashes)
-        return tx_hash.hex()
+        total_hashes = transaction.start + len(transaction.hashes)
+        store_receipt(len(transaction.hashes), receipt, total_hashes, self.storage.receipts)
+        if receipt["status"] != 1:
+            # The following transactions got other hash indexes than assumed,
+            # they are resynced once nothing is in flight anymore
+            transaction.future.set_exception(RuntimeError(f"Transaction with nonce {transaction.nonce} reverted"))
+            return
+        # The hashes are not mirrored here, start is only the index this submitter
+        # assumed and another writer may have added hashes first. The mirror is
+        # filled from chain reads and sync_mirror.
+        transaction.future.set_result(receipt)
+
+class HashStorage:
+    SC_ADRESS = HASH_STORAGE_ADRESS
+    ABI = [{"inputs":[],"stateMutability":"nonpayable","type":"constructor"},{"inputs":[{"internalType":"bytes32[]","name":"_hashes","type":"bytes32[]"}],"name":"addHash","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"index","type":"uint256"}],"name":"getHashByIndex","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"start","type":"uint256"},{"internalType":"uint256","name":"count","type":"uint256"}],"name":"getHashRange","outputs":[{"internalType":"bytes32[]","name":"","type":"bytes32[]"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"getHashCount","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"bytes32","name":"hash","type":"bytes32"}],"name":"isHashIncluded","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"view","type":"function"}]
+    def __init__(self, web3=None, mirror_file=None, address=None, journal_file=None):
+        if address == None:
+            address = self.SC_ADRESS
+        self.address = address
+        # Connected on first use
+        self._web3 = web3
+        self._roc_contract = None
+        self.connect_lock = threading.Lock()
+        # Contracts deployed before getHashRange existed are read index by index
+        self.supports_range_reads = True
+        if mirror_file == None:
+            mirror_file = MIRROR_FILE.format(address=address)
+        self.mirror = HashMirror(mirror_file)
+        if journal_file == None:
+            os.makedirs(RECEIPT_FOLDER, exist_ok=True)
+            journal_file = JOURNAL_FILE.format(address=address)
+        self.receipts = ReceiptJournal(journal_file)
+        self.submitter = TransactionSubmitter(self)
+
+    @property
+    def web3(self):
+        with self.connect_lock:
+            if self._web3 == None:
+                self._web3 = connect_to_amoy()
+            return self._web3
+
+    @property
+    def roc_contract(self):
+        if self._roc_contract == None:
+            web3 = self.web3
+            with self.connect_lock:
+                if self._roc_contract == None:
+                    self._roc_contract = web3.eth.contract(address=self.address, abi=self.ABI)
+        return self._roc_contract
+
+    def add_hashes(self, hashes: list):
+        """
+        Adds the hashes on chain and waits for all receipts.
+
+        :return: The hash of the last transaction
+        """
+        transactions = self.add_hashes_async(hashes)
+        for transaction in transactions:
+            transaction.future.result()
+        return transactions[-1].tx_hashes[-1].hex()
+
+    def add_hashes_async(self, hashes: list, expected_start=None) -> list[PendingTransaction]:
+        """
+        Sends the hashes in as many transactions as needed without waiting for the receipts.
+
+        :param expected_start: The hash index the first hash must get, nothing is sent otherwise
+        """
+        return self.submitter.submit(hashes, expected_start)
 
     def get_hash_by_index(self, index):
+        hash_value = self.mirror.get(index)
+        if hash_value is not None:
+            return hash_value
+        hash_value = self.get_hash_by_index_from_chain(index)
+        if index == len(self.mirror):
+            self.mirror.append(index, [hash_value])
+        return hash_value
+
+    def get_hash_by_index_from_chain(self, index):
         hash_value = self.roc_contract.functions.getHashByIndex(index).call()
         return hash_value.hex()
+
+    def get_hashes(self, start, end):
+        """
+        Fetches the hashes of the index range [start, end).
+        """
+        hashes = self.mirror.get_range(start, end)
+        if hashes is not None:
+            return hashes
+        mirrored = min(max(len(self.mirror), start), end)
+        hashes = self.mirror.get_range(start, mirrored) or []
+        missing = self.get_hashes_from_chain(mirrored, end)
+        if mirrored == len(self.mirror):
+            self.mirror.append(mirrored, missing)
+        return hashes + missing
+
+    def get_hashes_from_chain(self, start, end):
+        """
+        Fetches the hashes of the index range [start, end) from the contract 
+        in chunks of HASH_RANGE_CHUNK.
+        """
+        hashes = []
+        for chunk_start in range(start, end, HASH_RANGE_CHUNK):
+            count = min(HASH_RANGE_CHUNK, end - chunk_start)
+            chunk = self.get_hash_range_from_chain(chunk_start, count)
+            if len(chunk) != count:
+                raise IndexError("Index out of bounds")
+            hashes += chunk
+        return hashes
+
+    def get_hash_range_from_chain(self, start, count):
+        from web3.exceptions import BadFunctionCallOutput, ContractLogicError
+        if self.supports_range_reads:
+            try:
+                hash_values = self.roc_contract.functions.getHashRange(start, count).call()
+                return [hash_value.hex() for hash_value in hash_values]
+            except (BadFunctionCallOutput, ContractLogicError) as e:
+                # A contract without getHashRange reverts without reason or returns nothing,
+                # a revert with a reason comes from getHashRange itself
+                if isinstance(e, ContractLogicError) and e.data not in (None, "", "0x"):
+                    raise
+                print("Contract has no getHashRange, reading hash by hash:", e)
+                self.supports_range_reads = False
+        return [self.get_hash_by_index_from_chain(index) for index in range(start, start + count)]
+
+    def sync_mirror(self):
+        """
+        Fetches the on-chain hashes not yet present in the local mirror.
+
+        :return: The number of mirrored hashes
+        """
+        return self.mirror.sync(self.get_hash_count, self.get_hashes_from_chain)
     
+    def get_receipt_by_hash_index(self, index):
+        """
+        Returns the stored receipt of the transaction that added the hash index or None.
+        """
+        return self.receipts.find(index)
+
+    def get_receipts(self, start, end):
+        """
+        Returns the stored receipts of the transactions that added the hash indexes [start, end).
+        """
+        return self.receipts.find_range(start, end)
+
     def get_hash_count(self):
         count = self.roc_contract.functions.getHashCount().call()
         return count
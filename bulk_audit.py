@@ -0,0 +1,221 @@
+"""
+Audits the stored SCTs and STHs in bulk.
+
+Verifies the signatures on a process pool, checks every SCT against the
+on-chain hash of its index and the consistency of consecutive STHs with the
+log. The results are appended to a log file, an interrupted audit continues
+where it stopped when started again with the same log.
+
+>python3 bulk_audit.py
+>python3 bulk_audit.py --skip-chain --workers 8 old_requestor_scts old_stored_sths
+"""
+import argparse
+import base64
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from CT_interface import get_consistency_proof
+from auditor import validate_consistency_proof
+from signature_verifier import verify_scts_deduplicated, verify_sths_deduplicated
+
+SOURCES = ["requestor_scts", "requestor_sths", "stored_sths", "issued_scts",
+           "old_requestor_scts", "old_requestor_sths", "old_stored_sths"]
+RESULTS_FILE = "audit_results.jsonl"
+REPORT_FILE = "audit_report.json"
+CHUNK_SIZE = 256
+CONSISTENCY_WORKERS = 4
+
+storage = None
+
+def sct_index_of(name):
+    match = re.fullmatch(r"index_(\d+)\.json", name)
+    return int(match.group(1)) if match else None
+
+def iter_artifacts(paths):
+    """
+    Streams the stored artifacts as tuples of (source, kind, index, artifact).
+
+    Reads the JSON files of the folders and the records of JSON lines stores,
+    the index is the on-chain index of an SCT if it is known.
+    """
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        files = [path] if os.path.isfile(path) else [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        for file in files:
+            if file.endswith(".jsonl"):
+                with open(file, "r") as f:
+                    for line_number, line in enumerate(f):
+                        if not line.endswith("\n"):
+                            break
+                        record = json.loads(line)
+                        # SCT store records wrap the SCT with its index
+                        artifact = record.get("sct", record)
+                        yield f"{file}:{line_number}", kind_of(artifact), record.get("index"), artifact
+            elif file.endswith(".json"):
+                with open(file, "r") as f:
+                    artifact = json.load(f)
+                yield file, kind_of(artifact), sct_index_of(os.path.basename(file)), artifact
+
+def kind_of(artifact):
+    if "signed_hash" in artifact:
+        return "sct"
+    if "tree_head_signature" in artifact:
+        return "sth"
+    return "unknown"
+
+def init_worker(address, skip_chain):
+    global storage
+    if not skip_chain:
+        from blockchain_interface import HashStorage
+        storage = HashStorage(address=address)
+
+def on_chain_hash(index):
+    try:
+        return storage.get_hash_by_index(index).removeprefix("0x").lower()
+    except Exception:
+        return None
+
+def audit_chunk(items):
+    """
+    Audits a chunk of artifacts in a worker process.
+
+    :return: One result per artifact
+    """
+    scts = [item for item in items if item[1] == "sct"]
+    sths = [item for item in items if item[1] == "sth"]
+    results = []
+    for (source, kind, index, sct), valid in zip(scts, verify_scts_deduplicated([item[3] for item in scts])):
+        result = {"source": source, "kind": kind, "index": index, "signature": valid}
+        if storage is not None and index is not None:
+            chain_hash = on_chain_hash(index)
+            result["chain"] = None if chain_hash is None \
+                else chain_hash == base64.b64decode(sct["hashed_certificate"]).hex()
+        results.append(result)
+    for (source, kind, _, sth), valid in zip(sths, verify_sths_deduplicated([item[3] for item in sths])):
+        results.append({"source": source, "kind": kind, "signature": valid,
+                        "tree_size": sth["tree_size"], "sha256_root_hash": sth["sha256_root_hash"]})
+    for source, kind, _, _ in (item for item in items if item[1] == "unknown"):
+        results.append({"source": source, "kind": kind})
+    return results
+
+def is_final(result):
+    """Results with a check that could not run are repeated by a resumed audit."""
+    return all(result.get(check, True) is not None for check in ("chain", "consistent"))
+
+def load_results(results_file):
+    """Reads the results of an earlier, maybe interrupted, audit."""
+    results = {}
+    if os.path.exists(results_file):
+        with open(results_file, "r") as file:
+            for line in file:
+                if line.endswith("\n"):
+                    result = json.loads(line)
+                    results[result["source"]] = result
+    return results
+
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def audit_signatures(paths, results, results_file, workers, address, skip_chain):
+    """Verifies the artifacts not audited yet, at most two chunks per worker are in flight."""
+    pending = (item for item in iter_artifacts(paths) if item[0] not in results or not is_final(results[item[0]]))
+    with open(results_file, "a") as log, \
+         ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(address, skip_chain)) as executor:
+        in_flight = set()
+        for chunk in chunks(pending, CHUNK_SIZE):
+            if len(in_flight) >= 2 * workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                write_results(done, results, log)
+            in_flight.add(executor.submit(audit_chunk, chunk))
+        write_results(in_flight, results, log)
+
+def write_results(futures, results, log):
+    for future in futures:
+        for result in future.result():
+            results[result["source"]] = result
+            log.write(json.dumps(result) + "\n")
+    log.flush()
+
+def check_consistency(first, second):
+    """
+    Checks the consistency of two tree heads with a proof from the log.
+
+    :return: True, False or None if the log did not answer
+    """
+    proof = get_consistency_proof(first["tree_size"], second["tree_size"])
+    if proof is None:
+        return None
+    try:
+        return validate_consistency_proof(base64.b64decode(first["sha256_root_hash"]), first["tree_size"],
+                                          base64.b64decode(second["sha256_root_hash"]), second["tree_size"],
+                                          [base64.b64decode(node) for node in proof])
+    except ValueError:
+        return False
+
+def audit_consistency(results, results_file):
+    """Checks every pair of consecutive distinct tree heads with a valid signature."""
+    heads = {(result["tree_size"], result["sha256_root_hash"]) for result in results.values()
+             if result["kind"] == "sth" and result["signature"]}
+    heads = [{"tree_size": size, "sha256_root_hash": root} for size, root in sorted(heads)]
+    pairs = [(first, second) for first, second in zip(heads, heads[1:])
+             if not is_final(results.get(f"consistency:{first['tree_size']}-{second['tree_size']}", {"consistent": None}))]
+    with open(results_file, "a") as log, ThreadPoolExecutor(max_workers=CONSISTENCY_WORKERS) as executor:
+        for (first, second), consistent in zip(pairs, executor.map(lambda pair: pair_consistency(*pair), pairs)):
+            result = {"source": f"consistency:{first['tree_size']}-{second['tree_size']}",
+                      "kind": "consistency", "consistent": consistent}
+            results[result["source"]] = result
+            log.write(json.dumps(result) + "\n")
+            log.flush()
+
+def pair_consistency(first, second):
+    if first["tree_size"] == second["tree_size"]:
+        # Two different roots for the same tree size are a split view
+        return False
+    return check_consistency(first, second)
+
+def summarize(results):
+    report = {"sct": {}, "sth": {}, "consistency": {}, "unknown": {}, "failures": []}
+    for result in results.values():
+        counts = report[result["kind"]]
+        counts["checked"] = counts.get("checked", 0) + 1
+        for check in ("signature", "chain", "consistent"):
+            if check not in result:
+                continue
+            outcome = {True: "valid", False: "invalid", None: "unchecked"}[result[check]]
+            counts[f"{check}_{outcome}"] = counts.get(f"{check}_{outcome}", 0) + 1
+            if result[check] is False:
+                report["failures"].append({"source": result["source"], "check": check})
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk audit of the stored SCTs and STHs")
+    parser.add_argument("paths", nargs="*", default=SOURCES, help="folders or JSON lines stores to audit")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes verifying signatures")
+    parser.add_argument("--results", default=RESULTS_FILE, help="result log, an existing one is resumed")
+    parser.add_argument("--report", default=REPORT_FILE, help="summary report")
+    parser.add_argument("--address", default=None, help="address of the hash storage contract")
+    parser.add_argument("--skip-chain", action="store_true", help="do not compare the SCTs with the chain")
+    parser.add_argument("--skip-consistency", action="store_true", help="do not request consistency proofs")
+    args = parser.parse_args()
+
+    results = load_results(args.results)
+    if results:
+        print("resuming after", len(results), "results")
+    audit_signatures(args.paths, results, args.results, args.workers, args.address, args.skip_chain)
+    if not args.skip_consistency:
+        audit_consistency(results, args.results)
+
+    report = summarize(results)
+    with open(args.report, "w") as file:
+        json.dump(report, file, indent=4)
+    print(json.dumps({kind: counts for kind, counts in report.items() if kind != "failures"}, indent=4))
+    print("failures:", len(report["failures"]))
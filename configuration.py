@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import TypedDict, NotRequired
 import json
 
 CONFIGURATION_FILE = "configuration.json"
@@ -12,6 +12,14 @@ class Configuration(TypedDict):
     public_key: int
     log_id: str
     key_folder: str
+    signing_timeout: NotRequired[float]
+    audit_workers: NotRequired[int]
+    ct_log_url: NotRequired[str]
+    max_concurrent_signings: NotRequired[int]
+    signer_timeout: NotRequired[float]
+    session_store_url: NotRequired[str]
+    signed_data_version: NotRequired[str]
+    compute_workers: NotRequired[int]
 
 class InvalidConfigError(Exception):
     """Custom exception raised when no valid configuration is provided."""
@@ -22,7 +30,7 @@ def load_json_configuration(path, configuration_type):
     try:
         with open(path, 'r') as file:
             data: Configuration = json.load(file)
-        must_have_items = list(configuration_type.__annotations__.keys())
+        must_have_items = list(configuration_type.__required_keys__)
         items = list(data.keys())
         if not all(c in items for c in must_have_items):
             raise InvalidConfigError 
@@ -31,11 +39,32 @@ def load_json_configuration(path, configuration_type):
     except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
         raise InvalidConfigError 
     
-configuration: Configuration = load_json_configuration(CONFIGURATION_FILE, Configuration)
+_configuration: Configuration = None
+
+def get_configuration() -> Configuration:
+    """Loads the signer configuration on first use, verifiers and auditors run without it."""
+    global _configuration
+    if _configuration is None:
+        _configuration = load_json_configuration(CONFIGURATION_FILE, Configuration)
+    return _configuration
 
 class BC_Configuration(TypedDict):
     PRIVATE_KEY: str
     ACCOUNT_ADDRESS: str
     NODE_URL: str
 
-bc_configuration: BC_Configuration = load_json_configuration(BC_CONFIGURATION_FILE, BC_Configuration)
\ No newline at end of file
+_bc_configuration: BC_Configuration = None
+
+def get_bc_configuration() -> BC_Configuration:
+    """Loads the blockchain configuration on first use, only the blockchain interface needs it."""
+    global _bc_configuration
+    if _bc_configuration is None:
+        _bc_configuration = load_json_configuration(BC_CONFIGURATION_FILE, BC_Configuration)
+    return _bc_configuration
+
+def __getattr__(name):
+    if name == "configuration":
+        return get_configuration()
+    if name == "bc_configuration":
+        return get_bc_configuration()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
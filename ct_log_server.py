@@ -0,0 +1,164 @@
+"""
+Local stand-in for a RFC 6962 CT log, used for load tests instead of the rate limited OAK log.
+
+>python3 ct_log_server.py --leaves 1000000 --grow-rate 100
+
+Point the CT interface at it with "ct_log_url": "http://localhost:6962/ct/v1/" in the configuration.
+"""
+from flask import Flask, jsonify, request
+import argparse
+import base64
+import os
+import struct
+import threading
+import time
+from nacl.signing import SigningKey
+from merkle_tree import MerkleTree, hash_leaf
+
+MAX_ENTRIES_PER_REQUEST = 256
+PORT = 6962
+
+app = Flask(__name__)
+
+def encode_base64(data: bytes) -> str:
+    return base64.b64encode(data).decode("utf-8")
+
+def merkle_tree_leaf(certificate: bytes, timestamp: int) -> bytes:
+    """RFC 6962 MerkleTreeLeaf of a x509 entry (version v1, timestamped_entry)."""
+    return struct.pack(">BBQH", 0, 0, timestamp, 0) \
+        + len(certificate).to_bytes(3, "big") + certificate \
+        + struct.pack(">H", 0)
+
+class CTLog:
+    """In-memory CT log backed by an append-only Merkle tree."""
+    def __init__(self):
+        self.tree = MerkleTree()
+        self.leaf_inputs: list[bytes] = []
+        self.leaf_indexes: dict[bytes, int] = {}
+        self.lock = threading.Lock()
+        self.signing_key = SigningKey.generate()
+
+    def __len__(self):
+        return len(self.leaf_inputs)
+
+    def add_certificates(self, certificates: list[bytes]) -> int:
+        """
+        Appends the certificates as new leaves.
+
+        :return: The tree size afterwards
+        """
+        timestamp = int(time.time() * 1000)
+        leaf_inputs = [merkle_tree_leaf(certificate, timestamp) for certificate in certificates]
+        leaves = [hash_leaf(leaf_input) for leaf_input in leaf_inputs]
+        with self.lock:
+            for leaf_input, leaf in zip(leaf_inputs, leaves):
+                self.leaf_indexes.setdefault(leaf, self.tree.append(leaf))
+                # Readers only look at the first tree_size entries, append them last
+                self.leaf_inputs.append(leaf_input)
+            return len(self.leaf_inputs)
+
+    def add_random_certificates(self, count: int, size: int = 64) -> int:
+        return self.add_certificates([os.urandom(size) for _ in range(count)])
+
+    def sth(self):
+        tree_size = len(self)
+        timestamp = int(time.time() * 1000)
+        root = self.tree.root(tree_size)
+        tree_head = struct.pack(">BBQQ", 0, 1, timestamp, tree_size) + root
+        return {
+            "tree_size": tree_size,
+            "timestamp": timestamp,
+            "sha256_root_hash": encode_base64(root),
+            "tree_head_signature": encode_base64(self.signing_key.sign(tree_head).signature)
+        }
+
+log = CTLog()
+
+def error(message, status=400):
+    return jsonify({"success": False, "error_message": message}), status
+
+def int_arg(name):
+    value = request.args.get(name)
+    if value is None or not value.isdigit():
+        raise ValueError(f"Missing or invalid parameter: {name}")
+    return int(value)
+
+@app.errorhandler(ValueError)
+def invalid_parameter(e):
+    return error(str(e))
+
+@app.route('/ct/v1/get-sth', methods=['GET'])
+def get_sth():
+    return jsonify(log.sth()), 200
+
+@app.route('/ct/v1/get-entries', methods=['GET'])
+def get_entries():
+    start, end = int_arg("start"), int_arg("end")
+    tree_size = len(log)
+    if start > end or start >= tree_size:
+        return error("Invalid range")
+    # Like real logs the response may be shorter than requested
+    end = min(end, tree_size - 1, start + MAX_ENTRIES_PER_REQUEST - 1)
+    entries = [{"leaf_input": encode_base64(log.leaf_inputs[i]), "extra_data": ""}
+               for i in range(start, end + 1)]
+    return jsonify({"entries": entries}), 200
+
+@app.route('/ct/v1/get-sth-consistency', methods=['GET'])
+def get_sth_consistency():
+    first, second = int_arg("first"), int_arg("second")
+    if not 0 < first <= second <= len(log):
+        return error("Invalid tree sizes")
+    proof = log.tree.consistency_proof(first, second)
+    return jsonify({"consistency": [encode_base64(node) for node in proof]}), 200
+
+@app.route('/ct/v1/get-proof-by-hash', methods=['GET'])
+def get_proof_by_hash():
+    tree_size = int_arg("tree_size")
+    leaf = base64.b64decode(request.args.get("hash", ""))
+    leaf_index = log.leaf_indexes.get(leaf)
+    if tree_size > len(log):
+        return error("Invalid tree size")
+    if leaf_index is None or leaf_index >= tree_size:
+        return error("Hash not found", 404)
+    audit_path = log.tree.audit_path(leaf_index, tree_size)
+    return jsonify({"leaf_index": leaf_index, "audit_path": [encode_base64(node) for node in audit_path]}), 200
+
+@app.route('/ct/v1/get-entry-and-proof', methods=['GET'])
+def get_entry_and_proof():
+    leaf_index, tree_size = int_arg("leaf_index"), int_arg("tree_size")
+    if not leaf_index < tree_size <= len(log):
+        return error("Invalid leaf index or tree size")
+    audit_path = log.tree.audit_path(leaf_index, tree_size)
+    return jsonify({
+        "leaf_input": encode_base64(log.leaf_inputs[leaf_index]),
+        "extra_data": "",
+        "audit_path": [encode_base64(node) for node in audit_path]
+    }), 200
+
+@app.route('/ct/v1/add-chain', methods=['POST'])
+def add_chain():
+    chain = request.get_json()["chain"]
+    if not chain:
+        return error("Empty chain")
+    log.add_certificates([base64.b64decode(chain[0])])
+    return jsonify({"sct_version": 0, "timestamp": int(time.time() * 1000)}), 200
+
+def grow(rate: int):
+    """Appends rate random certificates per second."""
+    while True:
+        log.add_random_certificates(rate)
+        time.sleep(1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local CT log stand-in")
+    parser.add_argument("--leaves", type=int, default=1000, help="random certificates to start with")
+    parser.add_argument("--grow-rate", type=int, default=0, help="random certificates added per second")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    for _ in range(0, args.leaves, 10_000):
+        log.add_random_certificates(min(10_000, args.leaves - len(log)))
+    print("tree size:", len(log))
+    if args.grow_rate:
+        threading.Thread(target=grow, args=(args.grow_rate,), daemon=True).start()
+    app.run(port=args.port, threaded=True)
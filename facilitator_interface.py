@@ -9,6 +9,21 @@ def sign_sct(index: int) -> SCT:
     except Exception as e: 
         print("sign_sct exception", e)
     
+def sign_sct_batch(start: int, end: int) -> list[SCT]:
+    try:
+        return requests.get(f"{BASE_URL}/sign_sct_batch/{start}/{end}").json()
+    except Exception as e: 
+        print("sign_sct_batch exception", e)
+
+def get_sct_by_hash(certificate_hash: str) -> SCT:
+    """
+    :param certificate_hash: The certificate hash as hex string
+    """
+    try:
+        return requests.get(f"{BASE_URL}/sct_by_hash/{certificate_hash.removeprefix('0x')}").json()
+    except Exception as e: 
+        print("get_sct_by_hash exception", e)
+
 def sign_mth(mth: STH, sth = None, consistency_proof = None) -> STH:
     try:
         #mth["ll_size"] = 600 add this with a value 10 higher than the latest sth if constant failure
@@ -19,4 +34,28 @@ def sign_mth(mth: STH, sth = None, consistency_proof = None) -> STH:
             body_json["consistency_proof"] = consistency_proof
         return requests.get(f"{BASE_URL}/sign_mth", json=body_json).json()
     except Exception as e: 
-        print("sign_sth exception", e)
\ No newline at end of file
+        print("sign_sth exception", e)
+
+def get_latest_sth(etag: str = None) -> tuple[STH, str]:
+    """
+    Polls the latest signed tree head.
+
+    :param etag: ETag of the STH the caller has already
+    :return: Tuple of the STH and its ETag, the STH is None if it did not change
+    """
+    try:
+        headers = {"If-None-Match": f'"{etag}"'} if etag != None else {}
+        response = requests.get(f"{BASE_URL}/sth", headers=headers)
+        etag = response.headers.get("ETag", "").strip('"')
+        if response.status_code == 304:
+            return None, etag
+        return response.json(), etag
+    except Exception as e: 
+        print("get_latest_sth exception", e)
+        return None, etag
+
+def get_sth(ll_size: int) -> STH:
+    try:
+        return requests.get(f"{BASE_URL}/sth/{ll_size}").json()
+    except Exception as e: 
+        print("get_sth exception", e)
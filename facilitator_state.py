@@ -0,0 +1,52 @@
+"""
+State and helpers shared by the Flask (api_facilitator.py) and the asyncio
+(async_facilitator.py) facilitator: the stores, the signer health and the
+handling of the signers' answers.
+"""
+import ggmpc
+from ggmpc import curves
+from blockchain_interface import HashStorage
+from configuration import configuration
+from signing_service import encode_signature_base64
+from sth_store import STHStore
+from sct_store import SCTStore
+from signed_data import JSON_VERSION
+from signer_health import SignerHealth, MissingSignSharesError
+
+STH_FOLDER = "stored_sths"
+SCT_FOLDER = "issued_scts"
+
+storage = HashStorage()
+sth_store = STHStore(STH_FOLDER)
+sct_store = SCTStore(SCT_FOLDER)
+SIGNED_DATA_VERSION = configuration.get("signed_data_version", JSON_VERSION)
+SIGNER_TIMEOUT = configuration.get("signer_timeout", 35)
+signer_urls = {int(key): url for key, url in configuration["urls"].items()}
+signer_health = SignerHealth(list(signer_urls), configuration["threshold"])
+mpc = ggmpc.Eddsa(curves.ed25519)
+
+def missing_signers_of(response) -> list[int]:
+    """The signers whose sign shares a failed signer reported as missing."""
+    try:
+        return [int(signer_index) for signer_index in response.json().get("missing", [])]
+    except (ValueError, TypeError, AttributeError):
+        return []
+
+def blame_signers(exception, signer_index, excluded: set):
+    """
+    Excludes the signers responsible for a failure from the next committee.
+
+    A signer that waited in vain for the shares of others is not at fault,
+    the signers it names are. The other failures are recorded by the fetch.
+    """
+    if isinstance(exception, MissingSignSharesError):
+        for missing_index in exception.signers:
+            if missing_index in signer_health.stats and missing_index not in excluded:
+                signer_health.record_failure(missing_index)
+                excluded.add(missing_index)
+    else:
+        excluded.add(signer_index)
+
+def combine_signature(partial_signatures):
+    final_signature = mpc.sign_combine(tuple(partial_signatures))
+    return encode_signature_base64(final_signature["R"], final_signature["sigma"])
@@ -0,0 +1,121 @@
+import fcntl
+import mmap
+import os
+import threading
+
+RECORD_SIZE = 32
+
+class HashMirror:
+    """
+    Append-only local copy of the on-chain numberedHashes array.
+
+    The hashes are stored as fixed 32-byte records in a memory-mapped file.
+    Several processes may share the same file; writers serialize via a file lock.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a+b")
+        self.count = 0
+        self.mmap = None
+        with self.lock:
+            self._lock_file()
+            try:
+                # Drop a partially written record of an interrupted append
+                size = os.fstat(self.file.fileno()).st_size
+                if size % RECORD_SIZE:
+                    self.file.truncate(size - size % RECORD_SIZE)
+            finally:
+                self._unlock_file()
+            self._refresh()
+
+    def _lock_file(self):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(self):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Picks up records appended by this or another process."""
+        count = os.fstat(self.file.fileno()).st_size // RECORD_SIZE
+        if count == self.count and self.mmap is not None:
+            return
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+        self.count = count
+        if count:
+            self.mmap = mmap.mmap(self.file.fileno(), count * RECORD_SIZE, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def get(self, index: int):
+        """
+        Returns the hash at the given index as hex string or None if not synced yet.
+        """
+        with self.lock:
+            if index >= self.count:
+                self._refresh()
+                if index >= self.count:
+                    return None
+            return self.mmap[index * RECORD_SIZE:(index + 1) * RECORD_SIZE].hex()
+
+    def get_range(self, start: int, end: int):
+        """
+        Returns the hashes of the index range [start, end) or None if not synced yet.
+        """
+        if start >= end:
+            return []
+        with self.lock:
+            if end > self.count:
+                self._refresh()
+                if end > self.count:
+                    return None
+            data = self.mmap[start * RECORD_SIZE:end * RECORD_SIZE]
+        return [data[i:i + RECORD_SIZE].hex() for i in range(0, len(data), RECORD_SIZE)]
+
+    def append(self, start: int, hashes: list[str]):
+        """
+        Appends hashes starting at the given on-chain index.
+
+        Hashes already mirrored are skipped, gaps are refused.
+        """
+        with self.lock:
+            self._lock_file()
+            try:
+                self._refresh()
+                if start > self.count:
+                    raise IndexError("Mirror cannot have gaps")
+                new_hashes = hashes[self.count - start:]
+                if not new_hashes:
+                    return
+                self.file.write(b"".join(bytes.fromhex(h.removeprefix("0x")) for h in new_hashes))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self._refresh()
+            finally:
+                self._unlock_file()
+
+    def sync(self, get_hash_count, get_hashes) -> int:
+        """
+        Incrementally fetches the hashes missing in the mirror.
+
+        :param get_hash_count: Returns the number of hashes on chain
+        :param get_hashes: Returns the on-chain hashes of the index range [start, end)
+        :return: The number of mirrored hashes
+        """
+        with self.lock:
+            self._refresh()
+            start = self.count
+        end = get_hash_count()
+        if end > start:
+            self.append(start, get_hashes(start, end))
+        return self.count
+
+    def close(self):
+        with self.lock:
+            if self.mmap is not None:
+                self.mmap.close()
+                self.mmap = None
+            self.file.close()
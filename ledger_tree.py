@@ -0,0 +1,55 @@
+import threading
+from merkle_tree import MerkleTree
+
+class LedgerTree:
+    """
+    Incremental Merkle tree over the hashes stored in HashStorage.
+
+    The requestor submits the log entries in order, so the on-chain hash at
+    index i is the leaf hash of log entry i and the tree over the on-chain
+    hashes is a prefix of the log's tree. Whenever it covers an STH, the STH's
+    root can be checked locally instead of requesting one proof per leaf.
+    """
+    def __init__(self, get_hash_count, get_hashes):
+        """
+        :param get_hash_count: Returns the number of hashes on chain
+        :param get_hashes: Returns the on-chain hashes of the index range [start, end)
+        """
+        self.get_hash_count = get_hash_count
+        self.get_hashes = get_hashes
+        self.tree = MerkleTree()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tree)
+
+    def sync(self) -> int:
+        """
+        Ingests the hashes added on chain since the last sync.
+
+        :return: The tree size
+        """
+        with self.lock:
+            start, end = len(self.tree), self.get_hash_count()
+            if end > start:
+                self.tree.extend(bytes.fromhex(h.removeprefix("0x")) for h in self.get_hashes(start, end))
+            return len(self.tree)
+
+    def covers(self, tree_size: int) -> bool:
+        if tree_size > len(self.tree):
+            self.sync()
+        return tree_size <= len(self.tree)
+
+    def proves_root(self, tree_size: int, root_hash: bytes) -> bool:
+        """
+        Checks a log's root hash against the local tree.
+
+        :return: True if the local tree covers tree_size and has the same root
+        """
+        return self.covers(tree_size) and self.tree.root(tree_size) == root_hash
+
+    def audit_path(self, leaf_index: int, tree_size: int) -> list[bytes]:
+        return self.tree.audit_path(leaf_index, tree_size)
+
+    def consistency_proof(self, first_size: int, second_size: int) -> list[bytes]:
+        return self.tree.consistency_proof(first_size, second_size)
@@ -0,0 +1,208 @@
+import hashlib
+
+HASH_SIZE = 32
+EMPTY_ROOT = hashlib.sha256(b'').digest()
+
+def hash_leaf(data: bytes) -> bytes:
+    """Compute the RFC 6962 leaf hash of the given data."""
+    return hashlib.sha256(b'\x00' + data).digest()
+
+def hash_children(left: bytes, right: bytes) -> bytes:
+    """Compute the RFC 6962 interior node hash of two child hashes."""
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+def merkle_levels(leaves: list[bytes]) -> list[list[bytes]]:
+    """
+    Compute all levels of the Merkle tree over a list of leaf hashes.
+
+    Pairing nodes from the left and carrying an odd last node upwards yields
+    the same tree as the recursive RFC 6962 definition.
+
+    :param leaves: The already hashed leaves.
+    :return: The levels from the leaves (index 0) up to the root.
+    """
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        next_level = [hash_children(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) & 1:
+            next_level.append(level[-1])
+        levels.append(next_level)
+    return levels
+
+def merkle_root(leaves: list[bytes]) -> bytes:
+    """
+    Compute the Merkle tree hash (MTH) of a list of leaf hashes.
+
+    :param leaves: The already hashed leaves.
+    :return: The root hash.
+    """
+    if not leaves:
+        return EMPTY_ROOT
+    return merkle_levels(leaves)[-1][0]
+
+def audit_path(leaf_index: int, levels: list[list[bytes]]) -> list[bytes]:
+    """
+    Compute the RFC 6962 audit path (PATH) for a leaf.
+
+    :param leaf_index: Index of the leaf in the tree.
+    :param levels: The tree levels as returned by merkle_levels.
+    :return: The sibling hashes from the leaf up to the root.
+    """
+    if leaf_index >= len(levels[0]):
+        raise IndexError("Leaf index out of range")
+    path = []
+    for level in levels[:-1]:
+        sibling = leaf_index ^ 1
+        # A missing sibling means the node is carried up unchanged.
+        if sibling < len(level):
+            path.append(level[sibling])
+        leaf_index >>= 1
+    return path
+
+def root_from_audit_path(leaf_index: int, tree_size: int, leaf: bytes, path: list[bytes], known: dict = None):
+    """
+    Recompute the root hash from a leaf hash and its audit path (RFC 9162, 2.1.3.2).
+
+    :param known: Optional cache shared between the paths of one tree, maps a
+        node and its remaining path to the resulting root so that interior
+        nodes common to several paths are hashed only once
+    :return: The root hash or None if the path does not fit the tree size.
+    """
+    if leaf_index >= tree_size:
+        return None
+    fn = leaf_index
+    sn = tree_size - 1
+    r = leaf
+    path = tuple(path)
+    walked = []
+    for step, p in enumerate(path):
+        if known != None:
+            node = (fn, sn, r, path[step:])
+            if node in known:
+                r = known[node]
+                break
+            walked.append(node)
+        if sn == 0:
+            r = None
+            break
+        if fn & 1 or fn == sn:
+            r = hash_children(p, r)
+            while fn & 1 == 0 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            r = hash_children(r, p)
+        fn >>= 1
+        sn >>= 1
+    else:
+        if sn != 0:
+            r = None
+    for node in walked:
+        known[node] = r
+    return r
+
+def largest_power_of_two_below(n: int) -> int:
+    """Largest power of two smaller than n (n > 1)."""
+    return 1 << ((n - 1).bit_length() - 1)
+
+class MerkleTree:
+    """
+    Append-only RFC 6962 Merkle tree.
+
+    Only the hashes of complete subtrees are stored, one bytearray of 32-byte
+    node hashes per level. Level l holds the node of every aligned range of
+    2^l leaves. Roots, audit paths and consistency proofs can be computed for
+    every earlier tree size.
+    """
+    def __init__(self):
+        self.levels = [bytearray()]
+
+    def __len__(self):
+        return len(self.levels[0]) // HASH_SIZE
+
+    def node(self, level: int, index: int) -> bytes:
+        return bytes(self.levels[level][index * HASH_SIZE:(index + 1) * HASH_SIZE])
+
+    def leaf(self, index: int) -> bytes:
+        return self.node(0, index)
+
+    def append(self, leaf: bytes):
+        """
+        Appends an already hashed leaf.
+
+        :return: The index of the new leaf
+        """
+        leaf_index = len(self)
+        self.levels[0] += leaf
+        index, level, node = leaf_index, 0, leaf
+        # Every right child completes a subtree on the next level
+        while index & 1:
+            node = hash_children(self.node(level, index - 1), node)
+            level += 1
+            index >>= 1
+            if level == len(self.levels):
+                self.levels.append(bytearray())
+            self.levels[level] += node
+        return leaf_index
+
+    def extend(self, leaves):
+        for leaf in leaves:
+            self.append(leaf)
+
+    def subtree_root(self, start: int, end: int) -> bytes:
+        """MTH of the leaves [start, end), start has to be aligned as in RFC 6962."""
+        n = end - start
+        if n & (n - 1) == 0:
+            return self.node(n.bit_length() - 1, start // n)
+        k = largest_power_of_two_below(n)
+        return hash_children(self.subtree_root(start, start + k), self.subtree_root(start + k, end))
+
+    def root(self, tree_size: int = None) -> bytes:
+        if tree_size == None:
+            tree_size = len(self)
+        if tree_size > len(self):
+            raise IndexError("Tree size out of range")
+        if tree_size == 0:
+            return EMPTY_ROOT
+        return self.subtree_root(0, tree_size)
+
+    def audit_path(self, leaf_index: int, tree_size: int = None) -> list[bytes]:
+        """RFC 6962 PATH of a leaf in the tree of the given size."""
+        if tree_size == None:
+            tree_size = len(self)
+        if leaf_index >= tree_size or tree_size > len(self):
+            raise IndexError("Leaf index out of range")
+        path = []
+        start, end = 0, tree_size
+        while end - start > 1:
+            k = largest_power_of_two_below(end - start)
+            if leaf_index < start + k:
+                path.append(self.subtree_root(start + k, end))
+                end = start + k
+            else:
+                path.append(self.subtree_root(start, start + k))
+                start = start + k
+        path.reverse()
+        return path
+
+    def consistency_proof(self, first_size: int, second_size: int = None) -> list[bytes]:
+        """RFC 6962 PROOF between the trees of the two given sizes."""
+        if second_size == None:
+            second_size = len(self)
+        if not 0 < first_size <= second_size <= len(self):
+            raise IndexError("Tree size out of range")
+        proof = []
+        start, end, m, complete = 0, second_size, first_size, True
+        while m != end - start:
+            k = largest_power_of_two_below(end - start)
+            if m <= k:
+                proof.append(self.subtree_root(start + k, end))
+                end = start + k
+            else:
+                proof.append(self.subtree_root(start, start + k))
+                start, m, complete = start + k, m - k, False
+        if not complete:
+            proof.append(self.subtree_root(start, end))
+        proof.reverse()
+        return proof
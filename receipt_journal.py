@@ -0,0 +1,146 @@
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+
+FSYNC_INTERVAL = 1 # seconds
+FSYNC_RECORDS = 64
+
+class ReceiptJournal:
+    """
+    Append-only journal of the addHash receipts, one JSON record per line.
+
+    Every record carries the receipt fields plus hashes_inserted and total_hashes,
+    so it covers the on-chain hash indexes [total_hashes - hashes_inserted, total_hashes).
+    An in-memory index of these ranges answers the lookup of the transaction that
+    committed a hash index with a binary search and a single read.
+
+    Appends are flushed immediately but only fsynced every FSYNC_RECORDS records
+    or FSYNC_INTERVAL seconds, a timer syncs the records of a burst after the
+    last append. A crash loses at most the records not yet synced.
+    """
+    def __init__(self, path, fsync_interval=FSYNC_INTERVAL, fsync_records=FSYNC_RECORDS):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.fsync_records = fsync_records
+        self.lock = threading.Lock()
+        self.file = open(path, "a+b")
+        # Sorted by start, the ranges of committed transactions never overlap
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        self.offsets: list[int] = []
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+        self.sync_timer: threading.Timer = None
+        with self.lock:
+            self._load()
+
+    def _load(self):
+        """Indexes the records, a partially written last line is dropped."""
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        try:
+            self.file.seek(0)
+            offset = 0
+            for line in self.file:
+                if not line.endswith(b"\n"):
+                    self.file.truncate(offset)
+                    break
+                self._index(json.loads(line), offset)
+                offset += len(line)
+        finally:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def _index(self, record, offset):
+        if record.get("status") != 1 or "total_hashes" not in record:
+            return
+        end = record["total_hashes"]
+        start = end - record["hashes_inserted"]
+        position = bisect.bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.offsets.insert(position, offset)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def append(self, record: dict):
+        """
+        Appends a serialized receipt with hashes_inserted and total_hashes.
+        """
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with self.lock:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            try:
+                self.file.seek(0, os.SEEK_END)
+                offset = self.file.tell()
+                self.file.write(line)
+                self.file.flush()
+            finally:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self._index(record, offset)
+            self.unsynced += 1
+            if self.unsynced >= self.fsync_records or time.monotonic() - self.synced_at > self.fsync_interval:
+                self._sync()
+            elif self.sync_timer == None:
+                self.sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def sync(self):
+        with self.lock:
+            self.sync_timer = None
+            if self.unsynced and not self.file.closed:
+                self._sync()
+
+    def _read(self, position):
+        self.file.seek(self.offsets[position])
+        return json.loads(self.file.readline())
+
+    def find(self, index: int):
+        """
+        Returns the receipt of the transaction that committed the hash index or None.
+        """
+        with self.lock:
+            position = bisect.bisect_right(self.starts, index) - 1
+            if position < 0 or index >= self.ends[position]:
+                return None
+            return self._read(position)
+
+    def find_range(self, start: int, end: int) -> list[dict]:
+        """
+        Returns the receipts of the transactions that committed hashes of the index range [start, end).
+        """
+        with self.lock:
+            first = max(bisect.bisect_right(self.starts, start) - 1, 0)
+            last = bisect.bisect_left(self.starts, end)
+            return [self._read(position) for position in range(first, last)
+                    if self.ends[position] > start]
+
+    def import_files(self, folder):
+        """
+        Appends the per-transaction receipt files of the given folder.
+
+        Files without hash indexes are journaled but not indexed.
+        """
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(folder, name), "r") as file:
+                self.append(json.load(file))
+        self.sync()
+
+    def close(self):
+        with self.lock:
+            if self.sync_timer != None:
+                self.sync_timer.cancel()
+                self.sync_timer = None
+            if self.unsynced:
+                self._sync()
+            self.file.close()
@@ -1,9 +1,12 @@
-from CT_interface import get_entries, SCT, STH, get_sth
+from CT_interface import iter_entries, SCT, STH, get_sth
 from blockchain_interface import HashStorage, show_stats
 import base64
 import hashlib
+import os
+import queue
 import threading
-from facilitator_interface import sign_sct, sign_mth
+from concurrent.futures import ThreadPoolExecutor
+from facilitator_interface import sign_sct, sign_sct_batch, sign_mth
 import json
 import time
 from signature_verifier import verify_sct, verify_sth
@@ -14,6 +17,15 @@ BATCH_SIZE = 10 #mth signing cannot handle a difference greater than 10 since re
 BLOCK_TIME = 2.19
 SCT_FOLDER = "requestor_scts"
 STH_FOLDER = "requestor_sths"
+PROGRESS_FILE = "requestor_progress.json"
+QUEUE_SIZE = 4 # batches buffered between two daemon stages
+STH_INTERVAL = 60
+CONFIRMATION_POLL = 0.2
+RETRY_DELAY = 1 # seconds before the first retry of a failed daemon step, doubled per retry
+MAX_RETRY_DELAY = 60
+# Network failures, timeouts and HTTP errors (requests exceptions are OSErrors),
+# anything else stops the daemon
+TRANSIENT_ERRORS = (OSError,)
 
 def decode_base64(base64_str):
     return base64.b64decode(base64_str)
@@ -30,45 +42,253 @@ def store_sth(sth: STH, index):
     with open(f"{STH_FOLDER}/size_{index}.json", "w") as file:
         json.dump(sth, file, indent=4)
 
-def submit_certificates():
-    count = hash_storage.get_hash_count() 
-    new_count = count + BATCH_SIZE
-    entries = get_entries(count, new_count-1)
-    hashes = [
-        hash_cert(base64.b64decode(entry["leaf_input"])) for entry in entries
+def load_progress():
+    try:
+        with open(PROGRESS_FILE, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        # A first run only issues SCTs for the hashes it adds itself
+        return {"sct_end": hash_storage.get_hash_count(), "sth_ll_size": 0}
+
+def store_progress(progress):
+    # Write to a temporary file first so a crash never leaves a broken progress file
+    with open(f"{PROGRESS_FILE}.tmp", "w") as file:
+        json.dump(progress, file, indent=4)
+    os.replace(f"{PROGRESS_FILE}.tmp", PROGRESS_FILE)
+
+def wait_for_confirmation(count, timeout=10 * BLOCK_TIME):
+    """
+    Blocks until the chain reports at least count hashes.
+
+    :return: The on-chain hash count
+    """
+    deadline = time.monotonic() + timeout
+    while (hash_count := hash_storage.get_hash_count()) < count:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Hashes up to {count} not confirmed")
+        time.sleep(CONFIRMATION_POLL)
+    return hash_count
+
+def hash_entries(start, end):
+    """Hashes the log entries [start, end) while the next ones are still being fetched."""
+    return [
+        hash_cert(base64.b64decode(entry["leaf_input"])) for entry in iter_entries(start, end-1)
     ]
+
+def fetch_entries(start, end):
+    """Fetches the log entries [start, end)."""
+    return list(iter_entries(start, end - 1))
+
+def submit_certificates(batch_size=BATCH_SIZE):
+    count = hash_storage.get_hash_count() 
+    new_count = count + batch_size
+    hashes = hash_entries(count, new_count)
     print("Certificate hashes:", hashes)
     hash_storage.add_hashes(hashes)
     return (count, new_count)
 
 def request_sct(index):
     sct = sign_sct(index)
+    if not isinstance(sct, dict) or "signed_hash" not in sct:
+        raise ConnectionError(f"SCT {index} failed: {sct}")
     verification = verify_sct(sct) 
     print("SCT:", sct, "\n", "Is valid:", verification,"\n")
     store_sct(sct, index)
+    return sct
 
 def request_scts(start, end):
-    threads:list[threading.Thread] = []
-    for cert_index in range(start, end):
-        thread = threading.Thread(target=request_sct, args=(cert_index,))
-        thread.start()
-        threads.append(thread)
+    """
+    Requests one SCT per certificate of [start, end) concurrently.
+
+    :return: The SCTs, raises if any of them failed
+    """
+    with ThreadPoolExecutor(max_workers=max(end - start, 1)) as executor:
+        return list(executor.map(request_sct, range(start, end)))
+
+def request_sct_batch(start, end):
+    """
+    Requests the SCTs of [start, end) as one batch signed by a single threshold signature.
 
-    for thread in threads:
-        thread.join()
+    :return: The batched SCTs, each with its inclusion path
+    """
+    scts = sign_sct_batch(start, end)
+    if not isinstance(scts, list):
+        raise ConnectionError(f"SCT batch {start}-{end} failed: {scts}")
+    for index, sct in zip(range(start, end), scts):
+        verification = verify_sct(sct)
+        print("SCT:", sct, "\n", "Is valid:", verification,"\n")
+        store_sct(sct, index)
+    return scts
 
 def request_sth():
+    """
+    :return: The ll_size of the signed STH
+    """
     count = hash_storage.get_hash_count() 
     mth: STH = get_sth()
     mth["ll_size"] = count -1
     sth = sign_mth(mth)
+    if not isinstance(sth, dict) or "tree_head_signature" not in sth:
+        raise ConnectionError(f"STH signing failed: {sth}")
     print("STH:", sth)
     print("Is valid:", verify_sth(sth),"\n")
     store_sth(sth, count-1)
+    return mth["ll_size"]
+
+class RequestorDaemon:
+    """
+    Runs the requestor continuously as a pipeline of stages:
+    tail the log -> hash -> submit on chain -> wait for confirmation -> issue SCTs,
+    and periodically requests an STH.
+
+    The stages are connected by bounded queues, a full queue blocks the stage
+    before it. The chain and the progress file tell where to resume after a restart.
+    Transient errors are retried with exponential backoff, any other error stops
+    the daemon.
+    """
+    def __init__(self, batch_size=BATCH_SIZE, sth_interval=STH_INTERVAL, batch_scts=False):
+        """
+        :param batch_scts: Request batched SCTs instead of one SCT per certificate
+        """
+        self.batch_size = batch_size
+        self.request_scts = request_sct_batch if batch_scts else request_scts
+        self.sth_interval = sth_interval
+        self.stopped = threading.Event()
+        self.entries = queue.Queue(QUEUE_SIZE)
+        self.hashes = queue.Queue(QUEUE_SIZE)
+        self.submitted = queue.Queue(QUEUE_SIZE)
+        self.confirmed = queue.Queue(QUEUE_SIZE)
+        self.progress = load_progress()
+        self.progress_lock = threading.Lock()
+
+    def put(self, stage_queue: queue.Queue, item):
+        while not self.stopped.is_set():
+            try:
+                stage_queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, stage_queue: queue.Queue):
+        while not self.stopped.is_set():
+            try:
+                return stage_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def retry(self, action, *args):
+        """
+        Runs the action until it succeeds or fails with a non-transient error.
+
+        :return: The result of the action or None if the daemon stopped
+        """
+        delay = RETRY_DELAY
+        while not self.stopped.is_set():
+            try:
+                return action(*args)
+            except TRANSIENT_ERRORS as e:
+                print(f"{action.__name__} failed, retrying in {delay}s: {e}")
+                self.stopped.wait(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def update_progress(self, **values):
+        with self.progress_lock:
+            self.progress.update(values)
+            store_progress(self.progress)
+
+    def tail(self):
+        # Everything below the on-chain count was submitted already
+        next_index = hash_storage.get_hash_count()
+        # Re-issue the SCTs that were not issued before the restart
+        for start in range(self.progress["sct_end"], next_index, self.batch_size):
+            self.put(self.confirmed, (start, min(start + self.batch_size, next_index)))
+        while not self.stopped.is_set():
+            sth = self.retry(get_sth)
+            if sth is None:
+                return
+            if next_index >= sth["tree_size"]:
+                self.stopped.wait(BLOCK_TIME)
+                continue
+            end = min(next_index + self.batch_size, sth["tree_size"])
+            entries = self.retry(fetch_entries, next_index, end)
+            if entries is None:
+                return
+            self.put(self.entries, (next_index, entries))
+            next_index = end
+
+    def hash(self):
+        while (item := self.get(self.entries)) is not None:
+            start, entries = item
+            hashes = [hash_cert(base64.b64decode(entry["leaf_input"])) for entry in entries]
+            self.put(self.hashes, (start, hashes))
+
+    def submit(self):
+        # Does not wait for the receipts, several batches are in flight at once
+        while (item := self.get(self.hashes)) is not None:
+            start, hashes = item
+            # Fails before sending if the chain moved on, e.g. another requestor added hashes
+            transactions = self.retry(hash_storage.add_hashes_async, hashes, start)
+            if transactions is None:
+                return
+            self.put(self.submitted, (start, start + len(hashes), transactions))
+
+    def confirm(self):
+        while (item := self.get(self.submitted)) is not None:
+            start, end, transactions = item
+            # A reverted transaction raises and stops the daemon
+            for transaction in transactions:
+                transaction.future.result()
+            if self.retry(wait_for_confirmation, end) is None:
+                return
+            self.put(self.confirmed, (start, end))
+
+    def issue_scts(self):
+        while (item := self.get(self.confirmed)) is not None:
+            start, end = item
+            if self.retry(self.request_scts, start, end) is None:
+                return
+            self.update_progress(sct_end=end)
+
+    def sign_sths(self):
+        while not self.stopped.wait(self.sth_interval):
+            # ll_size is the index of the last hash covered by the STH
+            if self.progress["sct_end"] - 1 > self.progress["sth_ll_size"]:
+                ll_size = self.retry(request_sth)
+                if ll_size is None:
+                    return
+                self.update_progress(sth_ll_size=ll_size)
+
+    def run_stage(self, stage):
+        try:
+            stage()
+        except Exception as e:
+            print(f"Stage {stage.__name__} failed: {e}")
+            self.stopped.set()
+
+    def run(self):
+        threads = [threading.Thread(target=self.run_stage, args=(stage,), name=stage.__name__) 
+                   for stage in (self.tail, self.hash, self.submit, self.confirm, self.issue_scts, self.sign_sths)]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self.stopped.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.stopped.set()
+        for thread in threads:
+            thread.join()
 
 if __name__ == "__main__":
+    import sys
     show_stats()
-    (oldCount, new_count) = submit_certificates()
-    time.sleep(1.5 * BLOCK_TIME)
-    request_scts(oldCount, new_count)
-    request_sth()
+    batch_scts = "--batch" in sys.argv
+    if "--daemon" in sys.argv:
+        RequestorDaemon(batch_scts=batch_scts).run()
+    else:
+        (oldCount, new_count) = submit_certificates()
+        wait_for_confirmation(new_count)
+        if batch_scts:
+            request_sct_batch(oldCount, new_count)
+        else:
+            request_scts(oldCount, new_count)
+        request_sth()
@@ -0,0 +1,95 @@
+import json
+import base64
+from CT_interface import SCT
+from merkle_tree import hash_leaf, merkle_levels, audit_path, root_from_audit_path
+from signed_data import BINARY_VERSION, encode_sct, encode_batch_head
+
+SCT_VERSION = "v1"
+BATCH_SCT_VERSION = "v1_batch"
+MAX_BATCH_SIZE = 1024
+
+def sct_signable_data(hashed_certificate: str, log_id: str, timestamp: int, version: str = SCT_VERSION) -> bytes:
+    """
+    Canonical SCT body as it is signed for a single certificate.
+
+    :param hashed_certificate: The certificate hash as hex string.
+    :param version: The sct_version, v1 is signed as JSON and v2 in the binary encoding.
+    """
+    if version == BINARY_VERSION:
+        return encode_sct(bytes.fromhex(hashed_certificate), log_id, timestamp)
+    certificate_timestamp = {
+        "hashed_certificate": hashed_certificate,
+        "id": log_id,
+        "sct_version": SCT_VERSION,
+        "timestamp": timestamp
+    }
+    return json.dumps(certificate_timestamp, sort_keys=True).encode("utf-8")
+
+def batch_leaves(hashed_certificates: list[str], log_id: str, timestamp: int, version: str = SCT_VERSION) -> list[bytes]:
+    """Leaf hashes of the canonical SCT bodies of a batch."""
+    return [hash_leaf(sct_signable_data(hashed_certificate, log_id, timestamp, version))
+            for hashed_certificate in hashed_certificates]
+
+def batch_signable_data(batch_root: bytes, batch_size: int, log_id: str, timestamp: int, version: str = SCT_VERSION) -> bytes:
+    """Canonical message signed by the committee for a batch of SCTs."""
+    if version == BINARY_VERSION:
+        return encode_batch_head(batch_root, batch_size, log_id, timestamp)
+    batch_head = {
+        "batch_root": batch_root.hex(),
+        "batch_size": batch_size,
+        "id": log_id,
+        "sct_version": BATCH_SCT_VERSION,
+        "timestamp": timestamp
+    }
+    return json.dumps(batch_head, sort_keys=True).encode("utf-8")
+
+def build_batch(hashed_certificates: list[str], log_id: str, timestamp: int, version: str = SCT_VERSION):
+    """
+    Builds the Merkle tree over a batch of SCT bodies.
+
+    :return: The tree levels and the signable batch head.
+    """
+    levels = merkle_levels(batch_leaves(hashed_certificates, log_id, timestamp, version))
+    return levels, batch_signable_data(levels[-1][0], len(hashed_certificates), log_id, timestamp, version)
+
+def batched_scts(hashed_certificates: list[str], levels, signature_b64: str, log_id: str, timestamp: int,
+                 version: str = SCT_VERSION) -> list[SCT]:
+    """
+    Creates the SCTs of a signed batch, each carrying its inclusion path.
+
+    :param hashed_certificates: The certificate hashes as hex strings.
+    :param levels: The tree levels as returned by build_batch.
+    :param signature_b64: The threshold signature over the batch head.
+    :param version: The sct_version the batch was built with.
+    """
+    scts = []
+    for i, hashed_certificate in enumerate(hashed_certificates):
+        scts.append({
+            "hashed_certificate": base64.b64encode(bytes.fromhex(hashed_certificate)).decode("utf-8"),
+            "signed_hash": signature_b64,
+            "id": log_id,
+            "sct_version": version,
+            "timestamp": timestamp,
+            "batch_index": i,
+            "batch_size": len(hashed_certificates),
+            "inclusion_path": [base64.b64encode(p).decode("utf-8") for p in audit_path(i, levels)]
+        })
+    return scts
+
+def is_batched_sct(sct: SCT) -> bool:
+    return "inclusion_path" in sct
+
+def batch_signable_data_of(sct: SCT):
+    """
+    Reconstructs the signed batch head of a batched SCT.
+
+    :return: The signable batch head or None if the inclusion path is invalid.
+    """
+    hashed_certificate = base64.b64decode(sct["hashed_certificate"]).hex()
+    version = sct.get("sct_version", SCT_VERSION)
+    leaf = hash_leaf(sct_signable_data(hashed_certificate, sct["id"], sct["timestamp"], version))
+    path = [base64.b64decode(p) for p in sct["inclusion_path"]]
+    batch_root = root_from_audit_path(int(sct["batch_index"]), int(sct["batch_size"]), leaf, path)
+    if batch_root is None:
+        return None
+    return batch_signable_data(batch_root, int(sct["batch_size"]), sct["id"], sct["timestamp"], version)
@@ -0,0 +1,120 @@
+import base64
+import fcntl
+import json
+import os
+import threading
+from CT_interface import SCT
+
+STORE_FILE = "scts.jsonl"
+
+def certificate_hash_of(sct: SCT) -> str:
+    """The certificate hash of an SCT as hex string."""
+    return base64.b64decode(sct["hashed_certificate"]).hex()
+
+class SCTStore:
+    """
+    Append-only store of the issued SCTs, one JSON record per line.
+
+    The SCTs are indexed by their on-chain index and their certificate hash
+    and read from disk on demand. The first SCT issued for an index is kept,
+    later ones for the same index are discarded, so repeated requests always
+    get the same SCT.
+    """
+    def __init__(self, folder):
+        self.path = os.path.join(folder, STORE_FILE)
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.file = open(self.path, "a+b")
+        self.offsets: dict[int, int] = {}
+        self.indexes_by_hash: dict[str, int] = {}
+        with self.lock:
+            self._load()
+
+    def _load(self):
+        """Indexes the records, a partially written last line is dropped."""
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        try:
+            self.file.seek(0)
+            offset = 0
+            for line in self.file:
+                if not line.endswith(b"\n"):
+                    self.file.truncate(offset)
+                    break
+                record = json.loads(line)
+                self._index(record["index"], record["sct"], offset)
+                offset += len(line)
+        finally:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def _index(self, index: int, sct: SCT, offset):
+        if index in self.offsets:
+            return
+        self.offsets[index] = offset
+        self.indexes_by_hash.setdefault(certificate_hash_of(sct), index)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, index: int):
+        return index in self.offsets
+
+    def put(self, items: list[tuple[int, SCT]]) -> list[SCT]:
+        """
+        Stores the SCTs of indexes without an SCT yet.
+
+        :param items: Tuples of (index, sct)
+        :return: The SCT stored for each index afterwards
+        """
+        with self.lock:
+            new_items = [(index, sct) for index, sct in items if index not in self.offsets]
+            if new_items:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                try:
+                    self.file.seek(0, os.SEEK_END)
+                    offset = self.file.tell()
+                    lines = []
+                    for index, sct in new_items:
+                        line = (json.dumps({"index": index, "sct": sct}) + "\n").encode("utf-8")
+                        lines.append(line)
+                        self._index(index, sct, offset)
+                        offset += len(line)
+                    self.file.write(b"".join(lines))
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                finally:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            return [self._read(index) for index, _ in items]
+
+    def _read(self, index: int) -> SCT:
+        self.file.seek(self.offsets[index])
+        return json.loads(self.file.readline())["sct"]
+
+    def get(self, index: int) -> SCT:
+        """Returns the SCT issued for the index or None."""
+        with self.lock:
+            if index not in self.offsets:
+                return None
+            return self._read(index)
+
+    def get_range(self, start: int, end: int) -> list[SCT]:
+        """Returns the SCTs of the index range [start, end) or None if one of them is missing."""
+        with self.lock:
+            if any(index not in self.offsets for index in range(start, end)):
+                return None
+            return [self._read(index) for index in range(start, end)]
+
+    def get_by_hash(self, certificate_hash: str) -> SCT:
+        """
+        Returns the SCT issued for the certificate hash or None.
+
+        :param certificate_hash: The certificate hash as hex string
+        """
+        with self.lock:
+            index = self.indexes_by_hash.get(certificate_hash.removeprefix("0x").lower())
+            if index is None:
+                return None
+            return self._read(index)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
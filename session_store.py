@@ -0,0 +1,144 @@
+import pickle
+from abc import ABC, abstractmethod
+import threading
+import time
+from flask_caching import Cache
+
+SESSION_TIMEOUT = 300 # seconds a signing session is kept
+
+class SessionStore(ABC):
+    """
+    State of the signing sessions of a signer: selected signers, own and foreign sign shares.
+
+    Every set wakes up the waiters of the task, who then check whether their session is complete.
+    """
+    @abstractmethod
+    def get(self, task, field):
+        pass
+
+    @abstractmethod
+    def set(self, task, field, value):
+        pass
+
+    @abstractmethod
+    def wait(self, task, timeout) -> bool:
+        """
+        Blocks until a value of the task is set or the timeout passes.
+
+        :return: False on timeout
+        """
+
+    @abstractmethod
+    def release(self, task):
+        """Deletes the session of the task, its task name may be used again afterwards."""
+
+class LocalSessionStore(SessionStore):
+    """
+    Keeps the sessions in a Flask-Caching cache of this process.
+
+    Like the keys of RedisSessionStore, a session expires timeout seconds
+    after its last set, so shares of released or abandoned tasks do not pile up.
+    """
+    def __init__(self, cache: Cache, timeout=SESSION_TIMEOUT):
+        self.cache = cache
+        self.timeout = timeout
+        self.events: dict[str, threading.Event] = {}
+        self.fields: dict[str, set] = {}
+        # task -> time.monotonic() after which the session is dropped
+        self.expires: dict[str, float] = {}
+        self.next_expiry_check = 0
+        self.events_lock = threading.Lock()
+
+    def event(self, task) -> threading.Event:
+        expired = []
+        with self.events_lock:
+            event = self.events.get(task)
+            if event == None:
+                now = time.monotonic()
+                event = self.events[task] = threading.Event()
+                self.expires.setdefault(task, now + self.timeout)
+                expired = self.expire(now)
+        if expired:
+            self.cache.delete_many(*expired)
+        return event
+
+    def expire(self, now) -> list[str]:
+        """
+        Drops the expired sessions, called with the events lock held.
+
+        :return: The cache keys of the dropped sessions
+        """
+        if now < self.next_expiry_check:
+            return []
+        self.next_expiry_check = now + self.timeout / 10
+        keys = []
+        for task in [task for task, expires in self.expires.items() if expires < now]:
+            del self.expires[task]
+            self.events.pop(task, None)
+            keys += [f"{task}.{field}" for field in self.fields.pop(task, set())]
+        return keys
+
+    def get(self, task, field):
+        return self.cache.get(f"{task}.{field}")
+
+    def set(self, task, field, value):
+        now = time.monotonic()
+        with self.events_lock:
+            self.fields.setdefault(task, set()).add(field)
+            self.expires[task] = now + self.timeout
+            expired = self.expire(now)
+        if expired:
+            self.cache.delete_many(*expired)
+        self.cache.set(f"{task}.{field}", value)
+        self.event(task).set()
+
+    def wait(self, task, timeout) -> bool:
+        event = self.event(task)
+        arrived = event.wait(timeout)
+        # Values set after this are picked up by the waiter's next check or wait
+        event.clear()
+        return arrived
+
+    def release(self, task):
+        with self.events_lock:
+            self.events.pop(task, None)
+            self.expires.pop(task, None)
+            fields = self.fields.pop(task, set())
+        self.cache.delete_many(*(f"{task}.{field}" for field in fields))
+
+class RedisSessionStore(SessionStore):
+    """
+    Keeps the sessions in a Redis compatible server so that all workers of a signer share them.
+
+    Each task is a hash, a set writes the field and pushes to the task's
+    notification list in one transaction, the waiter blocks on that list.
+    The values are pickled, the server must only be reachable by the signer.
+    """
+    def __init__(self, url, timeout=SESSION_TIMEOUT):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.timeout = timeout
+
+    def get(self, task, field):
+        value = self.redis.hget(task, field)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, task, field, value):
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.hset(task, field, pickle.dumps(value))
+        pipeline.rpush(f"{task}.arrived", 1)
+        pipeline.expire(task, self.timeout)
+        pipeline.expire(f"{task}.arrived", self.timeout)
+        pipeline.execute()
+
+    def wait(self, task, timeout) -> bool:
+        # A timeout of 0 would block forever
+        arrived = self.redis.blpop([f"{task}.arrived"], timeout=max(timeout, 0.01))
+        if arrived is None:
+            return False
+        # Several values may have arrived, one check covers all of them
+        self.redis.delete(f"{task}.arrived")
+        return True
+
+    def release(self, task):
+        self.redis.delete(task, f"{task}.arrived")
@@ -1,10 +1,14 @@
 from CT_interface import STH, SCT
 from signing_service import decode_signature_base64
+from sct_batch import is_batched_sct, batch_signable_data_of
+from signed_data import BINARY_VERSION, encode_sct, encode_tree_head
 from ggmpc import curves, Eddsa
+from nacl import bindings
 import json
 import base64
 
 PUBLIC_KEY = 108277726953003826667175796147551996205307660203894155405100504010803472647562
+PUBLIC_KEY_BYTES = PUBLIC_KEY.to_bytes(32, "little")
 
 mpc = Eddsa(curves.ed25519)
 
@@ -18,22 +22,85 @@ def verify_signature(message, signature):
     except:
         return False
 
-def verify_sct(input_sct: SCT) -> bool:
+def sct_signed_data(input_sct: SCT) -> bytes:
+    """The message signed for a single SCT, depending on its sct_version."""
+    if input_sct.get("sct_version") == BINARY_VERSION:
+        return encode_sct(decode_base64(input_sct["hashed_certificate"]), input_sct["id"], int(input_sct["timestamp"]))
     sct = {**input_sct}
-    signature = sct.pop("signed_hash")
+    sct.pop("signed_hash")
     sct["hashed_certificate"] = decode_base64(sct["hashed_certificate"]).hex()
-    sct_encoded = json.dumps(sct, sort_keys=True).encode("utf-8")
-    return verify_signature(sct_encoded, signature)
+    return json.dumps(sct, sort_keys=True).encode("utf-8")
+
+def verify_sct(input_sct: SCT) -> bool:
+    if is_batched_sct(input_sct):
+        return verify_batched_sct(input_sct)
+    return verify_signature(sct_signed_data(input_sct), input_sct["signed_hash"])
+
+def verify_batched_sct(sct: SCT) -> bool:
+    batch_encoded = batch_signable_data_of(sct)
+    if batch_encoded is None:
+        return False
+    return verify_signature(batch_encoded, sct["signed_hash"])
 
 def decode_base64(base64_str):
     return base64.b64decode(base64_str)
 
-def verify_sth(input_sth: STH) -> bool:
+def sth_signed_data(input_sth: STH) -> bytes:
+    """The message signed for an STH, depending on its sth_version."""
+    if input_sth.get("sth_version") == BINARY_VERSION:
+        return encode_tree_head(int(input_sth["tree_size"]), int(input_sth["ll_size"]), int(input_sth["timestamp"]),
+                                decode_base64(input_sth["sha256_root_hash"]))
     sth = {**input_sth}
-    signature = sth.pop("tree_head_signature")
+    sth.pop("tree_head_signature")
     sth["sha256_root_hash"] = decode_base64(sth["sha256_root_hash"]).hex()
-    mth_encoded = json.dumps(sth, sort_keys=True).encode("utf-8")
-    return verify_signature(mth_encoded, signature)
+    return json.dumps(sth, sort_keys=True).encode("utf-8")
+
+def verify_sth(input_sth: STH) -> bool:
+    return verify_signature(sth_signed_data(input_sth), input_sth["tree_head_signature"])
+
+def verify_signatures_deduplicated(signed_messages) -> list[bool]:
+    """
+    Verifies several (message, signature) pairs against the log's public key.
+
+    This is no batch verification: every distinct pair is verified on its
+    own with libsodium and repeated pairs reuse the result. Only the SCTs of
+    a signed batch, which share their signature, get cheaper; a list of
+    single SCTs costs about the same as verifying them one by one. Malformed
+    signatures count as invalid instead of raising.
+    """
+    results = {}
+    verified = []
+    for message, signature in signed_messages:
+        if message is None:
+            verified.append(False)
+            continue
+        key = (message, signature)
+        if key not in results:
+            try:
+                signature_bytes = base64.b64decode(signature)
+                if len(signature_bytes) != 64:
+                    raise ValueError("Invalid signature length. Expected 64 bytes.")
+                bindings.crypto_sign_open(signature_bytes + message, PUBLIC_KEY_BYTES)
+                results[key] = True
+            except Exception:
+                results[key] = False
+        verified.append(results[key])
+    return verified
+
+def verify_scts_deduplicated(scts: list[SCT]) -> list[bool]:
+    """
+    Verifies several SCTs, the result of each is the same as of verify_sct.
+
+    The inclusion paths of batched SCTs are checked one by one, their batch
+    signature only once per batch, see verify_signatures_deduplicated.
+    """
+    return verify_signatures_deduplicated(
+        (batch_signable_data_of(sct) if is_batched_sct(sct) else sct_signed_data(sct), sct["signed_hash"])
+        for sct in scts)
+
+def verify_sths_deduplicated(sths: list[STH]) -> list[bool]:
+    """Verifies several STHs, the result of each is the same as of verify_sth, repeated STHs only once."""
+    return verify_signatures_deduplicated((sth_signed_data(sth), sth["tree_head_signature"]) for sth in sths)
 
 if __name__ == "__main__":
     SCT_RES = {
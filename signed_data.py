@@ -0,0 +1,53 @@
+"""
+Fixed-layout binary encoding of the signed SCT, batch head and tree head payloads.
+
+Version v2 of the signed data, in the style of the RFC 6962 digitally-signed
+structures (big endian, length-prefixed log id). Version v1 is the canonical
+JSON encoding, the version field of an SCT or STH tells which one was signed.
+"""
+import struct
+
+JSON_VERSION = "v1"
+BINARY_VERSION = "v2"
+VERSIONS = (JSON_VERSION, BINARY_VERSION)
+BINARY_VERSION_NUMBER = 2
+
+# SignatureType
+CERTIFICATE_TIMESTAMP = 0
+TREE_HASH = 1
+BATCH_HASH = 2
+
+# version, signature_type, timestamp, hashed_certificate, log_id<1..255>
+SCT_STRUCT = struct.Struct(">BBQ32s")
+# version, signature_type, timestamp, tree_size, ll_size, sha256_root_hash
+TREE_HEAD_STRUCT = struct.Struct(">BBQQQ32s")
+# version, signature_type, timestamp, batch_size, batch_root, log_id<1..255>
+BATCH_HEAD_STRUCT = struct.Struct(">BBQQ32s")
+
+def check_hash(value: bytes):
+    # struct pads or cuts a 32s field silently
+    if len(value) != 32:
+        raise ValueError("Hash must have 32 bytes")
+
+def encode_log_id(log_id: str) -> bytes:
+    encoded = log_id.encode("utf-8")
+    if not 0 < len(encoded) < 256:
+        raise ValueError("Log id must have 1 to 255 bytes")
+    return bytes((len(encoded),)) + encoded
+
+def encode_sct(hashed_certificate: bytes, log_id: str, timestamp: int) -> bytes:
+    """
+    :param hashed_certificate: The 32-byte certificate hash
+    """
+    check_hash(hashed_certificate)
+    return SCT_STRUCT.pack(BINARY_VERSION_NUMBER, CERTIFICATE_TIMESTAMP, timestamp, hashed_certificate) \
+        + encode_log_id(log_id)
+
+def encode_tree_head(tree_size: int, ll_size: int, timestamp: int, sha256_root_hash: bytes) -> bytes:
+    check_hash(sha256_root_hash)
+    return TREE_HEAD_STRUCT.pack(BINARY_VERSION_NUMBER, TREE_HASH, timestamp, tree_size, ll_size, sha256_root_hash)
+
+def encode_batch_head(batch_root: bytes, batch_size: int, log_id: str, timestamp: int) -> bytes:
+    check_hash(batch_root)
+    return BATCH_HEAD_STRUCT.pack(BINARY_VERSION_NUMBER, BATCH_HASH, timestamp, batch_size, batch_root) \
+        + encode_log_id(log_id)
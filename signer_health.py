@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+
+LATENCY_ALPHA = 0.2 # weight of the newest sample in the latency and error averages
+FAILURES_TO_OPEN = 3 # consecutive failures that take a signer out of the committees
+OPEN_SECONDS = 30 # seconds until a failing signer is tried again
+EXPLORATION = 0.05 # share of committees with a random signer, keeps the latencies of the others current
+COMMITTEE_ATTEMPTS = 3 # committees tried per signing before giving up
+
+class SignerError(Exception):
+    """Raised when a selected signer does not return a partial signature."""
+    def __init__(self, message="Failed to fetch partial signature"):
+        super().__init__(message)
+
+class MissingSignSharesError(SignerError):
+    """Raised when a signer did not receive the sign shares of other committee members."""
+    def __init__(self, signers: list[int], message="Missing sign shares"):
+        super().__init__(f"{message} of signers {signers}")
+        self.signers = signers
+
+class SignersBusyError(SignerError):
+    """Raised when the signers answered with too many requests."""
+    def __init__(self, message="Too many requests"):
+        super().__init__(message)
+
+class SignerStats:
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+class SignerHealth:
+    """
+    Tracks the latency and failures of the signers and selects the committees.
+
+    A committee consists of the signers with the lowest expected time to a
+    partial signature, the average latency over the success rate. Signers
+    without samples go first so that every signer gets measured. After
+    FAILURES_TO_OPEN consecutive failures the circuit of a signer opens and it
+    is only selected if not enough other signers are left. After OPEN_SECONDS
+    it is selected again and a single failure opens the circuit again.
+    """
+    def __init__(self, signers: list[int], committee_size: int, rng: random.Random = None):
+        """
+        :param signers: The indexes of all signers
+        :param committee_size: The threshold of the signature
+        """
+        if committee_size > len(signers):
+            raise ValueError("Committee larger than the number of signers")
+        self.committee_size = committee_size
+        self.stats = {index: SignerStats() for index in signers}
+        self.lock = threading.Lock()
+        self.rng = rng if rng != None else random.Random()
+
+    def is_open(self, stats: SignerStats, now) -> bool:
+        return stats.opened_at != None and now - stats.opened_at < OPEN_SECONDS
+
+    def expected_latency(self, stats: SignerStats) -> float:
+        if stats.latency == None:
+            return 0.0
+        return stats.latency / max(1.0 - stats.error_rate, 0.01)
+
+    def select(self, excluded=()) -> list[int]:
+        """
+        Selects a committee, sorted by signer index.
+
+        :param excluded: Signers that already failed this signing, only used if no others are left
+        """
+        now = time.monotonic()
+        with self.lock:
+            ranked = sorted(self.stats, key=lambda index: (
+                index in excluded,
+                self.is_open(self.stats[index], now),
+                self.expected_latency(self.stats[index])))
+            committee = ranked[:self.committee_size]
+            others = [index for index in ranked[self.committee_size:]
+                      if index not in excluded and not self.is_open(self.stats[index], now)]
+        if others and self.rng.random() < EXPLORATION:
+            committee[-1] = self.rng.choice(others)
+        return sorted(committee)
+
+    def record_success(self, index, seconds):
+        with self.lock:
+            stats = self.stats[index]
+            stats.latency = seconds if stats.latency == None \
+                else LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * stats.latency
+            stats.error_rate = (1 - LATENCY_ALPHA) * stats.error_rate
+            stats.consecutive_failures = 0
+            stats.opened_at = None
+
+    def record_failure(self, index):
+        with self.lock:
+            stats = self.stats[index]
+            stats.error_rate = LATENCY_ALPHA + (1 - LATENCY_ALPHA) * stats.error_rate
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= FAILURES_TO_OPEN:
+                stats.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            return {index: {"latency": stats.latency,
+                            "error_rate": stats.error_rate,
+                            "open": self.is_open(stats, now)}
+                    for index, stats in self.stats.items()}
@@ -5,14 +5,50 @@ import json
 from flask_caching import Cache
 from flask import Flask
 import requests
+import time
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from session_store import SessionStore, LocalSessionStore
 
 class InsufficientSignSharesError(Exception):
     """Custom exception raised when no valid configuration is provided."""
     def __init__(self, message="Not enough sign shares given"):
         super().__init__(message)
 
+# State of a worker process of the compute pool, set once by init_compute_worker
+compute_mpc = None
+compute_key = None
+
+def load_combined_key(partial_private_key_file):
+    with open(partial_private_key_file, "r") as key_file:
+        data = json.load(key_file)
+    return {int(k): v for k, v in data.items()}
+
+def select_key_shares(combined_key, selected_signers, total_signers):
+    return tuple(combined_key[signer_index]
+                 for signer_index in range(1, total_signers + 1)
+                 if signer_index in selected_signers)
+
+def init_compute_worker(partial_private_key_file):
+    """Loads the combined key once in a worker process of the compute pool."""
+    global compute_mpc, compute_key
+    compute_mpc = ggmpc.Eddsa(curves.ed25519)
+    compute_key = load_combined_key(partial_private_key_file)
+
+def compute_sign_share(message, selected_signers, total_signers):
+    return compute_mpc.sign_share(message, select_key_shares(compute_key, selected_signers, total_signers))
+
+def compute_sign(message, sign_shares):
+    return compute_mpc.sign(message, sign_shares)
+
+def compute_ready():
+    return compute_key != None
+
 class MultiSigner:
-    def __init__(self,index, threshold, total_signers, cache: Cache, partial_private_key_file=None, mpc=None):
+    def __init__(self,index, threshold, total_signers, cache: Cache | SessionStore, partial_private_key_file=None, mpc=None,
+                 compute_workers=0):
         """
         Initializes a signer with their own key share.
 
@@ -20,16 +56,22 @@ class MultiSigner:
         :param index: The unique index for this signer
         :param threshold: The threshold for signing
         :param total_signers: Total number of signers
+        :param cache: The store of the signing sessions, a Flask-Caching cache keeps them in this process
+        :param compute_workers: Worker processes that compute the sign shares and signatures, 0 computes them
+            in the calling thread
         """
         if mpc == None:
             mpc = ggmpc.Eddsa(curves.ed25519)
-        self.cache = cache
+        if not isinstance(cache, SessionStore):
+            cache = LocalSessionStore(cache)
+        self.sessions = cache
         self.mpc = mpc
         self.index = index
         self.namespace = f"signer_{index}"
         self.threshold = threshold
         self.total_signers = total_signers
-        self.key_share = mpc.key_share(index, threshold, total_signers)
+        # Fresh key shares are only needed to generate a new key, see key_share
+        self._key_share = None
 
         if partial_private_key_file == None:
             partial_private_key_file = f"combined_key_{self.index}.json"
@@ -38,18 +80,51 @@ class MultiSigner:
         if os.path.exists(self.filename):
             print("Loaded key from:", self.filename)
             # Read the combined key from the file
-            with open(self.filename, "r") as key_file:
-                data = json.load(key_file)
-                self.combined_key = {int(k): v for k, v in data.items()}
+            self.combined_key = load_combined_key(self.filename)
 
         self.foreign_key_shares = [None for _ in range(total_signers)]
-        self.foreign_key_shares[index-1] = self.key_share[index]
+
+        self.compute_workers = compute_workers
+        self.compute_pool = None
+        # Without a key the pool starts once combine_keys wrote one
+        if self.combined_key != None:
+            self.start_compute_pool()
+
+    def start_compute_pool(self):
+        """
+        Starts the worker processes if compute_workers are configured, each loads the combined key once.
+
+        The ggmpc arithmetic holds the GIL, in worker processes concurrent
+        signing tasks run on all cores. The workers are forked here, for a
+        loaded key before the request threads exist.
+        """
+        if self.compute_workers <= 0 or self.compute_pool != None:
+            return
+        pool = ProcessPoolExecutor(max_workers=self.compute_workers,
+                                   mp_context=multiprocessing.get_context("fork"),
+                                   initializer=init_compute_worker,
+                                   initargs=(self.filename,))
+        # A forking pool starts all workers with the first task
+        if not pool.submit(compute_ready).result():
+            raise RuntimeError("Compute worker failed to load the combined key")
+        self.compute_pool = pool
     
+    @property
+    def key_share(self):
+        """
+        The key shares of this signer for a key generation, created on first use.
+        """
+        if self._key_share == None:
+            self._key_share = self.mpc.key_share(self.index, self.threshold, self.total_signers)
+            self.foreign_key_shares[self.index-1] = self._key_share[self.index]
+        return self._key_share
+
     def combine_keys(self):
         """
         Combines keys for this signer and writes the combined key to a file.
         """
         # Combine the keys
+        self.foreign_key_shares[self.index-1] = self.key_share[self.index]
         self.combined_key = self.mpc.key_combine(tuple(self.foreign_key_shares))
         
         print("combined key", self.combined_key)
@@ -57,6 +132,7 @@ class MultiSigner:
         with open(self.filename, "w") as key_file:
             json.dump(self.combined_key, key_file)
         print(f"Combined key for signer {self.index} written to {self.filename}")
+        self.start_compute_pool()
     
     def set_key_share(self, signer_index, key_share):
         """
@@ -87,10 +163,13 @@ class MultiSigner:
         selected_signers = self.get_selected_signers(task)
         
         print("create sign share for:","task:", f"'{task}',", "message:", f"'{message}'")
-        sign_shares = self.mpc.sign_share(message, 
-                                          tuple(self.combined_key[signer_index]
-                                                for signer_index in range(1, self.total_signers +1) 
-                                                if signer_index in selected_signers)) #TODO: check
+        if self.compute_pool != None:
+            sign_shares = self.compute_pool.submit(compute_sign_share, message, selected_signers,
+                                                   self.total_signers).result()
+        else:
+            sign_shares = self.mpc.sign_share(message, 
+                                              select_key_shares(self.combined_key, selected_signers,
+                                                                self.total_signers)) #TODO: check
         self.set_sign_shares(task, sign_shares)
     
     def sign(self, task, message):
@@ -110,6 +189,8 @@ class MultiSigner:
         except KeyError:
             raise InsufficientSignSharesError()
        
+        if self.compute_pool != None:
+            return self.compute_pool.submit(compute_sign, message, sign_shares).result()
         return self.mpc.sign(message, sign_shares)
     
     def set_foreign_sign_share(self, task, signer_index, foreign_sign_share):
@@ -119,7 +200,47 @@ class MultiSigner:
         :param signer_index: The index of the signer providing the sign share
         :param sign_share: The sign share from that signer
         """
-        self.cache.set(f"{self.namespace}:{task}.foreign_sign_shares.{signer_index}", foreign_sign_share)
+        self.sessions.set(self.session(task), f"foreign_sign_shares.{signer_index}", foreign_sign_share)
+
+    def session(self, task):
+        return f"{self.namespace}:{task}"
+
+    def is_complete(self, task) -> bool:
+        """
+        Checks whether the own and all foreign sign shares of the selected signers are present.
+        """
+        selected_signers = self.get_selected_signers(task)
+        if selected_signers is None or self.get_sign_shares(task) is None:
+            return False
+        return not self.missing_sign_shares(task)
+
+    def missing_sign_shares(self, task) -> list[int]:
+        """The selected signers whose sign shares have not arrived."""
+        selected_signers = self.get_selected_signers(task)
+        if selected_signers is None:
+            return []
+        foreign_sign_shares = self.get_foreign_sign_shares(task)
+        return [signer_index for signer_index in selected_signers
+                if signer_index != self.index and signer_index not in foreign_sign_shares]
+
+    def wait_for_sign_shares(self, task, timeout) -> bool:
+        """
+        Blocks until all sign shares of a task are present.
+
+        The shares may arrive in another worker process if the session store is shared.
+
+        :param timeout: The deadline in seconds
+        :return: True if all sign shares arrived in time
+        """
+        deadline = time.monotonic() + timeout
+        while not self.is_complete(task):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.sessions.wait(self.session(task), remaining):
+                return self.is_complete(task)
+        return True
+
+    def release_task(self, task):
+        self.sessions.release(self.session(task))
 
     def get_sign_share(self, task, signer_index=None):
         """
@@ -134,38 +255,144 @@ class MultiSigner:
         return sign_shares[int(signer_index)]
     
     def get_selected_signers(self, task):
-        return self.cache.get(f"{self.namespace}:{task}.selected_signers")
+        return self.sessions.get(self.session(task), "selected_signers")
 
     def set_selected_signers(self, task, signers):
-        self.cache.set(f"{self.namespace}:{task}.selected_signers", signers)
+        self.sessions.set(self.session(task), "selected_signers", signers)
     
     def get_sign_shares(self, task):
-        return self.cache.get(f"{self.namespace}:{task}.sign_shares")
+        return self.sessions.get(self.session(task), "sign_shares")
     
     def set_sign_shares(self, task, sign_shares):
-        self.cache.set(f"{self.namespace}:{task}.sign_shares", sign_shares)
+        self.sessions.set(self.session(task), "sign_shares", sign_shares)
 
     def get_foreign_sign_shares(self, task):
         res = {}
         for i in self.get_selected_signers(task):
-            res_i = self.cache.get(f"{self.namespace}:{task}.foreign_sign_shares.{i}")
+            res_i = self.sessions.get(self.session(task), f"foreign_sign_shares.{i}")
             if res_i:
                 res[i] = res_i
         return res
 
+SHARE_FLUSH_INTERVAL = 0.002 # seconds a queued sign share waits for others to the same peer
+SHARE_BATCH_SIZE = 256
+SHARE_SEND_TIMEOUT = 10 # seconds, a hung peer must not block its sender thread
+SHARE_BATCH_VERSION = 1
+
+# version, sender, number of shares
+SHARE_BATCH_HEADER = struct.Struct(">BHH")
+# task length, then per share: i, j, r, R
+TASK_LENGTH = struct.Struct(">H")
+SHARE_RECORD = struct.Struct(">HH32s32s")
+
+def encode_sign_shares(sender_index, shares) -> bytes:
+    """
+    Encodes the sign shares of this signer for another signer, see decode_sign_shares.
+
+    :param shares: List of (task, share) tuples, each share an r-share for the receiver
+    """
+    parts = [SHARE_BATCH_HEADER.pack(SHARE_BATCH_VERSION, sender_index, len(shares))]
+    for task, share in shares:
+        encoded_task = task.encode("utf-8")
+        try:
+            parts.append(TASK_LENGTH.pack(len(encoded_task)) + encoded_task
+                         + SHARE_RECORD.pack(share["i"], share["j"],
+                                             share["r"].to_bytes(32, "big"), share["R"].to_bytes(32, "big")))
+        except (KeyError, OverflowError, struct.error) as e:
+            raise ValueError(f"Cannot encode sign share: {e}")
+    return b"".join(parts)
+
+def decode_sign_shares(data: bytes):
+    """
+    :return: Tuple of the sender index and the list of (task, share) tuples
+    """
+    try:
+        version, sender_index, count = SHARE_BATCH_HEADER.unpack_from(data, 0)
+        if version != SHARE_BATCH_VERSION:
+            raise ValueError(f"Unknown sign share batch version {version}")
+        offset = SHARE_BATCH_HEADER.size
+        shares = []
+        for _ in range(count):
+            (task_length,) = TASK_LENGTH.unpack_from(data, offset)
+            offset += TASK_LENGTH.size
+            task = data[offset:offset + task_length].decode("utf-8")
+            offset += task_length
+            i, j, r, R = SHARE_RECORD.unpack_from(data, offset)
+            offset += SHARE_RECORD.size
+            shares.append((task, {"i": i, "j": j, "r": int.from_bytes(r, "big"), "R": int.from_bytes(R, "big")}))
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed sign share batch: {e}")
+    if offset != len(data):
+        raise ValueError("Malformed sign share batch: trailing data")
+    return sender_index, shares
+
 class RemoteMultiSigner:
-    def __init__(self, caller_id, url):
+    """
+    Sends the sign shares of this signer to another signer.
+
+    The shares are queued and a sender thread per peer posts them together
+    to /foreign_sign_shares, after SHARE_FLUSH_INTERVAL or once
+    SHARE_BATCH_SIZE shares are queued. Each peer has its own thread, so
+    the peers are served in parallel.
+    """
+    def __init__(self, caller_id, url, flush_interval=SHARE_FLUSH_INTERVAL, batch_size=SHARE_BATCH_SIZE,
+                 timeout=SHARE_SEND_TIMEOUT):
         self.index = caller_id
         self.url = url
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.queue: list[tuple[str, dict, Future]] = []
+        self.queue_changed = threading.Condition()
+        self.sender = None
+
+    def set_foreign_sign_share(self, task, sign_share) -> Future:
+        """
+        Queues a sign share for this peer.
 
-    def set_foreign_sign_share(self, task, sign_share):
-        data = {
-            "id": self.index,
-            "share": sign_share
-        }
-        res = requests.post(f"{self.url}/foreign_sign_share/{task}", json=data)
-        if res.status_code != 200:
-            raise ConnectionError
+        :return: A future resolved once the peer accepted the share, with a ConnectionError otherwise
+        """
+        future = Future()
+        with self.queue_changed:
+            self.queue.append((task, sign_share, future))
+            if self.sender == None:
+                self.sender = threading.Thread(target=self.send_shares, daemon=True)
+                self.sender.start()
+            self.queue_changed.notify()
+        return future
+
+    def next_batch(self):
+        with self.queue_changed:
+            self.queue_changed.wait_for(lambda: self.queue)
+            # Give the shares of concurrent tasks a moment to join the batch
+            deadline = time.monotonic() + self.flush_interval
+            while len(self.queue) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.queue_changed.wait(remaining)
+            batch = self.queue[:self.batch_size]
+            del self.queue[:self.batch_size]
+            return batch
+
+    def send_shares(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                data = encode_sign_shares(self.index, [(task, share) for task, share, _ in batch])
+                res = self.session.post(f"{self.url}/foreign_sign_shares", data=data,
+                                        headers={"Content-Type": "application/octet-stream"},
+                                        timeout=self.timeout)
+                if res.status_code != 200:
+                    raise ConnectionError(f"{self.url} answered with {res.status_code}")
+            except Exception as e:
+                print("Failed to send sign shares to", self.url, e)
+                for _, _, future in batch:
+                    future.set_exception(e if isinstance(e, ConnectionError) else ConnectionError(str(e)))
+                continue
+            for _, _, future in batch:
+                future.set_result(None)
 
 import base64
 def encode_signature_base64(R, sigma):
@@ -0,0 +1,35 @@
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+class SingleFlight:
+    """Coalesces identical concurrent calls so only one of them runs."""
+    def __init__(self):
+        self.calls: dict[object, _Call] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fun):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+        if leader:
+            try:
+                call.result = fun()
+            except Exception as e:
+                call.exception = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.exception is not None:
+            raise call.exception
+        return call.result
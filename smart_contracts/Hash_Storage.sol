@@ -44,6 +44,19 @@ contract HashStorage {
         return numberedHashes[index];
     }
 
+    // Function to retrieve up to count hashes starting at index start in one call
+    function getHashRange(uint256 start, uint256 count) external view returns (bytes32[] memory) {
+        require(start <= numberedHashes.length, "Index out of bounds");
+        if (count > numberedHashes.length - start) {
+            count = numberedHashes.length - start;
+        }
+        bytes32[] memory hashes = new bytes32[](count);
+        for (uint256 i = 0; i < count; i++) {
+            hashes[i] = numberedHashes[start + i];
+        }
+        return hashes;
+    }
+
     // Function to get the total count of hashes (optional)
     function getHashCount() external view returns (uint256) {
         return numberedHashes.length;
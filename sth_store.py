@@ -0,0 +1,129 @@
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from CT_interface import STH
+
+STORE_FILE = "sths.jsonl"
+
+def sth_etag(sth: STH) -> str:
+    return hashlib.sha256(json.dumps(sth, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+class STHStore:
+    """
+    Append-only store of the signed tree heads, one JSON record per line.
+
+    The latest STH is kept in memory, the others are indexed by ll_size
+    (sorted, for range scans) and tree_size and read from disk on demand.
+    Signing an STH for an ll_size again replaces the older one.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, STORE_FILE)
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        is_new = not os.path.exists(self.path)
+        self.file = open(self.path, "a+b")
+        self.ll_sizes: list[int] = []
+        self.offsets: list[int] = []
+        self.tree_sizes: dict[int, int] = {} # tree_size -> ll_size
+        self.latest_sth: STH = None
+        self.latest_etag = None
+        with self.lock:
+            self._load()
+        if is_new:
+            self.import_files(folder)
+
+    def _load(self):
+        """Indexes the records, a partially written last line is dropped."""
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        try:
+            self.file.seek(0)
+            offset = 0
+            for line in self.file:
+                if not line.endswith(b"\n"):
+                    self.file.truncate(offset)
+                    break
+                self._index(json.loads(line), offset)
+                offset += len(line)
+        finally:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def _index(self, sth: STH, offset):
+        ll_size = sth["ll_size"]
+        position = bisect.bisect_left(self.ll_sizes, ll_size)
+        if position < len(self.ll_sizes) and self.ll_sizes[position] == ll_size:
+            self.offsets[position] = offset
+        else:
+            self.ll_sizes.insert(position, ll_size)
+            self.offsets.insert(position, offset)
+        self.tree_sizes[sth["tree_size"]] = ll_size
+        if self.latest_sth is None or ll_size >= self.latest_sth["ll_size"]:
+            self.latest_sth = sth
+            self.latest_etag = sth_etag(sth)
+
+    def __len__(self):
+        return len(self.ll_sizes)
+
+    def put(self, sth: STH):
+        line = (json.dumps(sth) + "\n").encode("utf-8")
+        with self.lock:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            try:
+                self.file.seek(0, os.SEEK_END)
+                offset = self.file.tell()
+                self.file.write(line)
+                self.file.flush()
+                # STHs are rare and must survive a crash
+                os.fsync(self.file.fileno())
+            finally:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self._index(sth, offset)
+
+    def latest(self) -> tuple[STH, str]:
+        """
+        :return: Tuple of the STH with the largest ll_size and its ETag, (None, None) if empty
+        """
+        with self.lock:
+            return self.latest_sth, self.latest_etag
+
+    def _read(self, position) -> STH:
+        self.file.seek(self.offsets[position])
+        return json.loads(self.file.readline())
+
+    def get(self, ll_size: int) -> STH:
+        """Returns the STH signed for the ledger size or None."""
+        with self.lock:
+            position = bisect.bisect_left(self.ll_sizes, ll_size)
+            if position == len(self.ll_sizes) or self.ll_sizes[position] != ll_size:
+                return None
+            return self._read(position)
+
+    def get_by_tree_size(self, tree_size: int) -> STH:
+        """Returns the latest STH signed for the log's tree size or None."""
+        with self.lock:
+            ll_size = self.tree_sizes.get(tree_size)
+        if ll_size is None:
+            return None
+        sth = self.get(ll_size)
+        return sth if sth is not None and sth["tree_size"] == tree_size else None
+
+    def range(self, start: int, end: int) -> list[STH]:
+        """Returns the STHs with an ll_size in [start, end) ordered by ll_size."""
+        with self.lock:
+            first = bisect.bisect_left(self.ll_sizes, start)
+            last = bisect.bisect_left(self.ll_sizes, end)
+            return [self._read(position) for position in range(first, last)]
+
+    def import_files(self, folder):
+        """Adds the STHs stored as <ll_size>.json files by earlier versions."""
+        files = [file for file in os.listdir(folder) if file.split('.')[0].isdigit()]
+        for file in sorted(files, key=lambda x: int(x.split('.')[0])):
+            with open(os.path.join(folder, file), "r") as f:
+                self.put(json.load(f))
+
+    def close(self):
+        with self.lock:
+            self.file.close()
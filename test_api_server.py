@@ -0,0 +1,44 @@
+import importlib
+import sys
+import pytest
+import configuration
+
+CONFIGURATION = {"index": 1, "threshold": 3, "total_signers": 5, "public_key": 0, "log_id": "LOG_ID",
+                 "key_folder": "keys", "urls": {str(i): f"http://localhost:500{i}" for i in range(1, 6)}}
+
+@pytest.fixture
+def api_server(tmp_path, monkeypatch):
+    # The module creates its HashStorage mirror and journal in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(configuration, "_configuration", CONFIGURATION)
+    sys.modules.pop("api_server", None)
+    api_server = importlib.import_module("api_server")
+    monkeypatch.setattr(api_server, "signing_task", lambda name, selected_signers, session=None: name)
+    signed = []
+    monkeypatch.setattr(api_server, "threshold_sign", lambda task, selected_signers, data: (signed.append(data), "")[1])
+    api_server.signed = signed
+    yield api_server
+    api_server.store.receipts.close()
+    sys.modules.pop("api_server", None)
+
+def request_sct(api_server, index):
+    client = api_server.app.test_client()
+    return client.get(f"/sign_sct/{index}", json={"selected_signers": [1, 2, 3], "timestamp": 1})
+
+def test_sign_sct_unknown_index(api_server, monkeypatch):
+    monkeypatch.setattr(api_server.store, "get_hash_by_index", lambda index: None)
+    response = request_sct(api_server, 7)
+    assert response.status_code == 404
+    assert api_server.signed == []
+
+def test_sign_sct_index_beyond_chain(api_server, monkeypatch):
+    def get_hash_by_index(index):
+        raise ValueError("execution reverted")
+    monkeypatch.setattr(api_server.store, "get_hash_by_index", get_hash_by_index)
+    assert request_sct(api_server, 7).status_code == 404
+    assert api_server.signed == []
+
+def test_sign_sct_known_index(api_server, monkeypatch):
+    monkeypatch.setattr(api_server.store, "get_hash_by_index", lambda index: "ab" * 32)
+    assert request_sct(api_server, 7).status_code == 200
+    assert len(api_server.signed) == 1
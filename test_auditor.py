@@ -0,0 +1,58 @@
+import base64
+import hashlib
+from auditor import validate_merkle_inclusion_proof, validate_merkle_inclusion_proofs, MerkleInclusionBatch
+from merkle_tree import MerkleTree, hash_leaf
+
+TREE_SIZE = 40
+
+def encode_path(path):
+    return [base64.b64encode(p).decode("utf-8") for p in path]
+
+def tree_of(size) -> MerkleTree:
+    tree = MerkleTree()
+    tree.extend(hash_leaf(i.to_bytes(4, "big")) for i in range(size))
+    return tree
+
+def test_all_proofs_verify():
+    tree = tree_of(TREE_SIZE)
+    for tree_size in range(1, TREE_SIZE + 1):
+        root = tree.root(tree_size)
+        for leaf_index in range(tree_size):
+            path = encode_path(tree.audit_path(leaf_index, tree_size))
+            assert validate_merkle_inclusion_proof(leaf_index, tree_size, root, tree.leaf(leaf_index), path), \
+                (leaf_index, tree_size)
+
+def test_right_edge_proofs_verify():
+    # The last leaf of a tree whose size is not a power of two is carried up
+    # several levels without a sibling
+    tree = tree_of(5)
+    for leaf_index, tree_size in [(2, 3), (4, 5)]:
+        path = encode_path(tree.audit_path(leaf_index, tree_size))
+        assert validate_merkle_inclusion_proof(leaf_index, tree_size, tree.root(tree_size), tree.leaf(leaf_index), path)
+        batch = MerkleInclusionBatch(tree_size, tree.root(tree_size))
+        assert batch.validate(leaf_index, tree.leaf(leaf_index), path)
+
+def test_batch_matches_single_proofs():
+    tree = tree_of(TREE_SIZE)
+    for tree_size in (1, 7, 16, 33, TREE_SIZE):
+        root = tree.root(tree_size)
+        proofs = [(leaf_index, tree.leaf(leaf_index), encode_path(tree.audit_path(leaf_index, tree_size)))
+                  for leaf_index in range(tree_size)]
+        # A wrong leaf, a wrong index and a truncated path
+        proofs.append((0, hashlib.sha256(b"other").digest(), proofs[0][2]))
+        if tree_size > 1:
+            proofs.append((1, proofs[0][1], proofs[0][2]))
+            proofs.append((tree_size - 1, tree.leaf(tree_size - 1), proofs[tree_size - 1][2][:-1]))
+        expected = [validate_merkle_inclusion_proof(leaf_index, tree_size, root, leaf, path)
+                    for leaf_index, leaf, path in proofs]
+        assert validate_merkle_inclusion_proofs(tree_size, root, proofs) == expected
+        assert expected[:tree_size] == [True] * tree_size
+        assert not any(expected[tree_size:])
+
+def test_invalid_proofs_rejected():
+    tree = tree_of(8)
+    root = tree.root()
+    path = encode_path(tree.audit_path(3))
+    assert not validate_merkle_inclusion_proof(8, 8, root, tree.leaf(3), path)
+    assert not validate_merkle_inclusion_proof(3, 8, root, tree.leaf(3), path + path[:1])
+    assert not validate_merkle_inclusion_proof(3, 9, root, tree.leaf(3), path)
@@ -0,0 +1,127 @@
+import os
+import types
+import pytest
+import blockchain_interface
+from blockchain_interface import HashStorage
+
+def hashes(count):
+    return ["0x" + os.urandom(32).hex() for _ in range(count)]
+
+class FakeContract:
+    """Stands in for the contract, range_error replaces getHashRange with an error."""
+    def __init__(self, stored, range_error=None):
+        self.stored = [bytes.fromhex(value.removeprefix("0x")) for value in stored]
+        self.range_error = range_error
+        self.range_calls = []
+        self.index_calls = 0
+        self.functions = self
+
+    def getHashCount(self):
+        return types.SimpleNamespace(call=lambda: len(self.stored))
+
+    def getHashByIndex(self, index):
+        def call():
+            self.index_calls += 1
+            return self.stored[index]
+        return types.SimpleNamespace(call=call)
+
+    def getHashRange(self, start, count):
+        def call():
+            self.range_calls.append((start, count))
+            if self.range_error != None:
+                raise self.range_error
+            return self.stored[start:start + count]
+        return types.SimpleNamespace(call=call)
+
+def storage_with(contract, tmp_path) -> HashStorage:
+    storage = HashStorage(web3=object(), mirror_file=str(tmp_path / "mirror.bin"),
+                          journal_file=str(tmp_path / "receipts.jsonl"))
+    storage._roc_contract = contract
+    return storage
+
+def hex_values(values):
+    return [value.removeprefix("0x") for value in values]
+
+def test_range_reads_are_chunked(tmp_path, monkeypatch):
+    monkeypatch.setattr(blockchain_interface, "HASH_RANGE_CHUNK", 4)
+    stored = hashes(10)
+    contract = FakeContract(stored)
+    storage = storage_with(contract, tmp_path)
+    assert storage.get_hashes_from_chain(1, 10) == hex_values(stored[1:])
+    assert contract.range_calls == [(1, 4), (5, 4), (9, 1)]
+    assert contract.index_calls == 0
+
+def test_range_beyond_chain_raises(tmp_path):
+    storage = storage_with(FakeContract(hashes(3)), tmp_path)
+    with pytest.raises(IndexError):
+        storage.get_hashes_from_chain(2, 5)
+
+def test_get_hashes_fills_the_mirror(tmp_path):
+    stored = hashes(6)
+    contract = FakeContract(stored)
+    storage = storage_with(contract, tmp_path)
+    assert storage.get_hashes(0, 4) == hex_values(stored[:4])
+    assert storage.get_hashes(2, 6) == hex_values(stored[2:])
+    assert contract.range_calls == [(0, 4), (4, 2)]
+    assert storage.get_hashes(0, 6) == hex_values(stored)
+    assert len(contract.range_calls) == 2
+
+@pytest.mark.parametrize("error", ["bad_output", "revert_without_reason"])
+def test_contract_without_range_reads(tmp_path, error):
+    from web3.exceptions import BadFunctionCallOutput, ContractLogicError
+    range_error = BadFunctionCallOutput("Could not decode") if error == "bad_output" \
+        else ContractLogicError("execution reverted", data="0x")
+    stored = hashes(5)
+    contract = FakeContract(stored, range_error)
+    storage = storage_with(contract, tmp_path)
+    assert storage.get_hashes_from_chain(0, 5) == hex_values(stored)
+    assert not storage.supports_range_reads
+    assert contract.index_calls == 5
+    storage.get_hashes_from_chain(0, 2)
+    assert len(contract.range_calls) == 1
+
+def test_range_revert_with_reason_raises(tmp_path):
+    from web3.exceptions import ContractLogicError
+    contract = FakeContract(hashes(5), ContractLogicError("execution reverted: Index out of bounds",
+                                                          data="0x08c379a0"))
+    storage = storage_with(contract, tmp_path)
+    with pytest.raises(ContractLogicError):
+        storage.get_hashes_from_chain(0, 5)
+    assert storage.supports_range_reads
+
+@pytest.fixture
+def local_evm(tmp_path, monkeypatch):
+    """Deploys the hash storage contract to an in-memory EVM."""
+    solcx = pytest.importorskip("solcx")
+    pytest.importorskip("eth_tester")
+    if not solcx.get_installed_solc_versions():
+        pytest.skip("No solc installed")
+    from web3 import Web3, EthereumTesterProvider
+    source = os.path.join(os.path.dirname(__file__), "smart_contracts", "Hash_Storage.sol")
+    compiled = solcx.compile_files([source], output_values=["abi", "bin"])
+    contract_interface, = compiled.values()
+    provider = EthereumTesterProvider()
+    web3 = Web3(provider)
+    account = web3.eth.accounts[0]
+    tx_hash = web3.eth.contract(abi=contract_interface["abi"], bytecode=contract_interface["bin"]) \
+        .constructor().transact({"from": account})
+    address = web3.eth.wait_for_transaction_receipt(tx_hash)["contractAddress"]
+    private_key = provider.ethereum_tester.backend.account_keys[0]
+    account_on_evm = {"ACCOUNT_ADDRESS": account, "PRIVATE_KEY": private_key.to_hex(), "NODE_URL": ""}
+    monkeypatch.setattr(blockchain_interface, "get_bc_configuration", lambda: account_on_evm)
+    monkeypatch.setattr(blockchain_interface, "get_gas_price", lambda: 10)
+    monkeypatch.setattr(blockchain_interface, "RECEIPT_POLL", 0.01)
+    storage = HashStorage(web3=web3, address=address, mirror_file=str(tmp_path / "mirror.bin"),
+                          journal_file=str(tmp_path / "receipts.jsonl"))
+    yield storage
+    storage.receipts.close()
+
+def test_local_evm_add_and_read_range(local_evm, monkeypatch):
+    monkeypatch.setattr(blockchain_interface, "HASH_RANGE_CHUNK", 4)
+    added = hashes(10)
+    local_evm.add_hashes(added)
+    assert local_evm.get_hash_count() == 10
+    assert local_evm.get_hashes_from_chain(0, 10) == [value.removeprefix("0x") for value in added]
+    assert local_evm.supports_range_reads
+    with pytest.raises(IndexError):
+        local_evm.get_hashes_from_chain(8, 12)
@@ -0,0 +1,58 @@
+import urllib.parse
+import pytest
+from CT_interface import CTLogClient
+
+LOG_URL = "http://log.test/ct/v1/"
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+class ShortPageSession:
+    """Serves get-entries from a log of tree_size entries with at most page_size entries per page."""
+    def __init__(self, tree_size, page_size):
+        self.tree_size = tree_size
+        self.page_size = page_size
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+        start, end = int(query["start"][0]), int(query["end"][0])
+        self.requests.append((start, end))
+        end = min(end, start + self.page_size - 1, self.tree_size - 1)
+        return FakeResponse({"entries": [{"leaf_input": str(i)} for i in range(start, end + 1)]})
+
+def client_of(session) -> CTLogClient:
+    client = CTLogClient(LOG_URL)
+    client.session = session
+    return client
+
+def leaf_inputs(entries):
+    return [int(entry["leaf_input"]) for entry in entries]
+
+def test_window_follows_up_on_short_pages():
+    session = ShortPageSession(100, 3)
+    entries = client_of(session).get_entries_window(10, 19)
+    assert leaf_inputs(entries) == list(range(10, 20))
+    assert session.requests == [(10, 19), (13, 19), (16, 19), (19, 19)]
+
+def test_window_in_one_page():
+    session = ShortPageSession(100, 50)
+    assert leaf_inputs(client_of(session).get_entries_window(0, 9)) == list(range(10))
+    assert session.requests == [(0, 9)]
+
+def test_window_beyond_the_log_raises():
+    session = ShortPageSession(12, 3)
+    with pytest.raises(ConnectionError):
+        client_of(session).get_entries_window(5, 19)
+
+def test_iter_entries_in_order():
+    session = ShortPageSession(100, 7)
+    entries = client_of(session).iter_entries(3, 64, window=10, parallelism=3)
+    assert leaf_inputs(entries) == list(range(3, 65))
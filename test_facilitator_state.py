@@ -0,0 +1,53 @@
+import importlib
+import sys
+import pytest
+import configuration
+from signer_health import MissingSignSharesError, SignerError, FAILURES_TO_OPEN
+
+CONFIGURATION = {"index": 1, "threshold": 3, "total_signers": 5, "public_key": 0, "log_id": "LOG_ID",
+                 "key_folder": "keys", "urls": {str(i): f"http://localhost:500{i}" for i in range(1, 6)}}
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    # The stores are created in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(configuration, "_configuration", CONFIGURATION)
+    sys.modules.pop("facilitator_state", None)
+    state = importlib.import_module("facilitator_state")
+    yield state
+    sys.modules.pop("facilitator_state", None)
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self.body
+
+def test_state_does_not_import_flask_facilitator(state):
+    assert "api_facilitator" not in sys.modules
+    assert sorted(state.signer_urls) == [1, 2, 3, 4, 5]
+
+def test_missing_signers_of(state):
+    assert state.missing_signers_of(FakeResponse({"error": "x", "missing": [2, "4"]})) == [2, 4]
+    assert state.missing_signers_of(FakeResponse({"error": "x"})) == []
+    assert state.missing_signers_of(FakeResponse(ValueError("no json"))) == []
+    assert state.missing_signers_of(FakeResponse(["not", "a", "dict"])) == []
+
+def test_blame_missing_signers(state):
+    excluded = set()
+    state.blame_signers(MissingSignSharesError([2, 4, 9]), 1, excluded)
+    assert excluded == {2, 4}
+    assert state.signer_health.stats[2].consecutive_failures == 1
+    assert state.signer_health.stats[1].consecutive_failures == 0
+    # A signer already blamed in this signing is not counted twice
+    state.blame_signers(MissingSignSharesError([2]), 3, excluded)
+    assert state.signer_health.stats[2].consecutive_failures == 1
+
+def test_blame_failed_signer(state):
+    excluded = set()
+    state.blame_signers(SignerError(), 3, excluded)
+    assert excluded == {3}
+    assert state.signer_health.stats[3].consecutive_failures < FAILURES_TO_OPEN
@@ -0,0 +1,67 @@
+import os
+import pytest
+from hash_mirror import HashMirror, RECORD_SIZE
+
+def hashes_of(count):
+    return [os.urandom(32).hex() for _ in range(count)]
+
+def test_append_and_read(tmp_path):
+    mirror = HashMirror(str(tmp_path / "mirror.bin"))
+    hashes = hashes_of(5)
+    assert mirror.get(0) == None
+    mirror.append(0, hashes[:3])
+    mirror.append(2, ["0x" + h for h in hashes[2:]])
+    assert len(mirror) == 5
+    assert mirror.get(4) == hashes[4]
+    assert mirror.get(5) == None
+    assert mirror.get_range(1, 4) == hashes[1:4]
+    assert mirror.get_range(3, 6) == None
+    assert mirror.get_range(4, 4) == []
+    mirror.close()
+
+def test_gaps_refused(tmp_path):
+    mirror = HashMirror(str(tmp_path / "mirror.bin"))
+    mirror.append(0, hashes_of(2))
+    with pytest.raises(IndexError):
+        mirror.append(3, hashes_of(1))
+    assert len(mirror) == 2
+    mirror.close()
+
+def test_truncated_record_dropped(tmp_path):
+    path = tmp_path / "mirror.bin"
+    mirror = HashMirror(str(path))
+    hashes = hashes_of(2)
+    mirror.append(0, hashes)
+    mirror.close()
+    with open(path, "ab") as file:
+        file.write(os.urandom(RECORD_SIZE // 2))
+    mirror = HashMirror(str(path))
+    assert len(mirror) == 2
+    assert os.path.getsize(path) == 2 * RECORD_SIZE
+    assert mirror.get_range(0, 2) == hashes
+    mirror.close()
+
+def test_shared_file(tmp_path):
+    path = str(tmp_path / "mirror.bin")
+    writer, reader = HashMirror(path), HashMirror(path)
+    hashes = hashes_of(3)
+    writer.append(0, hashes)
+    assert reader.get(2) == hashes[2]
+    assert reader.get_range(0, 3) == hashes
+    writer.close()
+    reader.close()
+
+def test_sync_fetches_missing_hashes(tmp_path):
+    mirror = HashMirror(str(tmp_path / "mirror.bin"))
+    chain = hashes_of(7)
+    mirror.append(0, chain[:3])
+    requested = []
+    def get_hashes(start, end):
+        requested.append((start, end))
+        return chain[start:end]
+    assert mirror.sync(lambda: len(chain), get_hashes) == 7
+    assert requested == [(3, 7)]
+    assert mirror.get_range(0, 7) == chain
+    assert mirror.sync(lambda: len(chain), get_hashes) == 7
+    assert requested == [(3, 7)]
+    mirror.close()
@@ -0,0 +1,63 @@
+import pytest
+from auditor import validate_consistency_proof
+from merkle_tree import MerkleTree, EMPTY_ROOT, hash_leaf, merkle_levels, merkle_root, audit_path, root_from_audit_path
+
+TREE_SIZE = 33
+
+def leaves_of(size):
+    return [hash_leaf(i.to_bytes(4, "big")) for i in range(size)]
+
+@pytest.fixture(scope="module")
+def tree():
+    tree = MerkleTree()
+    tree.extend(leaves_of(TREE_SIZE))
+    return tree
+
+def test_roots_match_levels(tree):
+    leaves = leaves_of(TREE_SIZE)
+    assert tree.root(0) == EMPTY_ROOT
+    for tree_size in range(1, TREE_SIZE + 1):
+        assert tree.root(tree_size) == merkle_root(leaves[:tree_size])
+
+def test_audit_paths_match_levels(tree):
+    leaves = leaves_of(TREE_SIZE)
+    for tree_size in range(1, TREE_SIZE + 1):
+        levels = merkle_levels(leaves[:tree_size])
+        for leaf_index in range(tree_size):
+            path = tree.audit_path(leaf_index, tree_size)
+            assert path == audit_path(leaf_index, levels), (leaf_index, tree_size)
+            assert root_from_audit_path(leaf_index, tree_size, tree.leaf(leaf_index), path) == tree.root(tree_size)
+
+def test_root_from_audit_path_shares_known_nodes(tree):
+    known = {}
+    for leaf_index in range(TREE_SIZE):
+        path = tree.audit_path(leaf_index)
+        assert root_from_audit_path(leaf_index, TREE_SIZE, tree.leaf(leaf_index), path, known) == tree.root()
+    # A path that is too long or too short does not fit the tree size
+    path = tree.audit_path(TREE_SIZE - 1)
+    assert root_from_audit_path(TREE_SIZE - 1, TREE_SIZE, tree.leaf(TREE_SIZE - 1), path + path[:1], known) == None
+    assert root_from_audit_path(0, TREE_SIZE, tree.leaf(0), tree.audit_path(0)[:-1], known) == None
+    assert root_from_audit_path(TREE_SIZE, TREE_SIZE, tree.leaf(0), path, known) == None
+
+def test_consistency_proofs_verify(tree):
+    for second_size in range(2, TREE_SIZE + 1):
+        for first_size in range(1, second_size):
+            proof = tree.consistency_proof(first_size, second_size)
+            assert validate_consistency_proof(tree.root(first_size), first_size, tree.root(second_size),
+                                              second_size, proof), (first_size, second_size)
+
+def test_tampered_consistency_proof_rejected(tree):
+    proof = tree.consistency_proof(5, TREE_SIZE)
+    proof[-1] = hash_leaf(b"other")
+    assert not validate_consistency_proof(tree.root(5), 5, tree.root(), TREE_SIZE, proof)
+    assert not validate_consistency_proof(tree.root(6), 5, tree.root(), TREE_SIZE, tree.consistency_proof(5))
+
+def test_sizes_out_of_range(tree):
+    with pytest.raises(IndexError):
+        tree.root(TREE_SIZE + 1)
+    with pytest.raises(IndexError):
+        tree.audit_path(TREE_SIZE)
+    with pytest.raises(IndexError):
+        tree.consistency_proof(0, TREE_SIZE)
+    with pytest.raises(IndexError):
+        tree.consistency_proof(2, 1)
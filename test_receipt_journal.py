@@ -0,0 +1,81 @@
+import json
+import time
+import pytest
+import receipt_journal
+from receipt_journal import ReceiptJournal
+
+def receipt_of(start, end, status=1):
+    return {"transactionHash": f"0x{start:04x}", "status": status,
+            "hashes_inserted": end - start, "total_hashes": end}
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    fsyncs = []
+    monkeypatch.setattr(receipt_journal.os, "fsync", fsyncs.append)
+    return fsyncs
+
+def test_find(tmp_path, fsyncs):
+    journal = ReceiptJournal(str(tmp_path / "receipts.jsonl"))
+    for start, end in [(0, 10), (20, 25), (10, 20)]:
+        journal.append(receipt_of(start, end))
+    journal.append(receipt_of(25, 30, status=0))
+    assert len(journal) == 3
+    assert journal.find(0) == receipt_of(0, 10)
+    assert journal.find(19) == receipt_of(10, 20)
+    assert journal.find(24) == receipt_of(20, 25)
+    # Failed transactions did not add hashes
+    assert journal.find(25) == None
+    assert journal.find_range(5, 21) == [receipt_of(0, 10), receipt_of(10, 20), receipt_of(20, 25)]
+    assert journal.find_range(10, 20) == [receipt_of(10, 20)]
+    assert journal.find_range(25, 40) == []
+    journal.close()
+
+def test_reload_drops_partial_line(tmp_path, fsyncs):
+    path = tmp_path / "receipts.jsonl"
+    journal = ReceiptJournal(str(path))
+    journal.append(receipt_of(0, 10))
+    journal.close()
+    with open(path, "ab") as file:
+        file.write(b'{"transactionHash": "0x')
+    journal = ReceiptJournal(str(path))
+    assert len(journal) == 1
+    journal.append(receipt_of(10, 20))
+    journal.close()
+    journal = ReceiptJournal(str(path))
+    assert journal.find(15) == receipt_of(10, 20)
+    journal.close()
+
+def test_syncs_every_fsync_records(tmp_path, fsyncs):
+    journal = ReceiptJournal(str(tmp_path / "receipts.jsonl"), fsync_interval=60, fsync_records=3)
+    for start in range(0, 50, 10):
+        journal.append(receipt_of(start, start + 10))
+    assert len(fsyncs) == 1
+    journal.close()
+    assert len(fsyncs) == 2
+
+def test_timer_syncs_after_burst(tmp_path, fsyncs):
+    journal = ReceiptJournal(str(tmp_path / "receipts.jsonl"), fsync_interval=0.05, fsync_records=100)
+    journal.append(receipt_of(0, 10))
+    journal.append(receipt_of(10, 20))
+    assert fsyncs == []
+    deadline = time.monotonic() + 5
+    while not fsyncs and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(fsyncs) == 1
+    assert journal.unsynced == 0 and journal.sync_timer == None
+    journal.close()
+    assert len(fsyncs) == 1
+
+def test_import_files(tmp_path, fsyncs):
+    folder = tmp_path / "bc_receipt"
+    folder.mkdir()
+    for start, end in [(0, 5), (5, 8)]:
+        with open(folder / f"receipt_{start}.json", "w") as file:
+            json.dump(receipt_of(start, end), file)
+    with open(folder / "receipt_old.json", "w") as file:
+        json.dump({"transactionHash": "0xold", "status": 1}, file)
+    journal = ReceiptJournal(str(tmp_path / "receipts.jsonl"))
+    journal.import_files(str(folder))
+    assert len(journal) == 2
+    assert journal.find(6) == receipt_of(5, 8)
+    journal.close()
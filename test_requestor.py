@@ -0,0 +1,88 @@
+import importlib
+import sys
+import pytest
+
+@pytest.fixture
+def requestor(tmp_path, monkeypatch):
+    # The module creates its HashStorage mirror and journal in the working directory
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop("requestor", None)
+    requestor = importlib.import_module("requestor")
+    monkeypatch.setattr(requestor, "RETRY_DELAY", 0.01)
+    monkeypatch.setattr(requestor, "load_progress", lambda: {"sct_end": 10, "sth_ll_size": 0})
+    monkeypatch.setattr(requestor, "store_progress", lambda progress: None)
+    yield requestor
+    requestor.hash_storage.receipts.close()
+    sys.modules.pop("requestor", None)
+
+def flaky(failures: list):
+    """Raises the given errors one after another, then succeeds."""
+    def action(value):
+        if failures:
+            raise failures.pop(0)
+        return value
+    return action
+
+def test_retry_transient_errors(requestor):
+    daemon = requestor.RequestorDaemon()
+    action = flaky([ConnectionError("refused"), TimeoutError("slow"), OSError("429")])
+    assert daemon.retry(action, 5) == 5
+    assert not daemon.stopped.is_set()
+
+def test_retry_raises_fatal_errors(requestor):
+    daemon = requestor.RequestorDaemon()
+    with pytest.raises(ValueError):
+        daemon.retry(flaky([ConnectionError("refused"), ValueError("expected_start")]), 5)
+
+def test_retry_returns_none_once_stopped(requestor):
+    daemon = requestor.RequestorDaemon()
+    daemon.stopped.set()
+    assert daemon.retry(flaky([]), 5) == None
+
+def test_fatal_error_stops_daemon(requestor):
+    daemon = requestor.RequestorDaemon()
+    def stage():
+        raise ValueError("Hashes would be added at 12, expected 10")
+    daemon.run_stage(stage)
+    assert daemon.stopped.is_set()
+
+def test_request_sth_returns_signed_ll_size(requestor, monkeypatch):
+    monkeypatch.setattr(requestor.hash_storage, "get_hash_count", lambda: 20)
+    monkeypatch.setattr(requestor, "get_sth", lambda: {"tree_size": 30})
+    monkeypatch.setattr(requestor, "sign_mth", lambda mth: {**mth, "tree_head_signature": "c2ln"})
+    monkeypatch.setattr(requestor, "verify_sth", lambda sth: True)
+    stored = []
+    monkeypatch.setattr(requestor, "store_sth", lambda sth, index: stored.append((sth["ll_size"], index)))
+    assert requestor.request_sth() == 19
+    assert stored == [(19, 19)]
+
+def test_request_sth_fails_without_signature(requestor, monkeypatch):
+    monkeypatch.setattr(requestor.hash_storage, "get_hash_count", lambda: 20)
+    monkeypatch.setattr(requestor, "get_sth", lambda: {"tree_size": 30})
+    monkeypatch.setattr(requestor, "sign_mth", lambda mth: None)
+    with pytest.raises(ConnectionError):
+        requestor.request_sth()
+
+def test_sign_sths_stores_signed_ll_size(requestor, monkeypatch):
+    daemon = requestor.RequestorDaemon(sth_interval=0.01)
+    signed = []
+    def request_sth():
+        signed.append(9)
+        daemon.stopped.set()
+        return 9
+    monkeypatch.setattr(requestor, "request_sth", request_sth)
+    daemon.sign_sths()
+    assert signed == [9]
+    assert daemon.progress["sth_ll_size"] == 9
+
+def test_daemon_issues_single_scts_by_default(requestor):
+    assert requestor.RequestorDaemon().request_scts == requestor.request_scts
+    assert requestor.RequestorDaemon(batch_scts=True).request_scts == requestor.request_sct_batch
+
+def test_request_scts_raises_on_failed_sct(requestor, monkeypatch):
+    monkeypatch.setattr(requestor, "sign_sct", lambda index: None if index == 2 else {"signed_hash": "c2ln"})
+    monkeypatch.setattr(requestor, "verify_sct", lambda sct: True)
+    monkeypatch.setattr(requestor, "store_sct", lambda sct, index: None)
+    assert len(requestor.request_scts(0, 2)) == 2
+    with pytest.raises(ConnectionError):
+        requestor.request_scts(0, 4)
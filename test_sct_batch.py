@@ -0,0 +1,56 @@
+import base64
+import os
+import pytest
+from sct_batch import build_batch, batched_scts, batch_signable_data_of, is_batched_sct, SCT_VERSION
+from signed_data import BINARY_VERSION
+
+LOG_ID = "logledger"
+TIMESTAMP = 1700000000000
+SIGNATURE = base64.b64encode(b"signature").decode("utf-8")
+
+def certificates(count):
+    return [os.urandom(32).hex() for _ in range(count)]
+
+@pytest.mark.parametrize("version", [SCT_VERSION, BINARY_VERSION])
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, 13])
+def test_every_sct_leads_to_the_signed_head(version, size):
+    hashed_certificates = certificates(size)
+    levels, signable = build_batch(hashed_certificates, LOG_ID, TIMESTAMP, version)
+    scts = batched_scts(hashed_certificates, levels, SIGNATURE, LOG_ID, TIMESTAMP, version)
+    assert len(scts) == size
+    for index, sct in enumerate(scts):
+        assert is_batched_sct(sct)
+        assert sct["batch_index"] == index and sct["batch_size"] == size
+        assert base64.b64decode(sct["hashed_certificate"]).hex() == hashed_certificates[index]
+        assert batch_signable_data_of(sct) == signable
+
+def test_signed_head_depends_on_version():
+    hashed_certificates = certificates(3)
+    assert build_batch(hashed_certificates, LOG_ID, TIMESTAMP, SCT_VERSION)[1] \
+        != build_batch(hashed_certificates, LOG_ID, TIMESTAMP, BINARY_VERSION)[1]
+
+@pytest.fixture
+def batch():
+    hashed_certificates = certificates(5)
+    levels, signable = build_batch(hashed_certificates, LOG_ID, TIMESTAMP)
+    return batched_scts(hashed_certificates, levels, SIGNATURE, LOG_ID, TIMESTAMP), signable
+
+def test_tampered_batch_index(batch):
+    scts, signable = batch
+    for index in (1, 3, 4, 5, 100):
+        assert batch_signable_data_of({**scts[2], "batch_index": index}) != signable
+
+def test_tampered_batch_size(batch):
+    scts, signable = batch
+    assert batch_signable_data_of({**scts[2], "batch_size": 6}) != signable
+
+def test_tampered_certificate(batch):
+    scts, signable = batch
+    other = base64.b64encode(os.urandom(32)).decode("utf-8")
+    assert batch_signable_data_of({**scts[2], "hashed_certificate": other}) != signable
+
+def test_tampered_path(batch):
+    scts, signable = batch
+    path = scts[2]["inclusion_path"]
+    assert batch_signable_data_of({**scts[2], "inclusion_path": path[:-1]}) == None
+    assert batch_signable_data_of({**scts[2], "inclusion_path": path[1:] + path[:1]}) != signable
@@ -0,0 +1,51 @@
+import base64
+import os
+from sct_store import SCTStore, STORE_FILE
+
+def sct_of(certificate_hash: bytes, signature=b"signature"):
+    return {"hashed_certificate": base64.b64encode(certificate_hash).decode("utf-8"), "id": "logledger",
+            "timestamp": 1, "signed_hash": base64.b64encode(signature).decode("utf-8")}
+
+def test_first_sct_of_an_index_is_kept(tmp_path):
+    store = SCTStore(str(tmp_path))
+    first, second = sct_of(os.urandom(32)), sct_of(os.urandom(32))
+    assert store.put([(0, first)]) == [first]
+    assert store.put([(0, second), (1, second)]) == [first, second]
+    assert len(store) == 2 and 1 in store and 2 not in store
+    assert store.get(0) == first
+    assert store.get(2) == None
+    store.close()
+
+def test_get_range(tmp_path):
+    store = SCTStore(str(tmp_path))
+    scts = [sct_of(os.urandom(32)) for _ in range(4)]
+    store.put(list(enumerate(scts)))
+    assert store.get_range(1, 4) == scts[1:]
+    assert store.get_range(2, 5) == None
+    store.close()
+
+def test_get_by_hash(tmp_path):
+    store = SCTStore(str(tmp_path))
+    certificate_hash = os.urandom(32)
+    sct = sct_of(certificate_hash)
+    store.put([(5, sct)])
+    assert store.get_by_hash(certificate_hash.hex()) == sct
+    assert store.get_by_hash("0x" + certificate_hash.hex().upper()) == sct
+    assert store.get_by_hash(os.urandom(32).hex()) == None
+    store.close()
+
+def test_reload_drops_partial_line(tmp_path):
+    store = SCTStore(str(tmp_path))
+    scts = [sct_of(os.urandom(32)) for _ in range(3)]
+    store.put(list(enumerate(scts[:2])))
+    store.close()
+    with open(tmp_path / STORE_FILE, "ab") as file:
+        file.write(b'{"index": 2, "sct": {"hashed_')
+    store = SCTStore(str(tmp_path))
+    assert len(store) == 2
+    assert store.get_by_hash(base64.b64decode(scts[1]["hashed_certificate"]).hex()) == scts[1]
+    store.put([(2, scts[2])])
+    store.close()
+    store = SCTStore(str(tmp_path))
+    assert store.get_range(0, 3) == scts
+    store.close()
@@ -0,0 +1,82 @@
+import threading
+import time
+import pytest
+from flask import Flask
+from flask_caching import Cache
+from session_store import SessionStore, LocalSessionStore, RedisSessionStore
+
+@pytest.fixture
+def local_store():
+    cache = Cache(Flask(__name__), config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300})
+    return LocalSessionStore(cache)
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url: fakeredis.FakeRedis(server=server)))
+    return RedisSessionStore("redis://localhost/0")
+
+@pytest.fixture(params=["local_store", "redis_store"])
+def store(request) -> SessionStore:
+    return request.getfixturevalue(request.param)
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+def test_set_and_get(store):
+    store.set("task", "shares", {"r": 1})
+    assert store.get("task", "shares") == {"r": 1}
+    assert store.get("task", "other") == None
+    assert store.get("other", "shares") == None
+
+def test_wait_times_out(store):
+    started = time.monotonic()
+    assert not store.wait("task", 0.1)
+    assert time.monotonic() - started >= 0.1
+
+def test_wait_wakes_on_set(store):
+    setter = threading.Timer(0.05, store.set, ("task", "shares", 1))
+    setter.start()
+    started = time.monotonic()
+    assert store.wait("task", 5)
+    assert time.monotonic() - started < 1
+    setter.join()
+
+def test_release_deletes_session(store):
+    store.set("task", "selected_signers", [1, 2, 3])
+    store.set("task", "shares", {"r": 1})
+    store.set("other", "shares", {"r": 2})
+    store.release("task")
+    assert store.get("task", "selected_signers") == None
+    assert store.get("task", "shares") == None
+    assert store.get("other", "shares") == {"r": 2}
+    # The task name can be used again
+    store.set("task", "shares", {"r": 3})
+    assert store.get("task", "shares") == {"r": 3}
+
+def test_local_sessions_expire(local_store):
+    local_store.timeout = 0.05
+    local_store.set("joined", "shares", 1)
+    # Shares of a task this signer never joins
+    local_store.set("abandoned", "foreign_shares", 2)
+    local_store.event("waited")
+    time.sleep(0.1)
+    local_store.set("task", "shares", 3)
+    assert set(local_store.events) == {"task"}
+    assert set(local_store.fields) == {"task"}
+    assert set(local_store.expires) == {"task"}
+    assert local_store.get("joined", "shares") == None
+    assert local_store.get("abandoned", "foreign_shares") == None
+    assert local_store.get("task", "shares") == 3
+
+def test_local_set_extends_session(local_store):
+    local_store.timeout = 0.2
+    local_store.set("task", "shares", 1)
+    time.sleep(0.15)
+    local_store.set("task", "selected_signers", [1, 2, 3])
+    time.sleep(0.1)
+    local_store.set("other", "shares", 2)
+    assert local_store.get("task", "shares") == 1
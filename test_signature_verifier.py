@@ -0,0 +1,73 @@
+import base64
+import os
+import pytest
+from nacl import bindings
+import signature_verifier
+from signature_verifier import verify_sct, verify_sth, verify_scts_deduplicated, verify_sths_deduplicated, \
+    sct_signed_data, sth_signed_data
+from sct_batch import build_batch, batched_scts, sct_signable_data
+from signed_data import BINARY_VERSION
+
+@pytest.fixture
+def sign(monkeypatch):
+    """Replaces the log's public key with a fresh key, returns a function signing with it."""
+    public_key, secret_key = bindings.crypto_sign_keypair()
+    monkeypatch.setattr(signature_verifier, "PUBLIC_KEY", int.from_bytes(public_key, "little"))
+    monkeypatch.setattr(signature_verifier, "PUBLIC_KEY_BYTES", public_key)
+    return lambda message: base64.b64encode(bindings.crypto_sign(message, secret_key)[:64]).decode("utf-8")
+
+def single_sct(sign, version="v1", timestamp=1736887033):
+    hashed_certificate = os.urandom(32).hex()
+    return {
+        "hashed_certificate": base64.b64encode(bytes.fromhex(hashed_certificate)).decode("utf-8"),
+        "id": "LOG_ID",
+        "sct_version": version,
+        "timestamp": timestamp,
+        "signed_hash": sign(sct_signable_data(hashed_certificate, "LOG_ID", timestamp, version))
+    }
+
+def batch_of_scts(sign, size=5, version="v1"):
+    hashed_certificates = [os.urandom(32).hex() for _ in range(size)]
+    levels, signable = build_batch(hashed_certificates, "LOG_ID", 1736887033, version)
+    return batched_scts(hashed_certificates, levels, sign(signable), "LOG_ID", 1736887033, version)
+
+def signed_sth(sign, version=None, tree_size=100):
+    sth = {"ll_size": 42, "sha256_root_hash": base64.b64encode(os.urandom(32)).decode("utf-8"),
+           "timestamp": 1736776402, "tree_size": tree_size}
+    if version != None:
+        sth["sth_version"] = version
+    sth["tree_head_signature"] = sign(sth_signed_data({**sth, "tree_head_signature": ""}))
+    return sth
+
+def test_stored_log_signatures_verify():
+    sct = {"hashed_certificate": "y/F81o3Tc8Bt+emjX9c5O+bEIf3wsLPd7EgaLtX5//U=", "id": "LOG_ID", "sct_version": "v1",
+           "signed_hash": "83MGPl0LrvXeGckPvizqNLN4Z12f8C8bPlOx+B9lR0uBnTtD3sOc8oeeukGAtX5oXrjy4f82x6d72AqRYpsPDQ==",
+           "timestamp": 1736776437}
+    assert verify_sct(sct)
+    assert verify_scts_deduplicated([sct, {**sct, "timestamp": 1736776438}]) == [True, False]
+
+@pytest.mark.parametrize("version", ["v1", BINARY_VERSION])
+def test_scts_match_single_verification(sign, version):
+    scts = [single_sct(sign, version) for _ in range(3)] + batch_of_scts(sign, version=version)
+    scts.append({**scts[0], "timestamp": scts[0]["timestamp"] + 1})
+    scts.append({**scts[-2], "batch_index": 0})
+    expected = [verify_sct(sct) for sct in scts]
+    assert verify_scts_deduplicated(scts) == expected
+    assert expected == [True] * 8 + [False] * 2
+
+def test_malformed_signature_is_invalid(sign):
+    sct = {**single_sct(sign), "signed_hash": "bm90IGEgc2lnbmF0dXJl"}
+    assert verify_scts_deduplicated([sct]) == [False]
+
+@pytest.mark.parametrize("version", [None, BINARY_VERSION])
+def test_sths_match_single_verification(sign, version):
+    sths = [signed_sth(sign, version, tree_size) for tree_size in (100, 200)]
+    sths.append({**sths[0], "ll_size": 43})
+    sths.append(sths[1])
+    expected = [verify_sth(sth) for sth in sths]
+    assert verify_sths_deduplicated(sths) == expected
+    assert expected == [True, True, False, True]
+
+def test_signed_data_of_versions_differ(sign):
+    sct = single_sct(sign)
+    assert sct_signed_data(sct) != sct_signed_data({**sct, "sct_version": BINARY_VERSION})
@@ -0,0 +1,63 @@
+import base64
+import os
+import pytest
+from signed_data import encode_sct, encode_tree_head, encode_batch_head, SCT_STRUCT, TREE_HEAD_STRUCT, \
+    BATCH_HEAD_STRUCT, BINARY_VERSION, BINARY_VERSION_NUMBER, CERTIFICATE_TIMESTAMP, TREE_HASH, BATCH_HASH
+from signature_verifier import sct_signed_data, sth_signed_data
+from sct_batch import sct_signable_data
+
+LOG_ID = "logledger"
+TIMESTAMP = 1700000000000
+
+def decode_log_id(data: bytes) -> str:
+    assert data[0] == len(data) - 1
+    return data[1:].decode("utf-8")
+
+def test_sct_layout():
+    hashed_certificate = os.urandom(32)
+    encoded = encode_sct(hashed_certificate, LOG_ID, TIMESTAMP)
+    assert SCT_STRUCT.unpack_from(encoded) \
+        == (BINARY_VERSION_NUMBER, CERTIFICATE_TIMESTAMP, TIMESTAMP, hashed_certificate)
+    assert decode_log_id(encoded[SCT_STRUCT.size:]) == LOG_ID
+
+def test_tree_head_layout():
+    root = os.urandom(32)
+    encoded = encode_tree_head(1000, 400, TIMESTAMP, root)
+    assert len(encoded) == TREE_HEAD_STRUCT.size
+    assert TREE_HEAD_STRUCT.unpack(encoded) == (BINARY_VERSION_NUMBER, TREE_HASH, TIMESTAMP, 1000, 400, root)
+
+def test_batch_head_layout():
+    root = os.urandom(32)
+    encoded = encode_batch_head(root, 16, LOG_ID, TIMESTAMP)
+    assert BATCH_HEAD_STRUCT.unpack_from(encoded) == (BINARY_VERSION_NUMBER, BATCH_HASH, TIMESTAMP, 16, root)
+    assert decode_log_id(encoded[BATCH_HEAD_STRUCT.size:]) == LOG_ID
+
+def test_signature_types_differ():
+    value = os.urandom(32)
+    assert encode_sct(value, LOG_ID, TIMESTAMP)[:2] != encode_batch_head(value, 1, LOG_ID, TIMESTAMP)[:2]
+
+@pytest.mark.parametrize("value", [b"", os.urandom(31), os.urandom(33)])
+def test_wrong_hash_length(value):
+    with pytest.raises(ValueError):
+        encode_sct(value, LOG_ID, TIMESTAMP)
+    with pytest.raises(ValueError):
+        encode_tree_head(1, 1, TIMESTAMP, value)
+    with pytest.raises(ValueError):
+        encode_batch_head(value, 1, LOG_ID, TIMESTAMP)
+
+@pytest.mark.parametrize("log_id", ["", "x" * 256])
+def test_wrong_log_id_length(log_id):
+    with pytest.raises(ValueError):
+        encode_sct(os.urandom(32), log_id, TIMESTAMP)
+
+def test_verifier_rebuilds_signed_sct():
+    hashed_certificate = os.urandom(32)
+    sct = {"hashed_certificate": base64.b64encode(hashed_certificate).decode("utf-8"), "id": LOG_ID,
+           "timestamp": TIMESTAMP, "sct_version": BINARY_VERSION, "signed_hash": ""}
+    assert sct_signed_data(sct) == sct_signable_data(hashed_certificate.hex(), LOG_ID, TIMESTAMP, BINARY_VERSION)
+
+def test_verifier_rebuilds_signed_tree_head():
+    root = os.urandom(32)
+    sth = {"tree_size": 1000, "ll_size": 400, "timestamp": TIMESTAMP, "sth_version": BINARY_VERSION,
+           "sha256_root_hash": base64.b64encode(root).decode("utf-8"), "tree_head_signature": ""}
+    assert sth_signed_data(sth) == encode_tree_head(1000, 400, TIMESTAMP, root)
@@ -0,0 +1,97 @@
+import random
+import pytest
+import signer_health
+from signer_health import SignerHealth, FAILURES_TO_OPEN, OPEN_SECONDS
+
+class NoExploration(random.Random):
+    def random(self):
+        return 1.0
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(signer_health.time, "monotonic", clock)
+    return clock
+
+def measured_health(latencies: dict, committee_size=3) -> SignerHealth:
+    health = SignerHealth(list(latencies), committee_size, NoExploration())
+    for index, seconds in latencies.items():
+        health.record_success(index, seconds)
+    return health
+
+def test_committee_larger_than_signers():
+    with pytest.raises(ValueError):
+        SignerHealth([1, 2], 3)
+
+def test_unmeasured_signers_go_first():
+    health = measured_health({1: 0.1, 2: 0.2, 3: 0.3})
+    health.stats[4] = signer_health.SignerStats()
+    assert 4 in health.select()
+
+def test_select_fastest():
+    health = measured_health({1: 0.5, 2: 0.1, 3: 0.4, 4: 0.2, 5: 0.3})
+    assert health.select() == [2, 4, 5]
+
+def test_select_skips_excluded():
+    health = measured_health({1: 0.5, 2: 0.1, 3: 0.4, 4: 0.2, 5: 0.3})
+    assert health.select(excluded=(2,)) == [3, 4, 5]
+
+def test_excluded_used_if_no_others_left():
+    health = measured_health({1: 0.1, 2: 0.2, 3: 0.3})
+    assert health.select(excluded=(1,)) == [1, 2, 3]
+
+def test_exploration_picks_other_signer():
+    class AlwaysExplore(random.Random):
+        def random(self):
+            return 0.0
+    health = measured_health({1: 0.1, 2: 0.2, 3: 0.3, 4: 0.4})
+    health.rng = AlwaysExplore(0)
+    assert health.select() == [1, 2, 4]
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    health = measured_health({1: 0.1, 2: 0.2, 3: 0.3, 4: 0.4})
+    for _ in range(FAILURES_TO_OPEN - 1):
+        health.record_failure(1)
+    assert not health.snapshot()[1]["open"]
+    health.record_failure(1)
+    assert health.snapshot()[1]["open"]
+    assert health.select() == [2, 3, 4]
+
+def test_open_circuit_used_if_no_others_left(clock):
+    health = measured_health({1: 0.1, 2: 0.2, 3: 0.3})
+    for _ in range(FAILURES_TO_OPEN):
+        health.record_failure(1)
+    assert health.select() == [1, 2, 3]
+
+def test_circuit_half_opens_after_open_seconds(clock):
+    health = measured_health({1: 0.1, 2: 0.2, 3: 0.3, 4: 0.4})
+    for _ in range(FAILURES_TO_OPEN):
+        health.record_failure(1)
+    clock.now += OPEN_SECONDS
+    assert not health.snapshot()[1]["open"]
+    # A single failure in the half-open state opens the circuit again
+    health.record_failure(1)
+    assert health.snapshot()[1]["open"]
+    clock.now += OPEN_SECONDS
+    health.record_success(1, 0.1)
+    assert health.stats[1].consecutive_failures == 0
+    health.record_failure(1)
+    assert not health.snapshot()[1]["open"]
+
+def test_failures_raise_expected_latency():
+    health = measured_health({1: 0.1, 2: 0.12, 3: 0.13, 4: 0.14})
+    health.record_failure(1)
+    health.record_failure(1)
+    assert health.select() == [2, 3, 4]
+
+def test_missing_sign_shares_error_names_signers():
+    error = signer_health.MissingSignSharesError([2, 5])
+    assert isinstance(error, signer_health.SignerError)
+    assert error.signers == [2, 5]
@@ -0,0 +1,64 @@
+import pytest
+from signing_service import encode_sign_shares, decode_sign_shares, SHARE_BATCH_HEADER
+
+SHARES = [
+    ("task-1", {"i": 2, "j": 1, "r": 2**252 + 7, "R": 12345}),
+    ("täsk-2", {"i": 2, "j": 1, "r": 1, "R": 2**255 - 19}),
+]
+
+def test_round_trip():
+    assert decode_sign_shares(encode_sign_shares(1, SHARES)) == (1, SHARES)
+
+def test_round_trip_empty():
+    assert decode_sign_shares(encode_sign_shares(3, [])) == (3, [])
+
+def test_encode_rejects_missing_field():
+    with pytest.raises(ValueError):
+        encode_sign_shares(1, [("task", {"i": 2, "j": 1, "r": 1})])
+
+def test_encode_rejects_oversized_share():
+    with pytest.raises(ValueError):
+        encode_sign_shares(1, [("task", {"i": 2, "j": 1, "r": 2**256, "R": 1})])
+
+def test_decode_rejects_unknown_version():
+    data = bytearray(encode_sign_shares(1, SHARES))
+    data[0] ^= 0xff
+    with pytest.raises(ValueError):
+        decode_sign_shares(bytes(data))
+
+@pytest.mark.parametrize("length", [0, 1, SHARE_BATCH_HEADER.size, SHARE_BATCH_HEADER.size + 3, -1])
+def test_decode_rejects_truncated_data(length):
+    data = encode_sign_shares(1, SHARES)
+    with pytest.raises(ValueError):
+        decode_sign_shares(data[:length])
+
+def test_decode_rejects_trailing_data():
+    with pytest.raises(ValueError):
+        decode_sign_shares(encode_sign_shares(1, SHARES) + b"\x00")
+
+class FakeSession:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.posts = []
+
+    def post(self, url, data, headers, timeout):
+        self.posts.append((url, decode_sign_shares(data)))
+        return type("Response", (), {"status_code": self.status_code})()
+
+def test_remote_signer_batches_queued_shares():
+    from signing_service import RemoteMultiSigner
+    remote = RemoteMultiSigner(1, "http://peer", flush_interval=0.05, batch_size=2)
+    remote.session = FakeSession()
+    futures = [remote.set_foreign_sign_share(task, share) for task, share in SHARES + SHARES[:1]]
+    for future in futures:
+        assert future.result(timeout=5) == None
+    assert [url for url, _ in remote.session.posts] == ["http://peer/foreign_sign_shares"] * 2
+    assert [batch for _, batch in remote.session.posts] == [(1, SHARES), (1, SHARES[:1])]
+
+def test_remote_signer_fails_futures_on_error():
+    from signing_service import RemoteMultiSigner
+    remote = RemoteMultiSigner(1, "http://peer", flush_interval=0.01)
+    remote.session = FakeSession(status_code=500)
+    future = remote.set_foreign_sign_share(*SHARES[0])
+    with pytest.raises(ConnectionError):
+        future.result(timeout=5)
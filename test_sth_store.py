@@ -0,0 +1,66 @@
+import json
+from sth_store import STHStore, STORE_FILE, sth_etag
+
+def sth_of(ll_size, tree_size, timestamp=1):
+    return {"ll_size": ll_size, "tree_size": tree_size, "timestamp": timestamp,
+            "sha256_root_hash": "cm9vdA==", "tree_head_signature": "c2ln"}
+
+def test_empty_store(tmp_path):
+    store = STHStore(str(tmp_path))
+    assert len(store) == 0
+    assert store.latest() == (None, None)
+    assert store.get(1) == None
+    assert store.get_by_tree_size(1) == None
+    store.close()
+
+def test_lookups(tmp_path):
+    store = STHStore(str(tmp_path))
+    for ll_size, tree_size in [(10, 100), (30, 300), (20, 200)]:
+        store.put(sth_of(ll_size, tree_size))
+    assert len(store) == 3
+    assert store.latest() == (sth_of(30, 300), sth_etag(sth_of(30, 300)))
+    assert store.get(20) == sth_of(20, 200)
+    assert store.get(25) == None
+    assert store.get_by_tree_size(100) == sth_of(10, 100)
+    assert store.get_by_tree_size(150) == None
+    assert store.range(10, 30) == [sth_of(10, 100), sth_of(20, 200)]
+    store.close()
+
+def test_signing_again_replaces(tmp_path):
+    store = STHStore(str(tmp_path))
+    store.put(sth_of(10, 100))
+    store.put(sth_of(10, 110, timestamp=2))
+    assert len(store) == 1
+    assert store.get(10) == sth_of(10, 110, timestamp=2)
+    # The older tree size no longer leads to the replaced STH
+    assert store.get_by_tree_size(100) == None
+    assert store.get_by_tree_size(110) == sth_of(10, 110, timestamp=2)
+    store.close()
+
+def test_reload_drops_partial_line(tmp_path):
+    store = STHStore(str(tmp_path))
+    store.put(sth_of(10, 100))
+    store.put(sth_of(20, 200))
+    store.close()
+    with open(tmp_path / STORE_FILE, "ab") as file:
+        file.write(b'{"ll_size": 30, "tree')
+    store = STHStore(str(tmp_path))
+    assert len(store) == 2
+    assert store.latest()[0] == sth_of(20, 200)
+    store.put(sth_of(30, 300))
+    store.close()
+    store = STHStore(str(tmp_path))
+    assert store.range(0, 100) == [sth_of(10, 100), sth_of(20, 200), sth_of(30, 300)]
+    store.close()
+
+def test_imports_files_of_older_versions(tmp_path):
+    for ll_size, tree_size in [(2, 20), (11, 110)]:
+        with open(tmp_path / f"{ll_size}.json", "w") as file:
+            json.dump(sth_of(ll_size, tree_size), file)
+    store = STHStore(str(tmp_path))
+    assert store.range(0, 100) == [sth_of(2, 20), sth_of(11, 110)]
+    store.close()
+    # The files are only imported into a new store
+    store = STHStore(str(tmp_path))
+    assert len(store) == 2
+    store.close()
@@ -0,0 +1,134 @@
+import os
+import threading
+import types
+import pytest
+import blockchain_interface
+from blockchain_interface import HashStorage
+
+ACCOUNT = {"ACCOUNT_ADDRESS": "0x0000000000000000000000000000000000000001", "PRIVATE_KEY": "0x01", "NODE_URL": ""}
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(blockchain_interface, "get_bc_configuration", lambda: ACCOUNT)
+    monkeypatch.setattr(blockchain_interface, "get_gas_price", lambda: 10)
+    monkeypatch.setattr(blockchain_interface, "RECEIPT_POLL", 0.01)
+
+class FakeChain:
+    """Stands in for web3 and the contract, mines a transaction once it is released."""
+    def __init__(self):
+        self.hashes = []
+        self.nonce = 0
+        self.sent = {}
+        self.receipts = {}
+        self.released = threading.Event()
+        self.released.set()
+        self.eth = self
+        self.account = types.SimpleNamespace(
+            sign_transaction=lambda transaction, key: types.SimpleNamespace(raw_transaction=transaction))
+        self.functions = types.SimpleNamespace(addHash=self.add_hash, getHashCount=self.get_hash_count,
+                                               getHashRange=self.get_hash_range)
+
+    def to_wei(self, value, unit):
+        return int(value * 10**9)
+
+    def add_hash(self, hashes):
+        return types.SimpleNamespace(build_transaction=lambda transaction: {**transaction, "hashes": hashes})
+
+    def get_hash_count(self):
+        return types.SimpleNamespace(call=lambda: len(self.hashes))
+
+    def get_hash_range(self, start, count):
+        return types.SimpleNamespace(call=lambda: [bytes.fromhex(value.removeprefix("0x"))
+                                                   for value in self.hashes[start:start + count]])
+
+    def get_transaction_count(self, address, block):
+        return self.nonce
+
+    def send_raw_transaction(self, transaction):
+        tx_hash = os.urandom(32)
+        self.sent[tx_hash] = transaction
+        return tx_hash
+
+    def get_transaction_receipt(self, tx_hash):
+        from web3.exceptions import TransactionNotFound
+        if tx_hash not in self.receipts:
+            if not self.released.is_set() or self.sent[tx_hash]["nonce"] != self.nonce:
+                raise TransactionNotFound("Not mined")
+            self.hashes += self.sent[tx_hash]["hashes"]
+            self.nonce += 1
+            self.receipts[tx_hash] = {"status": 1, "transactionHash": tx_hash}
+        return self.receipts[tx_hash]
+
+@pytest.fixture
+def chain():
+    return FakeChain()
+
+@pytest.fixture
+def storage(chain, tmp_path):
+    storage = HashStorage(web3=chain, mirror_file=str(tmp_path / "mirror.bin"),
+                          journal_file=str(tmp_path / "receipts.jsonl"))
+    storage._roc_contract = chain
+    yield storage
+    storage.receipts.close()
+
+def hashes(count):
+    return ["0x" + os.urandom(32).hex() for _ in range(count)]
+
+def test_add_hashes_splits_into_transactions(storage, chain):
+    added = hashes(blockchain_interface.MAX_HASHES_PER_TX + 10)
+    transactions = storage.add_hashes_async(added)
+    assert [(transaction.nonce, transaction.start, len(transaction.hashes)) for transaction in transactions] \
+        == [(0, 0, blockchain_interface.MAX_HASHES_PER_TX), (1, blockchain_interface.MAX_HASHES_PER_TX, 10)]
+    for transaction in transactions:
+        assert transaction.future.result(timeout=5)["status"] == 1
+    assert chain.hashes == added
+    assert len(storage.mirror) == 0
+    assert storage.sync_mirror() == len(added)
+    assert storage.mirror.get_range(0, len(added)) == [value.removeprefix("0x") for value in added]
+    assert storage.get_receipt_by_hash_index(len(added) - 1)["total_hashes"] == len(added)
+
+def test_add_hashes_waits_for_receipts(storage, chain):
+    added = hashes(3)
+    tx_hash = storage.add_hashes(added)
+    assert tx_hash == list(chain.receipts)[-1].hex()
+    assert len(storage.receipts) == 1
+
+def test_tracker_restarts_after_exit(storage, chain):
+    storage.add_hashes(hashes(2))
+    tracker = storage.submitter.tracker
+    if tracker != None:
+        tracker.join(timeout=5)
+    assert storage.submitter.tracker == None
+    transaction, = storage.add_hashes_async(hashes(2))
+    assert transaction.start == 2
+    assert transaction.future.result(timeout=5)["status"] == 1
+
+def test_expected_start_mismatch_sends_nothing(storage, chain):
+    storage.add_hashes(hashes(2))
+    with pytest.raises(ValueError):
+        storage.add_hashes_async(hashes(2), expected_start=0)
+    assert len(chain.sent) == 1
+    transaction, = storage.add_hashes_async(hashes(2), expected_start=2)
+    assert transaction.future.result(timeout=5)["status"] == 1
+
+def test_nonces_continue_while_in_flight(storage, chain):
+    chain.released.clear()
+    first, = storage.add_hashes_async(hashes(1))
+    second, = storage.add_hashes_async(hashes(1), expected_start=1)
+    assert (first.nonce, second.nonce) == (0, 1)
+    chain.released.set()
+    assert second.future.result(timeout=5)["status"] == 1
+    assert len(chain.hashes) == 2
+
+def test_mirror_keeps_chain_order_with_other_writer(storage, chain):
+    # Another writer adds hashes between the resync and the receipt
+    chain.released.clear()
+    ours, = storage.add_hashes_async(hashes(2))
+    other = hashes(3)
+    chain.hashes += other
+    chain.released.set()
+    assert ours.future.result(timeout=5)["status"] == 1
+    assert ours.start == 0
+    storage.sync_mirror()
+    assert storage.get_hashes(0, 3) == [value.removeprefix("0x") for value in other]
+    assert storage.get_hashes(3, 5) == [value.removeprefix("0x") for value in ours.hashes]